@@ -1,10 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.user import User
 from app.utils.security import decode_access_token
+from app.services.data_version_service import data_version_service
+from app.services.stream_ticket_service import stream_ticket_service
 from uuid import UUID
+from datetime import date
+from typing import Optional
+import hashlib
 
 security = HTTPBearer()
 
@@ -40,3 +45,56 @@ def get_current_user(
         )
     
     return user
+
+def stream_user_id(token: Optional[str] = None, ticket: Optional[str] = None) -> Optional[UUID]:
+    """
+    The user opening a long-lived stream, from an Authorization bearer
+    token or a stream ticket (spent by this call), or None if neither is
+    valid. Uses its own short session: a get_db session would hold a
+    pooled connection for as long as the stream.
+    """
+    db = SessionLocal()
+    try:
+        if token:
+            payload = decode_access_token(token)
+            if not payload or not payload.get("sub"):
+                return None
+            return db.query(User.id).filter(User.id == UUID(payload["sub"])).scalar()
+        if ticket:
+            user_id = stream_ticket_service.redeem(db, ticket)
+            db.commit()
+            return user_id
+        return None
+    finally:
+        db.close()
+
+def etag_guard(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> None:
+    """
+    Dependency for GET endpoints whose output depends only on the user's
+    data (and the current date).
+    Emits a strong ETag derived from the user's data version and answers
+    a matching If-None-Match with 304 before the endpoint body runs.
+    """
+    version = data_version_service.get(db, current_user.id)
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    digest = hashlib.sha256(
+        f"{current_user.id}:{version}:{date.today()}:{request.url.path}?{query}".encode()
+    ).hexdigest()[:32]
+    etag = f'"{digest}"'
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+            )
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
@@ -1,46 +1,202 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.config import settings
 from app.models.user import User
 from app.models.alert import Alert
-from app.schemas.loan import AlertResponse
-from app.api.deps import get_current_user
-from typing import List
+from app.schemas.loan import AlertResponse, AlertBulkAction, AlertBulkResult, AlertStreamTicketResponse
+from app.api.deps import get_current_user, etag_guard, stream_user_id
+from app.services.cache_service import analytics_cache, ALERTS
+from app.services.alert_service import alert_service
+from app.services.alert_stream_service import alert_stream_service
+from app.services.stream_ticket_service import stream_ticket_service
+from app.services.data_version_service import data_version_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.utils.pagination import encode_cursor, decode_cursor
+from typing import List, Optional
 from uuid import UUID
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/alerts", tags=["Alerts"])
 
-@router.get("/", response_model=List[AlertResponse])
+@router.get("/", response_model=List[AlertResponse], dependencies=[Depends(etag_guard)])
 def get_alerts(
+    response: Response,
     unread_only: bool = False,
-    severity: str = None,
-    limit: int = 50,
+    severity: Optional[List[str]] = Query(None),
+    alert_type: Optional[List[str]] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get alerts for current user"""
-    from app.models.loan import LoanAgreement
+    """
+    Get the current user's open alerts, newest first, a page at a time.
+    When more alerts follow, the X-Next-Cursor header holds the cursor
+    to pass for the next page.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # Query alerts through loan agreements
-    query = db.query(Alert).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id
+    # One extra row tells whether another page follows
+    alerts = alert_service.page(
+        db, current_user.id, limit + 1, after,
+        unread_only=unread_only, severities=severity, alert_types=alert_type
     )
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(alerts[-1].created_at, alerts[-1].id)
+    
+    return [AlertResponse.from_orm(a) for a in alerts]
+
+def _stream_cursor(last_event_id: Optional[str]):
+    """Replay position of a reconnecting stream; an unreadable id starts afresh"""
+    try:
+        return decode_cursor(last_event_id) if last_event_id else None
+    except ValueError:
+        return None
+
+@router.post("/stream/ticket", response_model=AlertStreamTicketResponse, status_code=status.HTTP_201_CREATED)
+def create_stream_ticket(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Issue a single-use ticket for opening the alert stream, passed as
+    ?ticket= where the client cannot send an Authorization header. It
+    expires after ALERT_STREAM_TICKET_TTL_SECONDS; each (re)connect
+    needs a new one.
+    """
+    ticket = stream_ticket_service.issue(db, current_user.id)
+    db.commit()
+    return AlertStreamTicketResponse(ticket=ticket, expires_in=settings.ALERT_STREAM_TICKET_TTL_SECONDS)
+
+@router.get("/stream")
+async def stream_alerts(
+    request: Request,
+    ticket: Optional[str] = None,
+    last_event_id: Optional[str] = None
+):
+    """
+    Server-sent events for the current user's alerts, pushed as they are
+    written:
+    
+    - ``alert``: an alert was created or changed (data: AlertResponse).
+      New alerts carry an id; a reconnect sends it as Last-Event-ID and
+      first receives the open alerts created since.
+    - ``alerts-changed``: many alerts were read, resolved or deleted at
+      once, or events were lost (action "resync"); refetch the list.
     
-    if unread_only:
-        query = query.filter(Alert.is_read == False)
+    EventSource cannot set headers, so instead of a bearer token it
+    passes a ticket from POST /api/alerts/stream/ticket as ?ticket=, and
+    its replay position as ?last_event_id= when reconnecting with a new
+    ticket. The access token itself is never accepted in the URL, where
+    proxies and access logs would record it.
+    """
+    authorization = request.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    user_id = await run_in_threadpool(stream_user_id, token, ticket)
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token or ticket"
+        )
+    after = _stream_cursor(request.headers.get("last-event-id") or last_event_id)
     
-    if severity:
-        query = query.filter(Alert.severity == severity)
+    async def events():
+        # Subscribed once the response starts, so a client gone before then leaves nothing behind
+        subscription = await alert_stream_service.subscribe(user_id, after)
+        try:
+            yield "retry: 5000\n\n"
+            async for event in subscription.events():
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                name, event_id, data = event
+                yield f"event: {name}\n" + (f"id: {event_id}\n" if event_id else "") + f"data: {data}\n\n"
+        finally:
+            alert_stream_service.unsubscribe(subscription)
     
-    query = query.filter(Alert.is_resolved == False)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        # Keeps GZipMiddleware from buffering events
+        "Content-Encoding": "identity"
+    })
+
+@router.websocket("/stream/ws")
+async def stream_alerts_websocket(
+    websocket: WebSocket,
+    ticket: Optional[str] = None,
+    last_event_id: Optional[str] = None
+):
+    """
+    The alert stream over a WebSocket, opened with a ticket from
+    POST /api/alerts/stream/ticket: each message is
+    {"event", "id", "data"} as in GET /api/alerts/stream, or
+    {"event": "ping"} when idle.
+    """
+    user_id = await run_in_threadpool(stream_user_id, None, ticket)
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    alerts = query.order_by(Alert.created_at.desc()).limit(limit).all()
+    await websocket.accept()
+    subscription = await alert_stream_service.subscribe(user_id, _stream_cursor(last_event_id))
+    try:
+        async for event in subscription.events():
+            if event is None:
+                await websocket.send_text('{"event":"ping"}')
+                continue
+            name, event_id, data = event
+            await websocket.send_text(json.dumps({"event": name, "id": event_id, "data": json.loads(data)}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        alert_stream_service.unsubscribe(subscription)
+
+@router.post("/bulk", response_model=AlertBulkResult)
+def bulk_update_alerts(
+    request: AlertBulkAction,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mark read, resolve or delete many alerts at once, chosen by id or by a
+    filter (e.g. all read medium alerts of a loan). Ids of other users'
+    alerts are ignored; the result counts what was matched and changed.
+    """
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either ids or filter"
+        )
     
-    return [AlertResponse.from_orm(a) for a in alerts]
+    try:
+        result = alert_service.bulk_update(
+            db, current_user.id, request.action,
+            ids=request.ids,
+            filters=request.filter.model_dump() if request.filter else None
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if result['affected']:
+        data_version_service.bump(db, current_user.id)
+    db.commit()
+    if result['affected']:
+        analytics_cache.invalidate(current_user.id, ALERTS)
+    
+    logger.info(f"Bulk {request.action}: {result['affected']} of {result['matched']} alerts changed")
+    return AlertBulkResult(action=request.action, **result)
 
 @router.put("/{alert_id}/read", response_model=AlertResponse)
 def mark_alert_as_read(
@@ -56,7 +212,7 @@ def mark_alert_as_read(
     ).filter(
         Alert.id == UUID(alert_id),
         LoanAgreement.user_id == current_user.id
-    ).first()
+    ).with_for_update(of=Alert).first()
     
     if not alert:
         raise HTTPException(
@@ -64,9 +220,14 @@ def mark_alert_as_read(
             detail="Alert not found"
         )
     
+    rollup_before = portfolio_rollup_service.alert_counters(alert)
     alert.is_read = True
+    portfolio_rollup_service.apply_change(db, current_user.id, rollup_before, portfolio_rollup_service.alert_counters(alert))
+    alert_service.notify_alerts(db, [alert.id])
+    data_version_service.bump(db, current_user.id)
     db.commit()
     db.refresh(alert)
+    analytics_cache.invalidate(current_user.id, ALERTS)
     
     return AlertResponse.from_orm(alert)
 
@@ -84,7 +245,7 @@ def resolve_alert(
     ).filter(
         Alert.id == UUID(alert_id),
         LoanAgreement.user_id == current_user.id
-    ).first()
+    ).with_for_update(of=Alert).first()
     
     if not alert:
         raise HTTPException(
@@ -92,10 +253,15 @@ def resolve_alert(
             detail="Alert not found"
         )
     
+    rollup_before = portfolio_rollup_service.alert_counters(alert)
     alert.is_resolved = True
     alert.is_read = True
+    portfolio_rollup_service.apply_change(db, current_user.id, rollup_before, portfolio_rollup_service.alert_counters(alert))
+    alert_service.notify_alerts(db, [alert.id])
+    data_version_service.bump(db, current_user.id)
     db.commit()
     db.refresh(alert)
+    analytics_cache.invalidate(current_user.id, ALERTS)
     
     return AlertResponse.from_orm(alert)
 
@@ -113,7 +279,7 @@ def delete_alert(
     ).filter(
         Alert.id == UUID(alert_id),
         LoanAgreement.user_id == current_user.id
-    ).first()
+    ).with_for_update(of=Alert).first()
     
     if not alert:
         raise HTTPException(
@@ -121,7 +287,12 @@ def delete_alert(
             detail="Alert not found"
         )
     
+    rollup_before = portfolio_rollup_service.alert_counters(alert)
     db.delete(alert)
+    portfolio_rollup_service.apply_change(db, current_user.id, rollup_before, {})
+    alert_service.notify_change(db, current_user.id, 'delete', 1)
+    data_version_service.bump(db, current_user.id)
     db.commit()
+    analytics_cache.invalidate(current_user.id, ALERTS)
     
     return None
@@ -1,165 +1,57 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case, extract
-from app.database import get_db
+from app.database import get_db, SessionLocal
+from app.config import settings
 from app.models.user import User
 from app.models.loan import LoanAgreement
-from app.models.covenant import Covenant, CovenantMeasurement
 from app.models.alert import Alert
 from app.schemas.loan import (
     PortfolioSummary, RiskHeatmapItem, AlertResponse, LoanResponse,
-    PortfolioValueResponse, PortfolioTrendsResponse, CovenantTrendsResponse
+    PortfolioValueResponse, PortfolioTrendsResponse, CovenantTrendsResponse, DashboardResponse
 )
-from app.api.deps import get_current_user
-from typing import List
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from app.api.deps import get_current_user, etag_guard
+from app.services.analytics_service import analytics_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.cache_service import analytics_cache, MEASUREMENTS, ALERTS
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
-@router.get("/portfolio-summary", response_model=PortfolioSummary)
+@router.get("/portfolio-summary", response_model=PortfolioSummary, dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("portfolio-summary", scopes=[MEASUREMENTS, ALERTS])
 def get_portfolio_summary(
+    as_of: Optional[date] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get portfolio overview statistics for dashboard"""
-    # Total loans
-    total_loans = db.query(func.count(LoanAgreement.id)).filter(
-        LoanAgreement.user_id == current_user.id
-    ).scalar() or 0
-    
-    # Active loans
-    active_loans = db.query(func.count(LoanAgreement.id)).filter(
-        LoanAgreement.user_id == current_user.id,
-        LoanAgreement.status == 'active'
-    ).scalar() or 0
-    
-    # Total covenants
-    total_covenants = db.query(func.count(Covenant.id)).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Covenant.is_active == True
-    ).scalar() or 0
-    
-    # Get covenant status counts via latest measurements
-    covenant_statuses = db.query(
-        CovenantMeasurement.status,
-        func.count(func.distinct(CovenantMeasurement.covenant_id)).label('count')
-    ).join(
-        Covenant
-    ).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Covenant.is_active == True
-    ).group_by(
-        CovenantMeasurement.status
-    ).all()
-    
-    status_dict = {status: count for status, count in covenant_statuses}
-    
-    compliant_covenants = status_dict.get('compliant', 0)
-    warning_covenants = status_dict.get('warning', 0)
-    breach_covenants = status_dict.get('breach', 0)
+    if as_of is None:
+        summary = portfolio_rollup_service.get_summary(db, current_user.id)
+    else:
+        summary = analytics_service.get_portfolio_summary(db, current_user.id, as_of)
     
-    # Unread alerts
-    unread_alerts = db.query(func.count(Alert.id)).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Alert.is_read == False,
-        Alert.is_resolved == False
-    ).scalar() or 0
-    
-    # Critical alerts
-    critical_alerts = db.query(func.count(Alert.id)).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Alert.severity == 'critical',
-        Alert.is_resolved == False
-    ).scalar() or 0
-    
-    return PortfolioSummary(
-        total_loans=total_loans,
-        active_loans=active_loans,
-        total_covenants=total_covenants,
-        compliant_covenants=compliant_covenants,
-        warning_covenants=warning_covenants,
-        breach_covenants=breach_covenants,
-        unread_alerts=unread_alerts,
-        critical_alerts=critical_alerts
-    )
+    return PortfolioSummary(**summary)
 
-@router.get("/risk-heatmap", response_model=List[RiskHeatmapItem])
+@router.get("/risk-heatmap", response_model=List[RiskHeatmapItem], dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("risk-heatmap", scopes=[MEASUREMENTS])
 def get_risk_heatmap(
+    as_of: Optional[date] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get risk heatmap data for dashboard visualization"""
-    # Get loans with their worst covenant status
-    loans = db.query(LoanAgreement).filter(
-        LoanAgreement.user_id == current_user.id,
-        LoanAgreement.status == 'active'
-    ).all()
+    heatmap = analytics_service.get_risk_heatmap(db, current_user.id, as_of)
     
-    heatmap_items = []
-    
-    for loan in loans:
-        # Get covenant count
-        covenant_count = db.query(func.count(Covenant.id)).filter(
-            Covenant.loan_agreement_id == loan.id,
-            Covenant.is_active == True
-        ).scalar() or 0
-        
-        # Get worst status from latest measurements
-        worst_status = 'compliant'  # default
-        critical_count = 0
-        
-        if covenant_count > 0:
-            # Get all latest measurements for this loan's covenants
-            measurements = db.query(CovenantMeasurement).join(
-                Covenant
-            ).filter(
-                Covenant.loan_agreement_id == loan.id,
-                Covenant.is_active == True
-            ).order_by(
-                CovenantMeasurement.covenant_id,
-                CovenantMeasurement.measurement_date.desc()
-            ).all()
-            
-            # Group by covenant and get latest
-            covenant_latest = {}
-            for m in measurements:
-                if m.covenant_id not in covenant_latest:
-                    covenant_latest[m.covenant_id] = m.status
-            
-            # Determine worst status
-            statuses = list(covenant_latest.values())
-            if 'breach' in statuses:
-                worst_status = 'breach'
-                critical_count = statuses.count('breach')
-            elif 'warning' in statuses:
-                worst_status = 'warning'
-                critical_count = statuses.count('warning')
-        
-        heatmap_items.append(
-            RiskHeatmapItem(
-                loan_id=loan.id,
-                loan_title=loan.title,
-                borrower_name=loan.borrower_name,
-                status=worst_status,
-                covenant_count=covenant_count,
-                critical_count=critical_count
-            )
-        )
-    
-    return heatmap_items
+    return [RiskHeatmapItem(**item) for item in heatmap]
 
-@router.get("/recent-loans", response_model=List[LoanResponse])
+@router.get("/recent-loans", response_model=List[LoanResponse], dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("recent-loans", scopes=[])
 def get_recent_loans(
     limit: int = 10,
     current_user: User = Depends(get_current_user),
@@ -172,7 +64,8 @@ def get_recent_loans(
     
     return [LoanResponse.from_orm(loan) for loan in loans]
 
-@router.get("/critical-alerts", response_model=List[AlertResponse])
+@router.get("/critical-alerts", response_model=List[AlertResponse], dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("critical-alerts", scopes=[ALERTS])
 def get_critical_alerts(
     limit: int = 5,
     current_user: User = Depends(get_current_user),
@@ -189,7 +82,8 @@ def get_critical_alerts(
 
     return [AlertResponse.from_orm(alert) for alert in alerts]
 
-@router.get("/portfolio-value", response_model=PortfolioValueResponse)
+@router.get("/portfolio-value", response_model=PortfolioValueResponse, dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("portfolio-value", scopes=[])
 def get_portfolio_value(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -226,109 +120,89 @@ def get_portfolio_value(
         change_amount=change_amount
     )
 
-@router.get("/portfolio-trends", response_model=PortfolioTrendsResponse)
+@router.get("/portfolio-trends", response_model=PortfolioTrendsResponse, dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("portfolio-trends", scopes=[])
 def get_portfolio_trends(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get portfolio value trends over the last 13 months"""
-    # Calculate 13 months of data
-    now = datetime.now()
-    months = []
-    current_period = []
-    previous_period = []
-
-    for i in range(12, -1, -1):
-        month_date = now - relativedelta(months=i)
-        month_label = month_date.strftime('%b')
-        months.append(month_label)
-
-        # Get total loan value up to this month (current year)
-        current_month_value = db.query(
-            func.coalesce(func.sum(LoanAgreement.loan_amount), 0)
-        ).filter(
-            LoanAgreement.user_id == current_user.id,
-            LoanAgreement.status == 'active',
-            LoanAgreement.created_at <= month_date
-        ).scalar() or 0.0
-
-        current_period.append(float(current_month_value) / 1000)  # Convert to thousands
-
-        # Get previous year's value for comparison
-        prev_year_month = month_date - relativedelta(years=1)
-        previous_month_value = db.query(
-            func.coalesce(func.sum(LoanAgreement.loan_amount), 0)
-        ).filter(
-            LoanAgreement.user_id == current_user.id,
-            LoanAgreement.status == 'active',
-            LoanAgreement.created_at <= prev_year_month
-        ).scalar() or 0.0
+    """Get month-end portfolio value trends over the last 13 months"""
+    trends = analytics_service.get_portfolio_trends(db, current_user.id)
 
-        previous_period.append(float(previous_month_value) / 1000)  # Convert to thousands
+    return PortfolioTrendsResponse(**trends)
 
-    return PortfolioTrendsResponse(
-        months=months,
-        current_period=current_period,
-        previous_period=previous_period
-    )
-
-@router.get("/covenant-trends", response_model=CovenantTrendsResponse)
+@router.get("/covenant-trends", response_model=CovenantTrendsResponse, dependencies=[Depends(etag_guard)])
+@analytics_cache.cached("covenant-trends", scopes=[MEASUREMENTS])
 def get_covenant_trends(
+    as_of: Optional[date] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get covenant status trends compared to previous period"""
-    # Get current covenant statuses
-    current_statuses = db.query(
-        CovenantMeasurement.status,
-        func.count(func.distinct(CovenantMeasurement.covenant_id)).label('count')
-    ).join(
-        Covenant
-    ).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Covenant.is_active == True
-    ).group_by(
-        CovenantMeasurement.status
-    ).all()
-
-    current_dict = {status: count for status, count in current_statuses}
-    current_compliant = current_dict.get('compliant', 0)
-    current_warning = current_dict.get('warning', 0)
-    current_breach = current_dict.get('breach', 0)
-
-    # Get previous period statuses (30 days ago)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-
-    previous_statuses = db.query(
-        CovenantMeasurement.status,
-        func.count(func.distinct(CovenantMeasurement.covenant_id)).label('count')
-    ).join(
-        Covenant
-    ).join(
-        LoanAgreement
-    ).filter(
-        LoanAgreement.user_id == current_user.id,
-        Covenant.is_active == True,
-        CovenantMeasurement.created_at < thirty_days_ago
-    ).group_by(
-        CovenantMeasurement.status
-    ).all()
-
-    previous_dict = {status: count for status, count in previous_statuses}
-    previous_compliant = previous_dict.get('compliant', 0)
-    previous_warning = previous_dict.get('warning', 0)
-    previous_breach = previous_dict.get('breach', 0)
+    """Get covenant status trends compared to 30 days earlier"""
+    trends = analytics_service.get_covenant_trends(db, current_user.id, as_of)
+
+    return CovenantTrendsResponse(**trends)
+
+# Widget name -> endpoint handler, called with current_user and db keyword arguments
+DASHBOARD_WIDGETS = {
+    "portfolio_summary": get_portfolio_summary,
+    "risk_heatmap": get_risk_heatmap,
+    "critical_alerts": get_critical_alerts,
+    "portfolio_value": get_portfolio_value,
+    "portfolio_trends": get_portfolio_trends,
+    "covenant_trends": get_covenant_trends,
+}
+AS_OF_WIDGETS = {"portfolio_summary", "risk_heatmap", "covenant_trends"}
+
+# Shared across requests and sized to the connection pool: each widget
+# holds one connection, so more threads would only queue on the pool
+dashboard_executor = ThreadPoolExecutor(
+    max_workers=settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW,
+    thread_name_prefix="dashboard-widget"
+)
 
-    # Calculate percentage changes
-    def calc_change(current, previous):
-        if previous == 0:
-            return 100.0 if current > 0 else 0.0
-        return ((current - previous) / previous) * 100.0
+def _evaluate_widget(name: str, current_user: User, as_of: Optional[date]):
+    """Run one widget on its own session (and so its own pooled connection)"""
+    db = SessionLocal()
+    try:
+        kwargs = {"current_user": current_user, "db": db}
+        if name in AS_OF_WIDGETS:
+            kwargs["as_of"] = as_of
+        # Serialized like the widget's own endpoint (and its cached value)
+        return jsonable_encoder(DASHBOARD_WIDGETS[name](**kwargs))
+    finally:
+        db.close()
+
+@router.get("/dashboard", response_model=DashboardResponse, response_model_exclude_unset=True, dependencies=[Depends(etag_guard)])
+def get_dashboard(
+    widgets: Optional[str] = None,
+    as_of: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get several dashboard widgets in one request.
+    Authenticates once and evaluates the widgets concurrently.
+    `widgets` is a comma-separated subset of the widget names (default: all).
+    """
+    requested = [w.strip() for w in widgets.split(",") if w.strip()] if widgets else list(DASHBOARD_WIDGETS)
+    unknown = [w for w in requested if w not in DASHBOARD_WIDGETS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown widgets: {', '.join(unknown)}"
+        )
+    
+    # Return the auth session's connection to the pool while the widgets run
+    db.close()
+    futures = {
+        name: dashboard_executor.submit(_evaluate_widget, name, current_user, as_of)
+        for name in dict.fromkeys(requested)
+    }
+    
+    return DashboardResponse(**{name: future.result() for name, future in futures.items()})
 
-    return CovenantTrendsResponse(
-        compliant_change=calc_change(current_compliant, previous_compliant),
-        warning_change=calc_change(current_warning, previous_warning),
-        breach_change=calc_change(current_breach, previous_breach)
-    )
+@router.get("/cache-stats")
+def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Analytics cache hit/miss counters for the serving worker process"""
+    return analytics_cache.stats()
@@ -1,22 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy import literal_column
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
 from app.database import get_db
 from app.models.user import User
-from app.models.covenant import Covenant, CovenantMeasurement
+from app.models.covenant import Covenant, CovenantMeasurement, CovenantAmendment, CovenantModelChoice
 from app.models.loan import LoanAgreement
-from app.models.alert import Alert
-from app.schemas.loan import CovenantResponse, MeasurementCreate, MeasurementResponse
-from app.api.deps import get_current_user
+from app.schemas.loan import (
+    CovenantResponse, MeasurementCreate, MeasurementResponse,
+    BulkMeasurementRow, BulkMeasurementRowResult, BulkMeasurementResult,
+    CovenantAmendmentCreate, CovenantAmendmentResponse, AmendmentResult
+)
+from app.api.deps import get_current_user, etag_guard
 from app.services.prediction_service import prediction_service
-from app.utils.helpers import calculate_distance_to_breach, determine_measurement_status
-from typing import List
+from app.services.analytics_service import analytics_service
+from app.services.data_version_service import data_version_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.trend_stats_service import trend_stats_service
+from app.services.alert_service import alert_service
+from app.services.model_choice_service import model_choice_service
+from app.services.measurement_service import measurement_service
+from app.services.amendment_service import amendment_service
+from app.services.idempotency_service import idempotency_service, IdempotencyKeyReused
+from app.services.cache_service import analytics_cache, LOANS, MEASUREMENTS, ALERTS
+from app.utils.helpers import calculate_distance_to_breach, determine_measurement_status, covenant_test_dates
+from app.utils.measurement_import import detect_format, read_rows
+from app.config import settings
+from typing import List, Optional
 from uuid import UUID
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/covenants", tags=["Covenants"])
 
-@router.get("/{covenant_id}", response_model=CovenantResponse)
+@router.get("/{covenant_id}", response_model=CovenantResponse, dependencies=[Depends(etag_guard)])
 def get_covenant(
     covenant_id: str,
     current_user: User = Depends(get_current_user),
@@ -46,14 +66,38 @@ def get_covenant(
     
     return CovenantResponse(**cov_dict)
 
+def _replay_idempotent(db: Session, user: User, key: Optional[str], request_hash: str) -> Optional[JSONResponse]:
+    """
+    Claim an Idempotency-Key in the request's transaction. Returns the
+    stored response when the key was already completed, None to run the
+    request.
+    """
+    if not key:
+        return None
+    try:
+        stored = idempotency_service.claim(db, user.id, key, request_hash)
+    except IdempotencyKeyReused:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if stored is None:
+        return None
+    return JSONResponse(stored.response_body, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
 @router.post("/{covenant_id}/measurements", response_model=MeasurementResponse, status_code=status.HTTP_201_CREATED)
 def add_measurement(
     covenant_id: str,
     measurement_data: MeasurementCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Add a new covenant measurement and trigger predictions"""
+    """
+    Add or replace the covenant's measurement for a date and trigger
+    predictions, in one transaction. Resending the same measurement
+    changes nothing; an Idempotency-Key header replays the first response.
+    """
     # Verify covenant belongs to user
     covenant = db.query(Covenant).join(LoanAgreement).filter(
         Covenant.id == UUID(covenant_id),
@@ -66,107 +110,134 @@ def add_measurement(
             detail="Covenant not found"
         )
     
-    # Calculate status and distance to breach
+    replay = _replay_idempotent(db, current_user, idempotency_key, idempotency_service.request_hash(
+        f"POST /api/covenants/{covenant.id}/measurements", measurement_data.model_dump_json().encode()
+    ))
+    if replay:
+        return replay
+    
+    rollup_before = portfolio_rollup_service.loan_counters(
+        db, current_user.id, covenant.loan_agreement_id, lock=True
+    )
+    
+    # Calculate status and distance to breach under the terms in force on the date
     actual_value = float(measurement_data.actual_value)
-    threshold_value = float(covenant.threshold_value) if covenant.threshold_value else None
+    threshold_value, threshold_operator = amendment_service.terms_at(
+        db, [(covenant.id, measurement_data.measurement_date)]
+    )[0]
+    threshold_value = float(threshold_value) if threshold_value else None
     
-    if threshold_value and covenant.threshold_operator:
+    if threshold_value and threshold_operator:
         status_result = determine_measurement_status(
             actual_value,
             threshold_value,
-            covenant.threshold_operator
+            threshold_operator
         )
         distance = calculate_distance_to_breach(
             actual_value,
             threshold_value,
-            covenant.threshold_operator
+            threshold_operator
         )
     else:
         status_result = 'compliant'
         distance = None
         threshold_value = None
     
-    # Create measurement
-    measurement = CovenantMeasurement(
-        covenant_id=UUID(covenant_id),
-        measurement_date=measurement_data.measurement_date,
-        actual_value=measurement_data.actual_value,
-        threshold_value=threshold_value,
-        status=status_result,
-        distance_to_breach=distance,
-        notes=measurement_data.notes
-    )
+    existing = db.query(CovenantMeasurement).filter(
+        CovenantMeasurement.covenant_id == covenant.id,
+        CovenantMeasurement.measurement_date == measurement_data.measurement_date
+    ).first()
     
-    db.add(measurement)
-    db.commit()
-    db.refresh(measurement)
-    
-    # Create alert if breach
-    if status_result == 'breach':
-        alert = Alert(
-            covenant_id=UUID(covenant_id),
-            loan_agreement_id=covenant.loan_agreement_id,
-            alert_type='breach',
-            severity='critical',
-            title=f'Covenant Breach: {covenant.covenant_name}',
-            message=f'Covenant has breached threshold. Actual: {actual_value}, Threshold: {threshold_value}',
-            is_read=False,
-            is_resolved=False
-        )
-        db.add(alert)
-        db.commit()
-    
-    # Trigger prediction update
-    measurements = db.query(CovenantMeasurement).filter(
-        CovenantMeasurement.covenant_id == UUID(covenant_id)
-    ).order_by(CovenantMeasurement.measurement_date).all()
-    
-    if len(measurements) >= 3 and threshold_value:
-        historical_data = [
-            {
-                'date': m.measurement_date.isoformat(),
-                'value': float(m.actual_value)
-            }
-            for m in measurements
-        ]
-        
-        prediction_result = prediction_service.predict_breach_date(
-            historical_data,
-            threshold_value,
-            covenant.threshold_operator
+    changed_scopes = []
+    if (existing and existing.actual_value == round(measurement_data.actual_value, 4)
+            and existing.notes == measurement_data.notes):
+        # A resent measurement: nothing to write
+        measurement_id = existing.id
+    else:
+        values = {
+            "actual_value": measurement_data.actual_value,
+            "threshold_value": threshold_value,
+            "status": status_result,
+            "distance_to_breach": distance,
+            "notes": measurement_data.notes
+        }
+        statement = insert(CovenantMeasurement).values(
+            covenant_id=covenant.id, measurement_date=measurement_data.measurement_date, **values
         )
+        statement = statement.on_conflict_do_update(
+            constraint='uq_covenant_measurements_covenant_date', set_=values
+        ).returning(CovenantMeasurement.id, literal_column('xmax = 0'))
+        measurement_id, inserted = db.execute(statement).one()
         
-        if prediction_result:
-            days_until = prediction_result['days_until_breach']
-            
-            # Determine severity based on days
-            if days_until <= 30:
-                severity = 'critical'
-            elif days_until <= 60:
-                severity = 'high'
-            else:
-                severity = 'medium'
-            
-            alert = Alert(
-                covenant_id=UUID(covenant_id),
-                loan_agreement_id=covenant.loan_agreement_id,
-                alert_type='prediction',
-                severity=severity,
-                title=f'Predicted Breach: {covenant.covenant_name}',
-                message=f'Breach predicted in {days_until} days. Confidence: {int(prediction_result["confidence"] * 100)}%',
-                predicted_breach_date=prediction_result['predicted_breach_date'],
-                days_until_breach=days_until,
-                is_read=False,
-                is_resolved=False
+        if not inserted:
+            # Rebuild rather than subtract the replaced value
+            trend_stats = trend_stats_service.recompute(db, covenant.id)
+        else:
+            trend_stats = trend_stats_service.record_measurement(
+                db, covenant.id, measurement_data.measurement_date, actual_value
             )
-            db.add(alert)
-            db.commit()
+        analytics_service.record_status_snapshots(db, [{
+            "covenant_id": covenant.id,
+            "as_of_date": measurement_data.measurement_date,
+            "status": status_result,
+            "distance_to_breach": distance
+        }])
+        changed_scopes.append(MEASUREMENTS)
+        
+        # Alert on entering breach, not again for a corrected breaching value
+        if status_result == 'breach' and not (existing and existing.status == 'breach'):
+            alert_service.insert_breach_alerts(db, [{
+                "covenant_id": covenant.id,
+                "loan_agreement_id": covenant.loan_agreement_id,
+                **alert_service.breach_alert_fields(covenant.covenant_name, actual_value, threshold_value)
+            }])
+            changed_scopes.append(ALERTS)
+        
+        # Forecast with the covenant's chosen model, against the latest terms
+        prediction_result = None
+        if covenant.threshold_value and covenant.threshold_operator:
+            prediction_result = model_choice_service.forecast(db, {
+                covenant.id: {
+                    "stats": trend_stats,
+                    "threshold_value": float(covenant.threshold_value),
+                    "threshold_operator": covenant.threshold_operator
+                }
+            })[covenant.id]
+        if prediction_result:
+            counts = alert_service.upsert_prediction_alerts(db, [{
+                "covenant_id": covenant.id,
+                "loan_agreement_id": covenant.loan_agreement_id,
+                **alert_service.prediction_alert_fields(covenant.covenant_name, prediction_result)
+            }])
+            if counts['inserted'] or counts['updated']:
+                changed_scopes.append(ALERTS)
+        elif alert_service.resolve_prediction_alerts(db, [covenant.id]):
+            changed_scopes.append(ALERTS)
+        
+        db.flush()
+        portfolio_rollup_service.apply_change(
+            db, current_user.id, rollup_before,
+            portfolio_rollup_service.loan_counters(db, current_user.id, covenant.loan_agreement_id)
+        )
+        data_version_service.bump(db, current_user.id)
     
+    measurement = db.query(CovenantMeasurement).filter(
+        CovenantMeasurement.id == measurement_id
+    ).populate_existing().one()
+    response = MeasurementResponse.from_orm(measurement)
+    if idempotency_key:
+        idempotency_service.complete(
+            db, current_user.id, idempotency_key, status.HTTP_201_CREATED, jsonable_encoder(response)
+        )
+    db.commit()
+    
+    if changed_scopes:
+        analytics_cache.invalidate(current_user.id, *changed_scopes)
     logger.info(f"Added measurement for covenant {covenant_id}, status: {status_result}")
     
-    return MeasurementResponse.from_orm(measurement)
+    return response
 
-@router.get("/{covenant_id}/measurements", response_model=List[MeasurementResponse])
+@router.get("/{covenant_id}/measurements", response_model=List[MeasurementResponse], dependencies=[Depends(etag_guard)])
 def get_measurements(
     covenant_id: str,
     current_user: User = Depends(get_current_user),
@@ -191,7 +262,118 @@ def get_measurements(
     
     return [MeasurementResponse.from_orm(m) for m in measurements]
 
-@router.get("/{covenant_id}/prediction")
+@router.delete("/{covenant_id}/measurements/{measurement_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_measurement(
+    covenant_id: str,
+    measurement_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a measurement and rebuild what was derived from it"""
+    measurement = db.query(CovenantMeasurement).join(Covenant).join(LoanAgreement).filter(
+        CovenantMeasurement.id == UUID(measurement_id),
+        CovenantMeasurement.covenant_id == UUID(covenant_id),
+        LoanAgreement.user_id == current_user.id
+    ).first()
+    
+    if not measurement:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Measurement not found"
+        )
+    
+    covenant = measurement.covenant
+    rollup_before = portfolio_rollup_service.loan_counters(
+        db, current_user.id, covenant.loan_agreement_id, lock=True
+    )
+    
+    db.delete(measurement)
+    db.flush()
+    
+    # Rebuild rather than subtract: first/last dates may move and
+    # subtracting accumulates rounding error
+    trend_stats_service.recompute(db, covenant.id)
+    analytics_service.refresh_status_snapshot(db, covenant.id, measurement.measurement_date)
+    portfolio_rollup_service.apply_change(
+        db, current_user.id, rollup_before,
+        portfolio_rollup_service.loan_counters(db, current_user.id, covenant.loan_agreement_id)
+    )
+    data_version_service.bump(db, current_user.id)
+    db.commit()
+    analytics_cache.invalidate(current_user.id, MEASUREMENTS)
+    
+    logger.info(f"Deleted measurement {measurement_id} for covenant {covenant_id}")
+    return None
+
+@router.get("/{covenant_id}/amendments", response_model=List[CovenantAmendmentResponse], dependencies=[Depends(etag_guard)])
+def get_amendments(
+    covenant_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a covenant's amendments, oldest first"""
+    covenant = db.query(Covenant).join(LoanAgreement).filter(
+        Covenant.id == UUID(covenant_id),
+        LoanAgreement.user_id == current_user.id
+    ).first()
+    
+    if not covenant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Covenant not found"
+        )
+    
+    amendments = db.query(CovenantAmendment).filter(
+        CovenantAmendment.covenant_id == covenant.id
+    ).order_by(CovenantAmendment.effective_date).all()
+    
+    return [CovenantAmendmentResponse.from_orm(a) for a in amendments]
+
+@router.post("/{covenant_id}/amendments", response_model=AmendmentResult, status_code=status.HTTP_201_CREATED)
+def amend_covenant(
+    covenant_id: str,
+    amendment_data: CovenantAmendmentCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Amend a covenant's threshold from a date and re-test the measurements
+    it applies to. Amending the same date again replaces its terms.
+    """
+    covenant = db.query(Covenant).join(LoanAgreement).filter(
+        Covenant.id == UUID(covenant_id),
+        LoanAgreement.user_id == current_user.id
+    ).first()
+    
+    if not covenant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Covenant not found"
+        )
+    
+    try:
+        result = amendment_service.amend(
+            db, current_user.id, covenant.loan_agreement_id,
+            [{"covenant_id": covenant.id, **amendment_data.model_dump()}]
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    response = AmendmentResult(
+        **{**result, "amendments": [CovenantAmendmentResponse.from_orm(a) for a in result['amendments']]}
+    )
+    data_version_service.bump(db, current_user.id)
+    db.commit()
+    analytics_cache.invalidate(current_user.id, LOANS, MEASUREMENTS, ALERTS)
+    
+    logger.info(
+        f"Amended covenant {covenant_id} from {amendment_data.effective_date}: "
+        f"{result['reevaluated']} measurements re-tested, {result['status_changes']} changed status"
+    )
+    return response
+
+@router.get("/{covenant_id}/prediction", dependencies=[Depends(etag_guard)])
 def get_covenant_prediction(
     covenant_id: str,
     current_user: User = Depends(get_current_user),
@@ -213,26 +395,169 @@ def get_covenant_prediction(
     if not covenant.threshold_value or not covenant.threshold_operator:
         return {"prediction": None, "message": "No threshold defined for covenant"}
     
-    # Get historical measurements
-    measurements = db.query(CovenantMeasurement).filter(
-        CovenantMeasurement.covenant_id == UUID(covenant_id)
-    ).order_by(CovenantMeasurement.measurement_date).all()
+    # The bootstrap resamples residuals of the current fit, which every new
+    # measurement changes, so it needs the series rather than running sums;
+    # the point prediction comes from the same series, with the covenant's
+    # chosen model as its prediction alert does
+    measurements = db.query(
+        CovenantMeasurement.measurement_date,
+        CovenantMeasurement.actual_value
+    ).filter(
+        CovenantMeasurement.covenant_id == covenant.id
+    ).all()
     
     if len(measurements) < 3:
         return {"prediction": None, "message": "Insufficient historical data (minimum 3 measurements required)"}
     
-    historical_data = [
+    model_choice = db.get(CovenantModelChoice, covenant.id)
+    series = {
+        covenant.id: {
+            "historical_values": [
+                {"date": measurement_date, "value": float(actual_value)}
+                for measurement_date, actual_value in measurements
+            ],
+            "threshold_value": float(covenant.threshold_value),
+            "threshold_operator": covenant.threshold_operator,
+            # Linear until the re-forecast job has chosen a model
+            "model": model_choice.model_name if model_choice else 'linear',
+            "model_n_measurements": model_choice.n_measurements if model_choice else len(measurements),
+            "test_dates": covenant_test_dates(
+                max(measurement_date for measurement_date, _ in measurements),
+                covenant.next_test_date,
+                covenant.frequency
+            )
+        }
+    }
+    predictions, choices = prediction_service.forecast_many(series)
+    prediction_result = predictions[covenant.id]
+    # Simulate with the model the prediction used, reselected if the choice was stale
+    if covenant.id in choices:
+        series[covenant.id]["model"] = choices[covenant.id]["model"]
+    forecast = prediction_service.simulate_many(series, simulations=settings.FORECAST_SIMULATIONS)[covenant.id]
+    
+    return {"prediction": prediction_result, "forecast": forecast}
+
+@router.post("/measurements/bulk", response_model=BulkMeasurementResult, status_code=status.HTTP_201_CREATED)
+def add_measurements_bulk(
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Add many measurements from a CSV, XLSX or NDJSON file with columns
+    covenant_id, measurement_date, actual_value and optionally notes.
+    Valid rows are upserted in one transaction like add_measurement;
+    invalid rows, rows for unknown covenants and rows repeated later in
+    the file are rejected and reported per row. An Idempotency-Key header
+    replays the first response for the same file.
+    """
+    file_format = detect_format(file.filename, file.content_type)
+    if not file_format:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only CSV, XLSX and NDJSON files are allowed"
+        )
+    
+    content = file.file.read(settings.MAX_UPLOAD_SIZE + 1)
+    if len(content) > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File size exceeds {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB limit"
+        )
+    
+    try:
+        raw_rows = read_rows(content, file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    replay = _replay_idempotent(db, current_user, idempotency_key, idempotency_service.request_hash(
+        "POST /api/covenants/measurements/bulk", content
+    ))
+    if replay:
+        return replay
+    
+    results, valid = [], []
+    for number, raw in enumerate(raw_rows, start=1):
+        try:
+            row = BulkMeasurementRow.model_validate({key: None if value == '' else value for key, value in raw.items()})
+        except ValidationError as e:
+            error = e.errors()[0]
+            results.append(BulkMeasurementRowResult(
+                row=number, result='rejected',
+                error=f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            ))
+            continue
+        results.append(BulkMeasurementRowResult(
+            row=number, result='created', covenant_id=row.covenant_id, measurement_date=row.measurement_date
+        ))
+        valid.append((results[-1], row))
+    
+    # Ownership of every referenced covenant in one query
+    covenant_ids = {row.covenant_id for _, row in valid}
+    covenants = {
+        covenant.id: covenant
+        for covenant in db.query(Covenant).join(LoanAgreement).filter(
+            Covenant.id.in_(covenant_ids),
+            LoanAgreement.user_id == current_user.id
+        )
+    } if covenant_ids else {}
+    
+    # The last row for a covenant and date wins
+    last_rows = {(row.covenant_id, row.measurement_date): result.row for result, row in valid}
+    accepted = []
+    for result, row in valid:
+        if row.covenant_id not in covenants:
+            result.result = 'rejected'
+            result.error = "Covenant not found"
+        elif last_rows[(row.covenant_id, row.measurement_date)] != result.row:
+            result.result = 'rejected'
+            result.error = f"Superseded by row {last_rows[(row.covenant_id, row.measurement_date)]}"
+        else:
+            accepted.append((result, row))
+    
+    counts = measurement_service.record_many(db, current_user.id, covenants, [
         {
-            'date': m.measurement_date.isoformat(),
-            'value': float(m.actual_value)
+            "covenant_id": row.covenant_id,
+            "measurement_date": row.measurement_date,
+            "actual_value": row.actual_value,
+            "notes": row.notes
         }
-        for m in measurements
-    ]
+        for _, row in accepted
+    ])
+    for (result, _), recorded in zip(accepted, counts['rows']):
+        result.result = recorded['result']
+        result.measurement_id = recorded['id']
+        result.status = recorded['status']
+        result.distance_to_breach = recorded['distance_to_breach']
     
-    prediction_result = prediction_service.predict_breach_date(
-        historical_data,
-        float(covenant.threshold_value),
-        covenant.threshold_operator
+    response = BulkMeasurementResult(
+        rows=len(results),
+        created=counts['measurements'],
+        updated=counts['updated'],
+        unchanged=counts['unchanged'],
+        rejected=len(results) - len(accepted),
+        breach_alerts=counts['breach_alerts'],
+        prediction_alerts=counts['prediction_alerts'],
+        results=results
     )
+    written = counts['measurements'] + counts['updated']
+    if written:
+        data_version_service.bump(db, current_user.id)
+    if idempotency_key:
+        idempotency_service.complete(
+            db, current_user.id, idempotency_key, status.HTTP_201_CREATED, jsonable_encoder(response)
+        )
+    db.commit()
+    
+    if written:
+        changed_scopes = [MEASUREMENTS]
+        if counts['breach_alerts'] or counts['prediction_alerts']:
+            changed_scopes.append(ALERTS)
+        analytics_cache.invalidate(current_user.id, *changed_scopes)
     
-    return {"prediction": prediction_result}
+    logger.info(
+        f"Bulk upload from {file_format}: {counts['measurements']} created, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged, {response.rejected} rejected"
+    )
+    return response
@@ -0,0 +1,153 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.user import User
+from app.models.loan import LoanAgreement
+from app.models.covenant import Covenant, CovenantMeasurement
+from app.models.borrower_financials import BorrowerFinancial
+from app.schemas.loan import BorrowerFinancialCreate, BorrowerFinancialResponse, FinancialsIngestResult, RatioForecast
+from app.api.deps import get_current_user, etag_guard
+from app.services.ratio_service import ratio_service, METRICS
+from app.services.measurement_service import measurement_service
+from app.services.data_version_service import data_version_service
+from app.services.cache_service import analytics_cache, MEASUREMENTS, ALERTS
+from typing import List, Optional
+from uuid import UUID
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/financials", tags=["Financials"])
+
+def _get_loan(db: Session, loan_id: str, user: User) -> LoanAgreement:
+    loan = db.query(LoanAgreement).filter(
+        LoanAgreement.id == UUID(loan_id),
+        LoanAgreement.user_id == user.id
+    ).first()
+    if not loan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Loan not found"
+        )
+    return loan
+
+@router.get("/forecast", response_model=List[RatioForecast], dependencies=[Depends(etag_guard)])
+def get_ratio_forecasts(
+    loan_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Forecast covenant ratios from borrower financials, with predicted breach dates"""
+    if loan_id:
+        _get_loan(db, loan_id, current_user)
+    return ratio_service.forecast_covenants(db, current_user.id, UUID(loan_id) if loan_id else None)
+
+@router.get("/{loan_id}", response_model=List[BorrowerFinancialResponse], dependencies=[Depends(etag_guard)])
+def get_financials(
+    loan_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a loan's borrower financials by reporting period, with computed ratios"""
+    loan = _get_loan(db, loan_id, current_user)
+    financials = db.query(BorrowerFinancial).filter(
+        BorrowerFinancial.loan_agreement_id == loan.id
+    ).order_by(BorrowerFinancial.reporting_period).all()
+    if not financials:
+        return []
+
+    loaded = ratio_service.load_financials(db, [loan.id])
+    ratios = ratio_service.compute_ratios(loaded)
+    flags = ratio_service.not_meaningful(loaded)
+    response = []
+    for column, financial in enumerate(financials):
+        item = BorrowerFinancialResponse.from_orm(financial)
+        item.ratios = {
+            name: round(float(values[0, column]), 4) if np.isfinite(values[0, column]) else None
+            for name, values in ratios.items()
+        }
+        item.ratios_not_meaningful = [name for name, values in flags.items() if values[0, column]]
+        response.append(item)
+    return response
+
+@router.post("/{loan_id}", response_model=FinancialsIngestResult, status_code=status.HTTP_201_CREATED)
+def add_financials(
+    loan_id: str,
+    financials_data: List[BorrowerFinancialCreate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Add or update borrower financials by reporting period and record the
+    covenant measurements they imply. Active covenants whose name maps to
+    a standard ratio get one measurement per reported period, unless they
+    were already measured on that date.
+    """
+    loan = _get_loan(db, loan_id, current_user)
+    if not financials_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No financials provided"
+        )
+
+    # Later entries for the same period win
+    by_period = {item.reporting_period: item for item in financials_data}
+    existing = {
+        financial.reporting_period: financial
+        for financial in db.query(BorrowerFinancial).filter(
+            BorrowerFinancial.loan_agreement_id == loan.id,
+            BorrowerFinancial.reporting_period.in_(list(by_period))
+        )
+    }
+    for period, item in by_period.items():
+        financial = existing.get(period)
+        if financial is None:
+            financial = BorrowerFinancial(loan_agreement_id=loan.id, reporting_period=period)
+            db.add(financial)
+        for metric in METRICS:
+            setattr(financial, metric, getattr(item, metric))
+        financial.custom_metrics = item.custom_metrics
+    db.flush()
+
+    covenants = {
+        covenant.id: covenant
+        for covenant in db.query(Covenant).filter(
+            Covenant.loan_agreement_id == loan.id,
+            Covenant.is_active == True
+        )
+        if ratio_service.covenant_ratio(covenant.covenant_name)
+    }
+    measurements, not_meaningful = [], 0
+    if covenants:
+        measurements, not_meaningful = ratio_service.period_measurements(
+            ratio_service.load_financials(db, [loan.id]), list(covenants.values()), list(by_period)
+        )
+    measured = set(db.query(CovenantMeasurement.covenant_id, CovenantMeasurement.measurement_date).filter(
+        CovenantMeasurement.covenant_id.in_(list(covenants)),
+        CovenantMeasurement.measurement_date.in_(list(by_period))
+    ).all()) if measurements else set()
+    new_measurements = [
+        row for row in measurements if (row['covenant_id'], row['measurement_date']) not in measured
+    ]
+
+    counts = measurement_service.record_many(db, current_user.id, covenants, new_measurements)
+    data_version_service.bump(db, current_user.id)
+    db.commit()
+
+    changed_scopes = [MEASUREMENTS]
+    if counts['breach_alerts'] or counts['prediction_alerts']:
+        changed_scopes.append(ALERTS)
+    analytics_cache.invalidate(current_user.id, *changed_scopes)
+    logger.info(
+        f"Added {len(by_period)} financial periods for loan {loan_id}, "
+        f"{counts['measurements']} measurements"
+    )
+
+    return FinancialsIngestResult(
+        financials=len(by_period),
+        measurements_created=counts['measurements'],
+        measurements_skipped=len(measurements) - len(new_measurements),
+        measurements_not_meaningful=not_meaningful,
+        breach_alerts=counts['breach_alerts'],
+        prediction_alerts=counts['prediction_alerts']
+    )
@@ -5,10 +5,16 @@ from app.database import get_db
 from app.models.user import User
 from app.models.loan import LoanAgreement
 from app.models.covenant import Covenant
-from app.schemas.loan import LoanResponse, CovenantResponse
-from app.api.deps import get_current_user
+from app.schemas.loan import (
+    LoanResponse, CovenantResponse, LoanAmendmentCreate, CovenantAmendmentResponse, AmendmentResult
+)
+from app.api.deps import get_current_user, etag_guard
 from app.services.pdf_service import pdf_service
 from app.services.openai_service import openai_service
+from app.services.cache_service import analytics_cache, LOANS, MEASUREMENTS, ALERTS
+from app.services.data_version_service import data_version_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.amendment_service import amendment_service
 from app.config import settings
 from typing import List, Optional
 from datetime import date
@@ -29,6 +35,7 @@ async def process_loan_extraction(loan_id: str, file_path: str, db: Session):
             return
         
         loan.ai_extraction_status = "processing"
+        data_version_service.bump(db, loan.user_id)
         db.commit()
         
         # Extract text from PDF
@@ -36,6 +43,7 @@ async def process_loan_extraction(loan_id: str, file_path: str, db: Session):
         
         if not extracted_text:
             loan.ai_extraction_status = "failed"
+            data_version_service.bump(db, loan.user_id)
             db.commit()
             logger.error(f"Failed to extract text from PDF for loan {loan_id}")
             return
@@ -46,6 +54,8 @@ async def process_loan_extraction(loan_id: str, file_path: str, db: Session):
             loan.title
         )
         
+        rollup_before = portfolio_rollup_service.loan_counters(db, loan.user_id, loan.id, lock=True)
+        
         # Store full extraction result
         loan.ai_extraction_result = extraction_result
         
@@ -77,14 +87,23 @@ async def process_loan_extraction(loan_id: str, file_path: str, db: Session):
             db.add(covenant)
         
         loan.ai_extraction_status = "completed"
+        db.flush()
+        portfolio_rollup_service.apply_change(
+            db, loan.user_id, rollup_before,
+            portfolio_rollup_service.loan_counters(db, loan.user_id, loan.id)
+        )
+        data_version_service.bump(db, loan.user_id)
         db.commit()
+        analytics_cache.invalidate(loan.user_id, LOANS)
         
         logger.info(f"Successfully extracted {len(covenants_data)} covenants from loan {loan_id}")
         
     except Exception as e:
         logger.error(f"Error in background extraction for loan {loan_id}: {e}")
         if loan:
+            db.rollback()
             loan.ai_extraction_status = "failed"
+            data_version_service.bump(db, loan.user_id)
             db.commit()
 
 @router.post("/upload", response_model=LoanResponse, status_code=status.HTTP_201_CREATED)
@@ -135,15 +154,22 @@ async def upload_loan_agreement(
     )
     
     db.add(loan)
+    db.flush()
+    portfolio_rollup_service.apply_change(
+        db, current_user.id, {},
+        portfolio_rollup_service.loan_counters(db, current_user.id, loan.id)
+    )
+    data_version_service.bump(db, current_user.id)
     db.commit()
     db.refresh(loan)
+    analytics_cache.invalidate(current_user.id, LOANS)
     
     # Trigger background extraction
     background_tasks.add_task(process_loan_extraction, str(loan.id), file_path, db)
     
     return LoanResponse.from_orm(loan)
 
-@router.get("/", response_model=List[LoanResponse])
+@router.get("/", response_model=List[LoanResponse], dependencies=[Depends(etag_guard)])
 def list_loans(
     skip: int = 0,
     limit: int = 50,
@@ -170,7 +196,7 @@ def list_loans(
     
     return result
 
-@router.get("/{loan_id}", response_model=LoanResponse)
+@router.get("/{loan_id}", response_model=LoanResponse, dependencies=[Depends(etag_guard)])
 def get_loan(
     loan_id: str,
     current_user: User = Depends(get_current_user),
@@ -192,7 +218,7 @@ def get_loan(
     
     return LoanResponse.from_orm(loan)
 
-@router.get("/{loan_id}/covenants", response_model=List[CovenantResponse])
+@router.get("/{loan_id}/covenants", response_model=List[CovenantResponse], dependencies=[Depends(etag_guard)])
 def get_loan_covenants(
     loan_id: str,
     current_user: User = Depends(get_current_user),
@@ -235,6 +261,69 @@ def get_loan_covenants(
     
     return result
 
+@router.post("/{loan_id}/amendments", response_model=AmendmentResult, status_code=status.HTTP_201_CREATED)
+def amend_loan_covenants(
+    loan_id: str,
+    amendments: List[LoanAmendmentCreate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Amend thresholds of several of a loan's covenants at once (one
+    amendment agreement) and re-test their measurements in one transaction.
+    """
+    from uuid import UUID
+    
+    loan = db.query(LoanAgreement).filter(
+        LoanAgreement.id == UUID(loan_id),
+        LoanAgreement.user_id == current_user.id
+    ).first()
+    
+    if not loan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Loan not found"
+        )
+    if not amendments:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No amendments given"
+        )
+    
+    covenant_ids = {amendment.covenant_id for amendment in amendments}
+    found = {
+        covenant_id for (covenant_id,) in db.query(Covenant.id).filter(
+            Covenant.id.in_(covenant_ids),
+            Covenant.loan_agreement_id == loan.id
+        )
+    }
+    if found != covenant_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Covenant not found on this loan: {', '.join(str(c) for c in covenant_ids - found)}"
+        )
+    
+    try:
+        result = amendment_service.amend(
+            db, current_user.id, loan.id, [amendment.model_dump() for amendment in amendments]
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    response = AmendmentResult(
+        **{**result, "amendments": [CovenantAmendmentResponse.from_orm(a) for a in result['amendments']]}
+    )
+    data_version_service.bump(db, current_user.id)
+    db.commit()
+    analytics_cache.invalidate(current_user.id, LOANS, MEASUREMENTS, ALERTS)
+    
+    logger.info(
+        f"Amended {len(covenant_ids)} covenants of loan {loan_id}: "
+        f"{result['reevaluated']} measurements re-tested, {result['status_changes']} changed status"
+    )
+    return response
+
 @router.delete("/{loan_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_loan(
     loan_id: str,
@@ -262,8 +351,13 @@ def delete_loan(
         except Exception as e:
             logger.error(f"Error deleting file: {e}")
     
+    rollup_before = portfolio_rollup_service.loan_counters(db, current_user.id, loan.id, lock=True)
     db.delete(loan)
+    db.flush()
+    portfolio_rollup_service.apply_change(db, current_user.id, rollup_before, {})
+    data_version_service.bump(db, current_user.id)
     db.commit()
+    analytics_cache.invalidate(current_user.id, LOANS)
     
     logger.info(f"Deleted loan {loan_id}")
     return None
@@ -8,6 +8,8 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10  # Connections opened beyond the pool under load
     
     # Security
     SECRET_KEY: str
@@ -22,6 +24,22 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     
+    # Writes
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24  # How long a retried Idempotency-Key replays the first response
+    
+    # Analytics
+    ANALYTICS_CACHE_BACKEND: str = "memory"  # memory, redis (shared across workers), none
+    ANALYTICS_CACHE_URL: str = "redis://localhost:6379/0"
+    ANALYTICS_CACHE_TTL_SECONDS: int = 300
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 10000  # memory backend only
+    FORECAST_SIMULATIONS: int = 1000  # Bootstrap paths per covenant for probabilistic forecasts
+    
+    # Alert stream
+    ALERT_STREAM_HEARTBEAT_SECONDS: int = 15  # Keeps idle connections open through proxies
+    ALERT_STREAM_BUFFER: int = 100  # Events queued per connection before a slow client is dropped
+    ALERT_STREAM_REPLAY_LIMIT: int = 500  # Missed alerts replayed on reconnect, beyond which clients resync
+    ALERT_STREAM_TICKET_TTL_SECONDS: int = 30  # Lifetime of the single-use ticket that opens a stream
+    
     # CORS
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
     
@@ -0,0 +1,324 @@
+"""
+Rolling-origin backtest of the breach forecasts.
+
+Replays each covenant's measurement history: for every prefix (origin)
+that is not already in breach, forecast the breach date from the prefix
+alone and compare it with the first later measurement that actually
+breached within the horizon. Scores hit rate, false alarms and
+breach-date error for every model in forecast_models.MODELS and for the
+model PredictionService would select by cross-validation on that prefix.
+
+Covenants are read in chunks through the re-forecast job's server-side
+cursor (or generated, with --synthetic) and scored across a process pool;
+all origins of a chunk are forecast as one batch per model. Origins whose
+history ends before the horizon without a breach are censored and left
+out of the scores. Actual breaches are only seen on test dates, so even
+an exact forecast reads as early by up to one test interval.
+
+    python -m app.jobs.backtest [--workers 4] [--chunk-size 500] [--horizon 365]
+                                [--user <uuid> | --synthetic 100000] [--report backtest_report.json]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional
+from uuid import UUID
+
+import numpy as np
+
+from app.services.forecast_models import MODELS
+from app.services.prediction_service import prediction_service
+
+logger = logging.getLogger(__name__)
+
+SELECTED = 'selected'
+
+# Share of hits whose predicted date is within this many days of the actual breach
+CLOSE_DAYS = 45
+
+
+def synthetic_series(seed: int, start: int, count: int) -> Dict[str, Dict]:
+    """
+    Quarterly covenant series that trend, swing seasonally or level off,
+    in the re-forecast job's series format. Chunks are reproducible from
+    (seed, start) alone, so workers generate their own.
+    """
+    rng = np.random.default_rng([seed, start])
+    series = {}
+    for i in range(start, start + count):
+        n = int(rng.integers(4, 28))
+        t = np.arange(n)
+        kind = i % 3
+        if kind == 0:
+            values = 3 + rng.uniform(-0.08, 0.08) * t
+        elif kind == 1:
+            values = 3 + rng.uniform(-0.03, 0.03) * t + rng.uniform(0.2, 0.6) * np.tile(
+                rng.permutation([1.0, 0.3, -0.5, -0.8]), n // 4 + 1)[:n]
+        else:
+            values = 3 + rng.uniform(-1, 1) * (1 - rng.uniform(0.6, 0.9) ** t)
+        values = values + rng.normal(0, 0.05, n)
+
+        first = date(2018, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+        series[f"synthetic-{i}"] = {
+            "historical_values": [
+                {"date": (first + timedelta(days=int(91 * k + rng.integers(-5, 6)))).isoformat(), "value": float(v)}
+                for k, v in zip(t, values)
+            ],
+            "threshold_value": 3.5,
+            "threshold_operator": 'less_than'
+        }
+    return series
+
+
+def _empty_scores() -> Dict[str, Dict]:
+    return {
+        name: {"origins": 0, "fallback": 0, "predicted": 0, "actual": 0, "hits": 0,
+               "misses": 0, "false_alarms": 0, "errors": np.empty(0, dtype=np.int32)}
+        for name in [*MODELS, SELECTED]
+    }
+
+
+def score_chunk(series: Dict, horizon: int = 365, min_history: int = 3) -> Dict:
+    """
+    Backtest every origin of a chunk of series.
+
+    Origins are expanded into one padded batch of prefixes, so each model
+    fits and forecasts the whole chunk at once. Prefixes too short for a
+    model fall back to the linear trend, as model selection does.
+
+    Returns:
+        {"covenants", "origins", "censored", "in_breach", "scores"}; scores
+        holds outcome counts per model and the signed breach-date errors
+        (predicted minus actual days) of its hits
+    """
+    result = {"covenants": 0, "origins": 0, "censored": 0, "in_breach": 0, "scores": _empty_scores()}
+    batch = prediction_service._pad_many(series)
+    if batch is None:
+        return result
+    x, y, lengths = batch['x'], batch['y'], batch['lengths']
+    thresholds, operators = batch['thresholds'], batch['operators']
+    result["covenants"] = len(lengths)
+
+    # One row per (covenant, origin): the first k points are known
+    origins_per = np.maximum(lengths - min_history, 0)
+    rows = np.repeat(np.arange(len(lengths)), origins_per)
+    if not len(rows):
+        return result
+    k = min_history + np.arange(len(rows)) - np.repeat(np.cumsum(origins_per) - origins_per, origins_per)
+
+    columns = np.arange(x.shape[1])[None, :]
+    origin_x = x[rows, k - 1]
+    breached_points = prediction_service._check_breach_many(y[rows], thresholds[rows, None], operators[rows, None])
+    in_breach = breached_points[np.arange(len(rows)), k - 1]
+
+    # First later measurement that breached within the horizon
+    ahead = x[rows] - origin_x[:, None]
+    future = (columns >= k[:, None]) & (columns < lengths[rows, None]) & (ahead <= horizon)
+    actual_breach = breached_points & future
+    actual = actual_breach.any(axis=1)
+    actual_day = ahead[np.arange(len(rows)), np.argmax(actual_breach, axis=1)].astype(np.int32)
+    covered = actual | (x[rows, lengths[rows] - 1] - origin_x >= horizon)
+
+    scored = covered & ~in_breach
+    result["origins"] = int(len(rows))
+    result["censored"] = int((~covered & ~in_breach).sum())
+    result["in_breach"] = int(in_breach.sum())
+    rows, k, actual, actual_day = rows[scored], k[scored], actual[scored], actual_day[scored]
+    if not len(rows):
+        return result
+
+    known = columns < k[:, None]
+    prefix_x = np.where(known, x[rows], 0)
+    prefix_y = np.where(known, y[rows], 0)
+    days_ahead = np.broadcast_to(np.arange(1, horizon + 1)[None, :], (len(rows), horizon))
+
+    predicted_days = {}
+    for name, model in MODELS.items():
+        days = np.zeros(len(rows), dtype=np.int32)
+        fitted = np.flatnonzero(k >= model.min_points)
+        if len(fitted):
+            state = model.fit(prefix_x[fitted], prefix_y[fitted], k[fitted])
+            values = model.forecast(state, days_ahead[fitted])
+            breached = prediction_service._check_breach_many(
+                values, thresholds[rows[fitted], None], operators[rows[fitted], None]
+            )
+            days[fitted] = np.where(breached.any(axis=1), np.argmax(breached, axis=1) + 1, 0)
+        fallback = k < model.min_points
+        if name != 'linear':
+            days[fallback] = predicted_days['linear'][fallback]
+        predicted_days[name] = days
+        result["scores"][name]["fallback"] = int(fallback.sum())
+
+    selected, _ = prediction_service._select_models(prefix_x, prefix_y, k)
+    predicted_days[SELECTED] = np.select(
+        [selected == name for name in MODELS], [predicted_days[name] for name in MODELS], default=0
+    ).astype(np.int32)
+
+    for name, days in predicted_days.items():
+        predicted = days > 0
+        hits = predicted & actual
+        scores = result["scores"][name]
+        scores.update({
+            "origins": int(len(rows)),
+            "predicted": int(predicted.sum()),
+            "actual": int(actual.sum()),
+            "hits": int(hits.sum()),
+            "misses": int((actual & ~predicted).sum()),
+            "false_alarms": int((predicted & ~actual).sum()),
+            "errors": (days[hits] - actual_day[hits]).astype(np.int32)
+        })
+    return result
+
+
+def _score_series(series: Dict, horizon: int, min_history: int):
+    """Worker: score one streamed chunk, returning the scores and seconds spent"""
+    start = time.perf_counter()
+    return score_chunk(series, horizon, min_history), time.perf_counter() - start
+
+
+def _score_synthetic(seed: int, start_index: int, count: int, horizon: int, min_history: int):
+    """Worker: generate and score one synthetic chunk"""
+    start = time.perf_counter()
+    return score_chunk(synthetic_series(seed, start_index, count), horizon, min_history), time.perf_counter() - start
+
+
+def _merge(totals: Dict, chunk: Dict) -> None:
+    for key in ("covenants", "origins", "censored", "in_breach"):
+        totals[key] += chunk[key]
+    for name, scores in chunk["scores"].items():
+        total = totals["scores"][name]
+        for key, value in scores.items():
+            if key == "errors":
+                total["error_chunks"].append(value)
+            else:
+                total[key] += value
+
+
+def summarize(scores: Dict) -> Dict:
+    """Rates and breach-date error statistics from a model's merged outcome counts"""
+    errors = np.concatenate(scores["error_chunks"]) if scores["error_chunks"] else np.empty(0)
+    absolute = np.abs(errors)
+    summary = {key: value for key, value in scores.items() if key != "error_chunks"}
+    summary.update({
+        "hit_rate": round(scores["hits"] / scores["actual"], 4) if scores["actual"] else None,
+        "precision": round(scores["hits"] / scores["predicted"], 4) if scores["predicted"] else None,
+        "false_alarm_rate": round(scores["false_alarms"] / (scores["origins"] - scores["actual"]), 4)
+        if scores["origins"] > scores["actual"] else None,
+        "mean_abs_error_days": round(float(absolute.mean()), 1) if len(errors) else None,
+        "median_abs_error_days": float(np.median(absolute)) if len(errors) else None,
+        "p90_abs_error_days": float(np.percentile(absolute, 90)) if len(errors) else None,
+        "bias_days": round(float(errors.mean()), 1) if len(errors) else None,
+        f"within_{CLOSE_DAYS}_days": round(float((absolute <= CLOSE_DAYS).mean()), 4) if len(errors) else None
+    })
+    return summary
+
+
+def _db_chunks(user_id: Optional[UUID], chunk_size: int) -> Iterator[Dict]:
+    from app.jobs.reforecast import stream_chunks
+    for series, _ in stream_chunks(user_id, chunk_size):
+        yield series
+
+
+def run(user_id: Optional[UUID] = None, synthetic: int = 0, workers: Optional[int] = None,
+        chunk_size: int = 500, horizon: int = 365, min_history: int = 3, seed: int = 0) -> Dict:
+    """
+    Backtest the portfolio (or one user's, or a synthetic one) and return
+    the report: parameters, origin counts, per-model scores and timings.
+    At most two chunks per worker are in flight.
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {"covenants": 0, "origins": 0, "censored": 0, "in_breach": 0,
+              "scores": {name: {**{key: 0 for key in _empty_scores()[name] if key != "errors"}, "error_chunks": []}
+                         for name in [*MODELS, SELECTED]}}
+    timings = {"read_seconds": 0.0, "score_seconds": 0.0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+
+        def collect(done):
+            for future in done:
+                pending.discard(future)
+                chunk, seconds = future.result()
+                timings["score_seconds"] += seconds
+                _merge(totals, chunk)
+
+        if synthetic:
+            submissions = (
+                (_score_synthetic, seed, start, min(chunk_size, synthetic - start), horizon, min_history)
+                for start in range(0, synthetic, chunk_size)
+            )
+        else:
+            submissions = ((_score_series, series, horizon, min_history) for series in _db_chunks(user_id, chunk_size))
+
+        while True:
+            start = time.perf_counter()
+            submission = next(submissions, None)
+            timings["read_seconds"] += time.perf_counter() - start
+            if submission is None:
+                break
+            pending.add(executor.submit(*submission))
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(list(pending))
+
+    timings["elapsed_seconds"] = time.perf_counter() - started
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "parameters": {"source": "synthetic" if synthetic else "database",
+                       "user_id": str(user_id) if user_id else None, "horizon_days": horizon,
+                       "min_history": min_history, "workers": workers, "chunk_size": chunk_size,
+                       "seed": seed if synthetic else None},
+        "covenants": totals["covenants"],
+        "origins": totals["origins"],
+        "origins_in_breach": totals["in_breach"],
+        "origins_censored": totals["censored"],
+        "models": {name: summarize(scores) for name, scores in totals["scores"].items()},
+        "timings": {key: round(value, 2) for key, value in timings.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of covenant breach forecasts")
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Covenants per chunk")
+    parser.add_argument("--horizon", type=int, default=365, help="Days ahead a breach must be predicted")
+    parser.add_argument("--min-history", type=int, default=3, help="Measurements before the first origin")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--user", type=UUID, help="Only backtest this user's covenants")
+    source.add_argument("--synthetic", type=int, default=0, help="Backtest this many generated covenants instead")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --synthetic")
+    parser.add_argument("--report", default="backtest_report.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report = run(args.user, args.synthetic, args.workers, args.chunk_size, args.horizon, args.min_history, args.seed)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    elapsed = report["timings"]["elapsed_seconds"]
+    scored = report["models"]["linear"]["origins"]
+    print(f"Backtested {report['covenants']} covenants, {report['origins']} origins in {elapsed:.2f}s "
+          f"({report['origins'] / elapsed if elapsed else 0:.0f} origins/s)")
+    print(f"Scored {scored}; {report['origins_in_breach']} already in breach, "
+          f"{report['origins_censored']} censored")
+    print(f"{'model':<14}{'hit rate':>10}{'precision':>11}{'false alarm':>13}"
+          f"{'MAE days':>10}{'median':>8}{'bias':>8}{f'<={CLOSE_DAYS}d':>8}")
+    for name, summary in report["models"].items():
+        def show(value, spec):
+            return format(value, spec) if value is not None else '-'
+        print(f"{name:<14}{show(summary['hit_rate'], '>10.3f'):>10}{show(summary['precision'], '>11.3f'):>11}"
+              f"{show(summary['false_alarm_rate'], '>13.3f'):>13}{show(summary['mean_abs_error_days'], '>10.1f'):>10}"
+              f"{show(summary['median_abs_error_days'], '>8.0f'):>8}{show(summary['bias_days'], '>8.1f'):>8}"
+              f"{show(summary[f'within_{CLOSE_DAYS}_days'], '>8.3f'):>8}")
+    print(f"Timings: read {report['timings']['read_seconds']:.2f}s, "
+          f"score {report['timings']['score_seconds']:.2f}s (across workers); report written to {args.report}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
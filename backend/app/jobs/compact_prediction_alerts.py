@@ -0,0 +1,118 @@
+"""
+Collapse duplicate open prediction alerts to one per covenant.
+
+Prediction alerts used to be inserted on every forecast, so covenants
+piled up near-identical open ones. This one-off job keeps the latest open
+prediction alert of each covenant and deletes the rest, one batch of
+covenants per transaction, rebuilding the owners' rollups as it goes.
+Run it before the add_open_prediction_alert_index migration, which then
+only has stragglers left to remove (rerunning is safe):
+
+    python -m app.jobs.compact_prediction_alerts [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+from sqlalchemy import select, delete, func
+
+from app.database import SessionLocal
+from app.models.alert import Alert
+from app.models.covenant import Covenant
+from app.models.loan import LoanAgreement
+from app.models.portfolio_rollup import PortfolioRollup
+from app.services.cache_service import analytics_cache, ALERTS
+from app.services.data_version_service import data_version_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+
+logger = logging.getLogger(__name__)
+
+
+def duplicated_covenants(db) -> List:
+    """Ids of covenants with more than one open prediction alert"""
+    return db.execute(
+        select(Alert.covenant_id).where(
+            Alert.alert_type == 'prediction',
+            Alert.is_resolved == False
+        ).group_by(
+            Alert.covenant_id
+        ).having(func.count() > 1)
+    ).scalars().all()
+
+
+def compact_batch(db, covenant_ids: List, dry_run: bool = False) -> int:
+    """
+    Delete all but the latest open prediction alert of each covenant and
+    refresh the owners' rollups in one transaction.
+
+    Returns:
+        How many alerts were (or, with dry_run, would be) deleted
+    """
+    ranked = select(
+        Alert.id,
+        func.row_number().over(
+            partition_by=Alert.covenant_id,
+            order_by=(Alert.created_at.desc().nulls_last(), Alert.id.desc())
+        ).label('position')
+    ).where(
+        Alert.covenant_id.in_(covenant_ids),
+        Alert.alert_type == 'prediction',
+        Alert.is_resolved == False
+    ).subquery('ranked')
+    deleted = db.execute(
+        delete(Alert).where(
+            Alert.id.in_(select(ranked.c.id).where(ranked.c.position > 1))
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    if dry_run:
+        db.rollback()
+        return deleted
+
+    user_ids = db.execute(
+        select(LoanAgreement.user_id).distinct().join(
+            Covenant, Covenant.loan_agreement_id == LoanAgreement.id
+        ).where(Covenant.id.in_(covenant_ids))
+    ).scalars().all()
+    for user_id in user_ids:
+        # Lock the rollup row so concurrent deltas apply on top of the rebuild
+        db.query(PortfolioRollup).filter(PortfolioRollup.user_id == user_id).with_for_update().first()
+        portfolio_rollup_service.rebuild(db, user_id)
+        data_version_service.bump(db, user_id)
+    db.commit()
+
+    for user_id in user_ids:
+        analytics_cache.invalidate(user_id, ALERTS)
+    return deleted
+
+
+def run(batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    """Compact every covenant's open prediction alerts; returns covenant and alert counts"""
+    totals = {"covenants": 0, "deleted": 0}
+    db = SessionLocal()
+    try:
+        covenant_ids = duplicated_covenants(db)
+        for start in range(0, len(covenant_ids), batch_size):
+            batch = covenant_ids[start:start + batch_size]
+            totals["deleted"] += compact_batch(db, batch, dry_run)
+            totals["covenants"] += len(batch)
+    finally:
+        db.close()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep one open prediction alert per covenant")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Covenants per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Count duplicates without deleting them")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = run(args.batch_size, args.dry_run)
+    print(f"{'Would delete' if args.dry_run else 'Deleted'} {totals['deleted']} duplicate prediction alerts "
+          f"across {totals['covenants']} covenants in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
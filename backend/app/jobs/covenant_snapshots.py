@@ -0,0 +1,77 @@
+"""
+Backfill covenant_status_snapshots from measurement history.
+
+add_measurement keeps snapshots current; this job seeds them for
+measurements recorded before snapshots existed (rerunning is safe):
+
+    python -m app.jobs.covenant_snapshots
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import SessionLocal
+from app.models.covenant import CovenantMeasurement, CovenantStatusSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def run() -> int:
+    """
+    Write one snapshot per covenant and measurement date, taking the most
+    recently recorded measurement when a date has several.
+
+    Returns:
+        Number of snapshot rows inserted or updated
+    """
+    latest_per_day = select(
+        func.gen_random_uuid(),
+        CovenantMeasurement.covenant_id,
+        CovenantMeasurement.measurement_date,
+        CovenantMeasurement.status,
+        CovenantMeasurement.distance_to_breach
+    ).distinct(
+        CovenantMeasurement.covenant_id,
+        CovenantMeasurement.measurement_date
+    ).order_by(
+        CovenantMeasurement.covenant_id,
+        CovenantMeasurement.measurement_date,
+        CovenantMeasurement.created_at.desc()
+    )
+
+    statement = insert(CovenantStatusSnapshot).from_select(
+        ['id', 'covenant_id', 'as_of_date', 'status', 'distance_to_breach'],
+        latest_per_day
+    )
+    statement = statement.on_conflict_do_update(
+        constraint='uq_covenant_status_snapshots_covenant_date',
+        set_={
+            "status": statement.excluded.status,
+            "distance_to_breach": statement.excluded.distance_to_breach,
+            "updated_at": func.now()
+        }
+    )
+
+    db = SessionLocal()
+    try:
+        result = db.execute(statement)
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def main():
+    argparse.ArgumentParser(description="Backfill covenant status snapshots from measurement history").parse_args()
+
+    start = time.perf_counter()
+    written = run()
+    print(f"Wrote {written} covenant status snapshots in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
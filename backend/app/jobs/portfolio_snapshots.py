@@ -0,0 +1,95 @@
+"""
+Fill portfolio_monthly_snapshots for closed months.
+
+Past months never change, so once a month has been snapshotted the
+portfolio trends endpoint reads it from storage instead of recomputing it.
+Run shortly after each month end (rerunning is safe):
+
+    python -m app.jobs.portfolio_snapshots --months 25
+"""
+import argparse
+import logging
+import time
+from datetime import date
+from typing import List, Optional
+from uuid import UUID
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import SessionLocal
+from app.models.user import User
+from app.models.portfolio_snapshot import PortfolioMonthlySnapshot
+from app.services.analytics_service import analytics_service
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_user(db, user_id: UUID, months: List[date], refresh: bool = False) -> int:
+    """
+    Snapshot the given closed months for one user.
+
+    Returns:
+        Number of months written
+    """
+    if not refresh:
+        existing = {
+            month for (month,) in db.query(PortfolioMonthlySnapshot.month_start).filter(
+                PortfolioMonthlySnapshot.user_id == user_id,
+                PortfolioMonthlySnapshot.month_start.in_(months)
+            )
+        }
+        months = [month for month in months if month not in existing]
+    if not months:
+        return 0
+
+    values = analytics_service.get_month_end_values(db, user_id, months)
+    statement = insert(PortfolioMonthlySnapshot).values([
+        {"user_id": user_id, "month_start": month, "total_value": value}
+        for month, value in values.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        constraint='uq_portfolio_monthly_snapshots_user_month',
+        set_={"total_value": statement.excluded.total_value}
+    )
+    db.execute(statement)
+    db.commit()
+    return len(values)
+
+
+def run(months_back: int = 25, refresh: bool = False, user_id: Optional[UUID] = None) -> int:
+    """Snapshot the last `months_back` closed months for every (or one) user"""
+    today = date.today()
+    current_month = date(today.year, today.month, 1)
+    months = [current_month - relativedelta(months=i) for i in range(1, months_back + 1)]
+
+    db = SessionLocal()
+    try:
+        query = db.query(User.id)
+        if user_id:
+            query = query.filter(User.id == user_id)
+        user_ids = [uid for (uid,) in query]
+
+        written = 0
+        for uid in user_ids:
+            written += snapshot_user(db, uid, months, refresh)
+        return written
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot month-end portfolio values for closed months")
+    parser.add_argument("--months", type=int, default=25, help="Closed months to cover (default: 25, enough for trends)")
+    parser.add_argument("--refresh", action="store_true", help="Recompute months that already have a snapshot")
+    parser.add_argument("--user", type=UUID, help="Only snapshot this user")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = run(args.months, args.refresh, args.user)
+    print(f"Wrote {written} monthly snapshots in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
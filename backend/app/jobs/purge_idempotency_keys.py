@@ -0,0 +1,38 @@
+"""
+Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL_HOURS.
+
+Expired keys are already reclaimed when a client reuses them; this job
+keeps the table from growing with keys that are never sent again. Run
+daily (rerunning is safe):
+
+    python -m app.jobs.purge_idempotency_keys
+"""
+import logging
+import time
+
+from app.database import SessionLocal
+from app.services.idempotency_service import idempotency_service
+
+logger = logging.getLogger(__name__)
+
+
+def run() -> int:
+    """Purge expired keys; returns how many were deleted"""
+    db = SessionLocal()
+    try:
+        deleted = idempotency_service.purge_expired(db)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def main():
+    start = time.perf_counter()
+    deleted = run()
+    print(f"Deleted {deleted} expired idempotency keys in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
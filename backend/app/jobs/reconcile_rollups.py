@@ -0,0 +1,99 @@
+"""
+Rebuild portfolio_rollups from the source tables and report drift.
+
+Write endpoints keep the rollups current with deltas; this job is the
+safety net for anything that changes data outside them (manual SQL, bulk
+imports). Rerunning is safe:
+
+    python -m app.jobs.reconcile_rollups [--dry-run] [--user <uuid>]
+"""
+import argparse
+import logging
+import time
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from app.database import SessionLocal
+from app.models.user import User
+from app.models.portfolio_rollup import PortfolioRollup
+from app.services.portfolio_rollup_service import portfolio_rollup_service, COUNTERS
+from app.services.analytics_service import analytics_service
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_user(db, user_id: UUID, dry_run: bool = False) -> Dict[str, tuple]:
+    """
+    Compare one user's stored rollup with a fresh recount and rewrite it.
+
+    The rollup row is locked first, so in-flight deltas either commit
+    before the recount (and are included in it) or wait and apply on top
+    of the rebuilt row.
+
+    Returns:
+        {counter: (stored, actual)} for every counter that drifted;
+        a missing row reports every non-zero counter with stored None
+    """
+    stored = db.query(PortfolioRollup).filter(
+        PortfolioRollup.user_id == user_id
+    ).with_for_update().first()
+
+    if dry_run:
+        actual = analytics_service.get_portfolio_summary(db, user_id)
+    else:
+        actual = portfolio_rollup_service.rebuild(db, user_id)
+
+    drift = {}
+    for key in COUNTERS:
+        stored_value = getattr(stored, key) if stored else None
+        if stored_value != actual[key] and (stored or actual[key]):
+            drift[key] = (stored_value, actual[key])
+
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return drift
+
+
+def run(user_id: Optional[UUID] = None, dry_run: bool = False) -> List[tuple]:
+    """
+    Reconcile every (or one) user's rollup.
+
+    Returns:
+        [(user_id, drift)] for users whose rollup had drifted
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(User.id)
+        if user_id:
+            query = query.filter(User.id == user_id)
+        user_ids = [uid for (uid,) in query]
+
+        drifted = []
+        for uid in user_ids:
+            drift = reconcile_user(db, uid, dry_run)
+            if drift:
+                drifted.append((uid, drift))
+        return drifted
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild portfolio rollups and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without rewriting rollups")
+    parser.add_argument("--user", type=UUID, help="Only reconcile this user")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    drifted = run(args.user, args.dry_run)
+    for uid, drift in drifted:
+        details = ", ".join(f"{key} {stored} -> {actual}" for key, (stored, actual) in drift.items())
+        print(f"User {uid}: {details}")
+    print(f"{len(drifted)} rollups drifted; finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,257 @@
+"""
+Re-forecast every active covenant and refresh its prediction alert.
+
+Predictions otherwise only refresh when a measurement is posted, so a
+covenant nobody touches keeps a stale forecast. This job streams active
+covenants with their measurements through a server-side cursor, forecasts
+them in chunks across a process pool and upserts the prediction alerts in
+bulk, one transaction per chunk. Each covenant's forecast model is picked
+by cross-validation and cached until its measurement count changes.
+Covenants first move on to amendments that have taken effect since they
+were recorded, so the forecasts test against the terms now in force. Run
+nightly (rerunning is safe):
+
+    python -m app.jobs.reforecast [--workers 4] [--chunk-size 500] [--dry-run] [--user <uuid>]
+"""
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.database import engine, SessionLocal
+from app.models.covenant import Covenant, CovenantMeasurement, CovenantModelChoice
+from app.models.loan import LoanAgreement
+from app.models.portfolio_rollup import PortfolioRollup
+from app.services.alert_service import alert_service
+from app.services.amendment_service import amendment_service
+from app.services.cache_service import analytics_cache, LOANS, ALERTS
+from app.services.data_version_service import data_version_service
+from app.services.model_choice_service import model_choice_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.prediction_service import prediction_service
+
+logger = logging.getLogger(__name__)
+
+
+def stream_chunks(user_id: Optional[UUID] = None, chunk_size: int = 500) -> Iterator[Tuple[Dict, Dict]]:
+    """
+    Yield (series, covenants) for chunk_size covenants at a time.
+
+    series is the forecast_many input keyed by covenant id string, with
+    each covenant's cached model choice; it is all a worker process needs.
+    covenants holds the loan, owner and name kept in this process for
+    writing alerts. Rows come from one ordered query on a server-side
+    cursor, so memory stays bounded by the chunk.
+    """
+    query = select(
+        Covenant.id,
+        Covenant.loan_agreement_id,
+        Covenant.covenant_name,
+        Covenant.threshold_value,
+        Covenant.threshold_operator,
+        LoanAgreement.user_id,
+        CovenantModelChoice.model_name,
+        CovenantModelChoice.n_measurements,
+        CovenantMeasurement.measurement_date,
+        CovenantMeasurement.actual_value
+    ).join(
+        LoanAgreement, LoanAgreement.id == Covenant.loan_agreement_id
+    ).join(
+        CovenantMeasurement, CovenantMeasurement.covenant_id == Covenant.id
+    ).outerjoin(
+        CovenantModelChoice, CovenantModelChoice.covenant_id == Covenant.id
+    ).where(
+        Covenant.is_active == True,
+        Covenant.threshold_value.isnot(None),
+        Covenant.threshold_operator.isnot(None)
+    ).order_by(
+        Covenant.id, CovenantMeasurement.measurement_date
+    )
+    if user_id:
+        query = query.where(LoanAgreement.user_id == user_id)
+
+    series, covenants = {}, {}
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=10000).execute(query)
+        for row in result:
+            key = str(row.id)
+            if key not in series:
+                if len(series) == chunk_size:
+                    yield series, covenants
+                    series, covenants = {}, {}
+                series[key] = {
+                    "historical_values": [],
+                    "threshold_value": float(row.threshold_value),
+                    "threshold_operator": row.threshold_operator,
+                    "model": row.model_name,
+                    "model_n_measurements": row.n_measurements
+                }
+                covenants[key] = {
+                    "covenant_id": row.id,
+                    "loan_agreement_id": row.loan_agreement_id,
+                    "covenant_name": row.covenant_name,
+                    "user_id": row.user_id
+                }
+            series[key]["historical_values"].append({
+                "date": row.measurement_date.isoformat(),
+                "value": float(row.actual_value)
+            })
+    if series:
+        yield series, covenants
+
+
+def _forecast_chunk(series: Dict) -> Tuple[Dict, Dict, float]:
+    """Worker: forecast one chunk, returning the results, new model choices and seconds spent"""
+    start = time.perf_counter()
+    predictions, choices = prediction_service.forecast_many(series)
+    return predictions, choices, time.perf_counter() - start
+
+
+def write_chunk(db, covenants: Dict, predictions: Dict, choices: Dict, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Upsert the chunk's prediction alerts and model choices and refresh the
+    owners' rollups in one transaction. Covenants without a predicted
+    breach have their open prediction alert resolved.
+    """
+    alerts = [
+        {
+            "covenant_id": covenant["covenant_id"],
+            "loan_agreement_id": covenant["loan_agreement_id"],
+            **alert_service.prediction_alert_fields(covenant["covenant_name"], predictions[key])
+        }
+        for key, covenant in covenants.items() if predictions.get(key)
+    ]
+    counts = alert_service.upsert_prediction_alerts(db, alerts)
+    counts["resolved"] = alert_service.resolve_prediction_alerts(
+        db, [covenant["covenant_id"] for key, covenant in covenants.items() if not predictions.get(key)]
+    )
+    model_choice_service.save_many(db, {covenants[key]["covenant_id"]: choice for key, choice in choices.items()})
+    if dry_run:
+        db.rollback()
+        return counts
+
+    user_ids = set()
+    if counts["inserted"] or counts["updated"] or counts["resolved"]:
+        user_ids = {covenant["user_id"] for covenant in covenants.values()}
+        for user_id in user_ids:
+            # Lock the rollup row so concurrent deltas apply on top of the rebuild
+            db.query(PortfolioRollup).filter(PortfolioRollup.user_id == user_id).with_for_update().first()
+            portfolio_rollup_service.rebuild(db, user_id)
+            data_version_service.bump(db, user_id)
+    db.commit()
+
+    for user_id in user_ids:
+        analytics_cache.invalidate(user_id, ALERTS)
+    return counts
+
+
+def apply_due_terms(db, user_id: Optional[UUID] = None) -> int:
+    """
+    Move covenants on to amendments now in force, in one transaction, and
+    invalidate their owners' cached views.
+
+    Returns:
+        The number of covenants whose terms changed
+    """
+    updated = amendment_service.apply_due_terms(db, user_id)
+    user_ids = {row.user_id for row in updated}
+    for owner_id in user_ids:
+        data_version_service.bump(db, owner_id)
+    db.commit()
+
+    for owner_id in user_ids:
+        analytics_cache.invalidate(owner_id, LOANS)
+    return len(updated)
+
+
+def run(user_id: Optional[UUID] = None, workers: Optional[int] = None, chunk_size: int = 500,
+        dry_run: bool = False) -> Dict[str, float]:
+    """
+    Re-forecast every (or one user's) active covenant.
+
+    Chunks are forecast in worker processes while this process keeps
+    reading the cursor and writing finished chunks; at most two chunks per
+    worker are in flight.
+
+    Returns:
+        Covenant, amended terms and alert counts, models used, plus seconds
+        spent reading, forecasting (summed across workers) and writing
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {"covenants": 0, "inserted": 0, "updated": 0, "unchanged": 0, "resolved": 0, "no_breach": 0,
+              "reselected": 0, "terms_applied": 0, "models": Counter(),
+              "read_seconds": 0.0, "forecast_seconds": 0.0, "write_seconds": 0.0}
+    db = SessionLocal()
+
+    def collect(done):
+        for future in done:
+            covenants = pending.pop(future)
+            predictions, choices, seconds = future.result()
+            totals["forecast_seconds"] += seconds
+            start = time.perf_counter()
+            counts = write_chunk(db, covenants, predictions, choices, dry_run)
+            totals["write_seconds"] += time.perf_counter() - start
+            totals["covenants"] += len(covenants)
+            totals["no_breach"] += sum(1 for key in covenants if not predictions.get(key))
+            totals["reselected"] += len(choices)
+            totals["models"].update(result["model"] for result in predictions.values() if result)
+            for key, value in counts.items():
+                totals[key] += value
+
+    pending = {}
+    try:
+        if not dry_run:
+            totals["terms_applied"] = apply_due_terms(db, user_id)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = stream_chunks(user_id, chunk_size)
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                totals["read_seconds"] += time.perf_counter() - start
+                if chunk is None:
+                    break
+                series, covenants = chunk
+                pending[executor.submit(_forecast_chunk, series)] = covenants
+                if len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(list(pending))
+    finally:
+        db.close()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-forecast active covenants and refresh prediction alerts")
+    parser.add_argument("--workers", type=int, help="Forecasting processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Covenants per chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Forecast and report without writing alerts")
+    parser.add_argument("--user", type=UUID, help="Only re-forecast this user's covenants")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = run(args.user, args.workers, args.chunk_size, args.dry_run)
+    elapsed = time.perf_counter() - start
+    print(f"Re-forecast {totals['covenants']} covenants in {elapsed:.2f}s "
+          f"({totals['covenants'] / elapsed if elapsed else 0:.0f} covenants/s)")
+    print(f"Terms: {totals['terms_applied']} covenants moved to amendments now in force")
+    print(f"Alerts: {totals['inserted']} inserted, {totals['updated']} updated, "
+          f"{totals['unchanged']} unchanged, {totals['resolved']} resolved; "
+          f"{totals['no_breach']} covenants with no predicted breach"
+          f"{' (dry run, nothing written)' if args.dry_run else ''}")
+    models = ", ".join(f"{name} {count}" for name, count in totals["models"].most_common())
+    print(f"Models behind predicted breaches: {models or 'none'}; "
+          f"{totals['reselected']} covenants had their model reselected")
+    print(f"Timings: read {totals['read_seconds']:.2f}s, forecast {totals['forecast_seconds']:.2f}s "
+          f"(across workers), write {totals['write_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
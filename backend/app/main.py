@@ -1,9 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import logging
 from app.config import settings
 from app.database import engine, Base
-from app.api.endpoints import auth, loans, covenants, alerts, analytics, user_settings, search
+from app.api.endpoints import auth, loans, covenants, alerts, analytics, user_settings, search, financials
+from app.services.alert_stream_service import alert_stream_service
 
 # Configure logging
 logging.basicConfig(
@@ -17,13 +19,20 @@ logger = logging.getLogger(__name__)
 Base.metadata.create_all(bind=engine)
 logger.info("Database tables created")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close open alert streams and the worker's LISTEN connection
+    await alert_stream_service.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     description="CovenantIQ - AI-powered loan covenant monitoring platform for European markets",
     version="1.0.0",
     docs_url="/docs" if settings.DEBUG else None,
-    redoc_url="/redoc" if settings.DEBUG else None
+    redoc_url="/redoc" if settings.DEBUG else None,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -33,6 +42,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Add GZip compression for responses
@@ -47,6 +57,7 @@ app.include_router(alerts.router)
 app.include_router(analytics.router)
 app.include_router(user_settings.router)
 app.include_router(search.router)
+app.include_router(financials.router)
 
 # Health check endpoint
 @app.get("/health")
@@ -1,15 +1,29 @@
 # Import all models here for easy access
 from app.models.user import User
 from app.models.loan import LoanAgreement
-from app.models.covenant import Covenant, CovenantMeasurement
+from app.models.covenant import Covenant, CovenantMeasurement, CovenantStatusSnapshot, CovenantTrendStats, CovenantModelChoice, CovenantAmendment
 from app.models.alert import Alert
 from app.models.borrower_financials import BorrowerFinancial
+from app.models.portfolio_snapshot import PortfolioMonthlySnapshot
+from app.models.user_data_version import UserDataVersion
+from app.models.portfolio_rollup import PortfolioRollup
+from app.models.idempotency_key import IdempotencyKey
+from app.models.alert_stream_ticket import AlertStreamTicket
 
 __all__ = [
     "User",
     "LoanAgreement",
     "Covenant",
     "CovenantMeasurement",
+    "CovenantStatusSnapshot",
+    "CovenantTrendStats",
+    "CovenantModelChoice",
+    "CovenantAmendment",
     "Alert",
-    "BorrowerFinancial"
+    "BorrowerFinancial",
+    "PortfolioMonthlySnapshot",
+    "UserDataVersion",
+    "PortfolioRollup",
+    "IdempotencyKey",
+    "AlertStreamTicket"
 ]
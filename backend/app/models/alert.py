@@ -1,10 +1,23 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean, Date, Integer, func
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean, Date, Integer, Index, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from app.database import Base
 import uuid
 
 class Alert(Base):
+    """
+    Covenant alert. A covenant has at most one open prediction alert,
+    updated in place as its forecast changes. Open alerts are listed in
+    keyset pages on (created_at, id).
+    """
     __tablename__ = "alerts"
+    __table_args__ = (
+        Index(
+            'uq_alerts_open_prediction',
+            'covenant_id',
+            unique=True,
+            postgresql_where=text("alert_type = 'prediction' AND NOT is_resolved")
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"))
@@ -18,3 +31,14 @@ class Alert(Base):
     is_read = Column(Boolean, default=False, index=True)
     is_resolved = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Serves keyset pages of a loan's open alerts, newest first; covers the
+# page filters so the per-loan probes are index-only scans
+Index(
+    'ix_alerts_open_loan_created',
+    Alert.loan_agreement_id,
+    Alert.created_at.desc(),
+    Alert.id.desc(),
+    postgresql_include=['is_read', 'severity', 'alert_type'],
+    postgresql_where=Alert.is_resolved == False
+)
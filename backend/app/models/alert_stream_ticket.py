@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+class AlertStreamTicket(Base):
+    """
+    Short-lived, single-use credential for opening an alert stream, so the
+    access token never has to travel in a URL. Only a hash of the ticket
+    is stored.
+    """
+    __tablename__ = "alert_stream_tickets"
+
+    ticket_hash = Column(String(64), primary_key=True)  # SHA-256 of the ticket
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+# Serves the purge of expired tickets
+Index('ix_alert_stream_tickets_expires_at', AlertStreamTicket.expires_at)
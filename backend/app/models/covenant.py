@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Numeric, Date, Text, ForeignKey, Boolean, func
+from sqlalchemy import Column, String, DateTime, Numeric, Date, Text, ForeignKey, Boolean, Integer, Float, Index, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -26,7 +26,11 @@ class Covenant(Base):
 
 
 class CovenantMeasurement(Base):
+    """One measurement per covenant per date; writes upsert on that key"""
     __tablename__ = "covenant_measurements"
+    __table_args__ = (
+        UniqueConstraint('covenant_id', 'measurement_date', name='uq_covenant_measurements_covenant_date'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -40,3 +44,92 @@ class CovenantMeasurement(Base):
     
     # Relationships
     covenant = relationship("Covenant", back_populates="measurements")
+
+
+class CovenantAmendment(Base):
+    """
+    Covenant terms in force from effective_date until the next amendment.
+    Measurements before a covenant's first amendment are tested against
+    its previous_* terms, the original ones; the covenant row carries the
+    terms of its latest amendment.
+    """
+    __tablename__ = "covenant_amendments"
+    __table_args__ = (
+        UniqueConstraint('covenant_id', 'effective_date', name='uq_covenant_amendments_covenant_date'),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), nullable=False)
+    effective_date = Column(Date, nullable=False)
+    threshold_value = Column(Numeric(20, 4), nullable=False)
+    threshold_operator = Column(String(20), nullable=False)
+    previous_threshold_value = Column(Numeric(20, 4))  # Terms in force the day before
+    previous_threshold_operator = Column(String(20))
+    notes = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CovenantStatusSnapshot(Base):
+    """
+    Covenant status as of a date, for point-in-time analytics.
+    One row per covenant per measurement date; the status on any day is the
+    latest snapshot on or before it.
+    """
+    __tablename__ = "covenant_status_snapshots"
+    __table_args__ = (
+        UniqueConstraint('covenant_id', 'as_of_date', name='uq_covenant_status_snapshots_covenant_date'),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), nullable=False)
+    as_of_date = Column(Date, nullable=False)
+    status = Column(String(50), nullable=False)  # compliant, warning, breach
+    distance_to_breach = Column(Numeric(10, 4))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CovenantTrendStats(Base):
+    """
+    Running least-squares sums over a covenant's measurements, with x in
+    days since anchor_date and y the measured value.
+    Updated in the same transaction as each new measurement so predictions
+    never reload the history; rebuilt from the measurements when one is
+    deleted.
+    """
+    __tablename__ = "covenant_trend_stats"
+    
+    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), primary_key=True)
+    anchor_date = Column(Date, nullable=False)  # x = measurement_date - anchor_date
+    first_date = Column(Date, nullable=False)
+    last_date = Column(Date, nullable=False)
+    n = Column(Integer, nullable=False)
+    sum_x = Column(Float, nullable=False)
+    sum_y = Column(Float, nullable=False)
+    sum_xy = Column(Float, nullable=False)
+    sum_xx = Column(Float, nullable=False)
+    sum_yy = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+
+class CovenantModelChoice(Base):
+    """
+    Forecast model picked for a covenant by PredictionService.forecast_many,
+    valid while the covenant still has n_measurements measurements.
+    """
+    __tablename__ = "covenant_model_choices"
+    
+    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), primary_key=True)
+    model_name = Column(String(50), nullable=False)
+    n_measurements = Column(Integer, nullable=False)
+    cv_error = Column(Float)  # Mean absolute error on held-out measurements
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Serves "latest measurement per covenant" lookups (ORDER BY ... LIMIT 1 per covenant)
+Index(
+    'ix_covenant_measurements_covenant_date',
+    CovenantMeasurement.covenant_id,
+    CovenantMeasurement.measurement_date.desc(),
+    CovenantMeasurement.created_at.desc()
+)
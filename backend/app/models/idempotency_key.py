@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.database import Base
+
+class IdempotencyKey(Base):
+    """
+    Response of a write request sent with an Idempotency-Key header, stored
+    in the same transaction as the write so a retry replays it instead of
+    writing again.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # SHA-256 of method, path and body
+    status_code = Column(Integer)  # Null until the request completes
+    response_body = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
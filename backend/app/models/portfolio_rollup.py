@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, DateTime, Numeric, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+class PortfolioRollup(Base):
+    """
+    Per-user dashboard counters, kept current with deltas in the same
+    transaction as every loan, covenant, measurement and alert write.
+    Rebuilt from scratch by app.jobs.reconcile_rollups.
+    """
+    __tablename__ = "portfolio_rollups"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_loans = Column(Integer, nullable=False, default=0)
+    active_loans = Column(Integer, nullable=False, default=0)
+    total_covenants = Column(Integer, nullable=False, default=0)  # Active covenants
+    compliant_covenants = Column(Integer, nullable=False, default=0)  # By latest measurement
+    warning_covenants = Column(Integer, nullable=False, default=0)
+    breach_covenants = Column(Integer, nullable=False, default=0)
+    unread_alerts = Column(Integer, nullable=False, default=0)  # Unresolved only
+    critical_alerts = Column(Integer, nullable=False, default=0)  # Unresolved only
+    total_exposure = Column(Numeric(20, 2), nullable=False, default=0)  # Sum of active loan_amount
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Numeric, Date, ForeignKey, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+import uuid
+
+class PortfolioMonthlySnapshot(Base):
+    """
+    Active portfolio value at the end of a closed month.
+    Filled by app.jobs.portfolio_snapshots so trends never recompute past months.
+    """
+    __tablename__ = "portfolio_monthly_snapshots"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'month_start', name='uq_portfolio_monthly_snapshots_user_month'),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    month_start = Column(Date, nullable=False)  # First day of the snapshotted month
+    total_value = Column(Numeric(20, 2), nullable=False)  # Sum of active loan_amount created by month end
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
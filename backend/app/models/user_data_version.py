@@ -0,0 +1,14 @@
+from sqlalchemy import Column, BigInteger, DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+class UserDataVersion(Base):
+    """
+    Monotonic per-user counter, bumped in the same transaction as every write
+    to the user's loans, covenants, measurements or alerts. Drives ETags.
+    """
+    __tablename__ = "user_data_versions"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
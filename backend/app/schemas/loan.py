@@ -1,5 +1,5 @@
 from pydantic import BaseModel, UUID4
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -66,6 +66,60 @@ class MeasurementResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BulkMeasurementRow(MeasurementCreate):
+    covenant_id: UUID4
+
+class BulkMeasurementRowResult(BaseModel):
+    row: int  # 1-based data row (after the header, if any)
+    result: str  # created, updated, unchanged, rejected
+    covenant_id: Optional[UUID4] = None
+    measurement_date: Optional[date] = None
+    measurement_id: Optional[UUID4] = None
+    status: Optional[str] = None
+    distance_to_breach: Optional[float] = None
+    error: Optional[str] = None
+
+class BulkMeasurementResult(BaseModel):
+    rows: int
+    created: int
+    updated: int  # Replaced an earlier value for the covenant and date
+    unchanged: int  # Resent with the same value
+    rejected: int
+    breach_alerts: int
+    prediction_alerts: int
+    results: List[BulkMeasurementRowResult]
+
+class CovenantAmendmentCreate(BaseModel):
+    effective_date: date
+    threshold_value: Decimal
+    threshold_operator: Optional[str] = None  # Defaults to the operator in force on effective_date
+    notes: Optional[str] = None
+
+class LoanAmendmentCreate(CovenantAmendmentCreate):
+    covenant_id: UUID4
+
+class CovenantAmendmentResponse(BaseModel):
+    id: UUID4
+    covenant_id: UUID4
+    effective_date: date
+    threshold_value: float
+    threshold_operator: str
+    previous_threshold_value: Optional[float]
+    previous_threshold_operator: Optional[str]
+    notes: Optional[str]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class AmendmentResult(BaseModel):
+    amendments: List[CovenantAmendmentResponse]
+    reevaluated: int  # Measurements whose status, threshold or distance changed
+    status_changes: int
+    breach_alerts: int
+    prediction_alerts: int
+    prediction_alerts_resolved: int  # Forecast no longer predicts a breach
+
 # Alert schemas
 class AlertResponse(BaseModel):
     id: UUID4
@@ -84,6 +138,29 @@ class AlertResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AlertBulkFilter(BaseModel):
+    loan_agreement_id: Optional[UUID4] = None
+    covenant_id: Optional[UUID4] = None
+    alert_types: Optional[List[str]] = None
+    severities: Optional[List[str]] = None
+    is_read: Optional[bool] = None
+    is_resolved: Optional[bool] = None
+    created_before: Optional[datetime] = None
+
+class AlertBulkAction(BaseModel):
+    action: str  # read, resolve, delete
+    ids: Optional[List[UUID4]] = None  # Either ids or filter
+    filter: Optional[AlertBulkFilter] = None
+
+class AlertBulkResult(BaseModel):
+    action: str
+    matched: int  # The user's alerts selected by the ids or filter
+    affected: int  # Changed by the action; the rest already were read/resolved
+
+class AlertStreamTicketResponse(BaseModel):
+    ticket: str
+    expires_in: int  # Seconds left to open the stream with it
+
 # Dashboard/Analytics schemas
 class PortfolioSummary(BaseModel):
     total_loans: int
@@ -94,6 +171,7 @@ class PortfolioSummary(BaseModel):
     breach_covenants: int
     unread_alerts: int
     critical_alerts: int
+    total_exposure: float = 0.0
 
 class RiskHeatmapItem(BaseModel):
     loan_id: UUID4
@@ -122,3 +200,67 @@ class CovenantTrendsResponse(BaseModel):
     compliant_change: float
     warning_change: float
     breach_change: float
+
+class DashboardResponse(BaseModel):
+    """Bundle of dashboard widgets; widgets that were not requested are omitted"""
+    portfolio_summary: Optional[PortfolioSummary] = None
+    risk_heatmap: Optional[List[RiskHeatmapItem]] = None
+    critical_alerts: Optional[List[AlertResponse]] = None
+    portfolio_value: Optional[PortfolioValueResponse] = None
+    portfolio_trends: Optional[PortfolioTrendsResponse] = None
+    covenant_trends: Optional[CovenantTrendsResponse] = None
+
+# Borrower financials schemas
+class BorrowerFinancialCreate(BaseModel):
+    reporting_period: date
+    revenue: Optional[Decimal] = None
+    ebitda: Optional[Decimal] = None
+    total_debt: Optional[Decimal] = None
+    total_assets: Optional[Decimal] = None
+    interest_expense: Optional[Decimal] = None
+    free_cash_flow: Optional[Decimal] = None
+    custom_metrics: Optional[Dict[str, Any]] = None
+
+class BorrowerFinancialResponse(BaseModel):
+    id: UUID4
+    loan_agreement_id: UUID4
+    reporting_period: date
+    revenue: Optional[float]
+    ebitda: Optional[float]
+    total_debt: Optional[float]
+    total_assets: Optional[float]
+    interest_expense: Optional[float]
+    free_cash_flow: Optional[float]
+    custom_metrics: Optional[Dict[str, Any]]
+    ratios: Dict[str, Optional[float]] = {}
+    ratios_not_meaningful: List[str] = []  # Denominator zero or negative
+    
+    class Config:
+        from_attributes = True
+
+class FinancialsIngestResult(BaseModel):
+    financials: int
+    measurements_created: int
+    measurements_skipped: int  # Covenant already measured on that date
+    measurements_not_meaningful: int  # Ratio denominator zero or negative
+    breach_alerts: int
+    prediction_alerts: int
+
+class RatioForecastPoint(BaseModel):
+    date: date
+    value: Optional[float]
+
+class RatioForecast(BaseModel):
+    covenant_id: UUID4
+    covenant_name: str
+    loan_agreement_id: UUID4
+    ratio: str
+    threshold_value: float
+    threshold_operator: str
+    latest_period: Optional[date]
+    latest_value: Optional[float]
+    latest_not_meaningful: bool = False  # Latest period's denominator zero or negative
+    predicted_breach_date: Optional[date]
+    days_until_breach: Optional[int]
+    predicted_value_at_breach: Optional[float]
+    forecast: List[RatioForecastPoint]
@@ -2,9 +2,35 @@
 from app.services.openai_service import openai_service
 from app.services.pdf_service import pdf_service
 from app.services.prediction_service import prediction_service
+from app.services.analytics_service import analytics_service
+from app.services.data_version_service import data_version_service
+from app.services.cache_service import analytics_cache
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.trend_stats_service import trend_stats_service
+from app.services.alert_service import alert_service
+from app.services.model_choice_service import model_choice_service
+from app.services.measurement_service import measurement_service
+from app.services.ratio_service import ratio_service
+from app.services.idempotency_service import idempotency_service
+from app.services.amendment_service import amendment_service
+from app.services.alert_stream_service import alert_stream_service
+from app.services.stream_ticket_service import stream_ticket_service
 
 __all__ = [
     "openai_service",
     "pdf_service",
-    "prediction_service"
+    "prediction_service",
+    "analytics_service",
+    "data_version_service",
+    "analytics_cache",
+    "portfolio_rollup_service",
+    "trend_stats_service",
+    "alert_service",
+    "model_choice_service",
+    "measurement_service",
+    "ratio_service",
+    "idempotency_service",
+    "amendment_service",
+    "alert_stream_service",
+    "stream_ticket_service"
 ]
@@ -0,0 +1,375 @@
+from sqlalchemy import select, update, delete, and_, or_, any_, case, cast, bindparam, func, tuple_, true, literal_column
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert, ARRAY, UUID as PG_UUID
+from app.models.alert import Alert
+from app.models.loan import LoanAgreement
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from uuid import UUID
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns a prediction alert update rewrites
+PREDICTION_FIELDS = ('severity', 'title', 'message', 'predicted_breach_date', 'days_until_breach')
+
+# Prediction alert severities, least to most urgent
+SEVERITY_ORDER = ('low', 'medium', 'high', 'critical')
+
+# Changes POST /api/alerts/bulk applies, as in the single-alert endpoints
+BULK_ACTIONS = ('read', 'resolve', 'delete')
+
+# NOTIFY channel of alert writes, listened to by AlertStreamService
+ALERT_CHANNEL = 'alert_events'
+
+# Alert ids per notification, well inside the 8000-byte payload limit
+NOTIFY_BATCH = 100
+
+class AlertService:
+    """
+    Builds and writes covenant alerts.
+    """
+
+    def breach_alert_fields(self, covenant_name: str, actual_value: float, threshold_value: float) -> Dict:
+        """Severity, title and message of the alert for a breaching measurement"""
+        return {
+            "severity": 'critical',
+            "title": f'Covenant Breach: {covenant_name}',
+            "message": f'Covenant has breached threshold. Actual: {actual_value}, Threshold: {threshold_value}'
+        }
+
+    def prediction_alert_fields(self, covenant_name: str, prediction: Dict) -> Dict:
+        """
+        Severity, title and message of a prediction alert for a
+        PredictionService result.
+        """
+        days_until = prediction['days_until_breach']
+
+        # Determine severity based on days
+        if days_until <= 30:
+            severity = 'critical'
+        elif days_until <= 60:
+            severity = 'high'
+        else:
+            severity = 'medium'
+
+        return {
+            "severity": severity,
+            "title": f'Predicted Breach: {covenant_name}',
+            "message": f'Breach predicted in {days_until} days. Confidence: {int(prediction["confidence"] * 100)}%',
+            "predicted_breach_date": prediction['predicted_breach_date'],
+            "days_until_breach": days_until
+        }
+
+    def notify_alerts(self, db: Session, alert_ids: Iterable[UUID], created: bool = False) -> None:
+        """
+        Tell alert streams that these alerts were created (or changed). The
+        notification is sent when the caller's transaction commits and
+        dropped if it rolls back.
+        """
+        alert_ids = [str(alert_id) for alert_id in alert_ids]
+        for start in range(0, len(alert_ids), NOTIFY_BATCH):
+            self._notify(db, {"ids": alert_ids[start:start + NOTIFY_BATCH], "created": created})
+
+    def notify_change(self, db: Session, user_id: UUID, action: str, count: int) -> None:
+        """
+        Tell the user's alert streams that ``count`` alerts were read,
+        resolved or deleted at once, on commit of the caller's transaction.
+        """
+        self._notify(db, {"user_id": str(user_id), "action": action, "count": count})
+
+    def _notify(self, db: Session, payload: Dict) -> None:
+        db.execute(select(func.pg_notify(ALERT_CHANNEL, json.dumps(payload, separators=(',', ':')))))
+
+    def insert_breach_alerts(self, db: Session, alerts: List[Dict]) -> int:
+        """
+        Insert breach alerts with one statement, in the caller's
+        transaction.
+
+        Args:
+            alerts: Dicts with covenant_id, loan_agreement_id and the
+                breach_alert_fields keys
+
+        Returns:
+            How many alerts were inserted
+        """
+        if not alerts:
+            return 0
+
+        alert_ids = db.execute(
+            insert(Alert).returning(Alert.id),
+            [{**alert, "alert_type": 'breach', "is_read": False, "is_resolved": False} for alert in alerts]
+        ).scalars().all()
+        self.notify_alerts(db, alert_ids, created=True)
+        return len(alert_ids)
+
+    def created_since(
+        self,
+        db: Session,
+        user_id: UUID,
+        after: Tuple[datetime, UUID],
+        limit: int
+    ) -> List[Alert]:
+        """
+        The user's open alerts created after a (created_at, id) cursor,
+        oldest first: what an alert stream missed while disconnected.
+        Probes ix_alerts_open_loan_created per loan like page().
+        """
+        loan_alerts = select(
+            Alert.id, Alert.created_at
+        ).where(
+            Alert.loan_agreement_id == LoanAgreement.id,
+            Alert.is_resolved == False,
+            tuple_(Alert.created_at, Alert.id) > tuple_(*after)
+        ).order_by(
+            Alert.created_at, Alert.id
+        ).limit(limit).lateral('loan_alerts')
+        keys = select(
+            loan_alerts.c.id
+        ).select_from(LoanAgreement).join(
+            loan_alerts, true()
+        ).where(
+            LoanAgreement.user_id == user_id
+        ).order_by(
+            loan_alerts.c.created_at, loan_alerts.c.id
+        ).limit(limit).subquery('new_keys')
+
+        return db.query(Alert).join(
+            keys, Alert.id == keys.c.id
+        ).order_by(
+            Alert.created_at, Alert.id
+        ).all()
+
+    def owned_by(self, db: Session, alert_ids: Iterable[UUID], user_ids: Iterable[UUID]) -> List[Tuple[UUID, Alert]]:
+        """(owner's user id, alert) for those of the alerts owned by one of the users"""
+        return db.query(LoanAgreement.user_id, Alert).join(
+            LoanAgreement, LoanAgreement.id == Alert.loan_agreement_id
+        ).filter(
+            Alert.id == any_(cast(bindparam('alert_ids', list(alert_ids)), ARRAY(PG_UUID(as_uuid=True)))),
+            LoanAgreement.user_id == any_(cast(bindparam('user_ids', list(user_ids)), ARRAY(PG_UUID(as_uuid=True))))
+        ).all()
+
+    def page(
+        self,
+        db: Session,
+        user_id: UUID,
+        limit: int,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        unread_only: bool = False,
+        severities: Optional[List[str]] = None,
+        alert_types: Optional[List[str]] = None
+    ) -> List[Alert]:
+        """
+        One page of the user's open alerts, newest first, keyset-paginated
+        on (created_at, id).
+
+        Each loan contributes at most ``limit`` keys from a LATERAL
+        index-only probe of ix_alerts_open_loan_created starting at the
+        cursor; only the ``limit`` newest are then read in full. A page
+        costs the same at any depth and for any history length.
+
+        Args:
+            after: (created_at, id) of the last alert of the previous page
+        """
+        conditions = [Alert.loan_agreement_id == LoanAgreement.id, Alert.is_resolved == False]
+        if after:
+            conditions.append(tuple_(Alert.created_at, Alert.id) < tuple_(*after))
+        if unread_only:
+            conditions.append(Alert.is_read == False)
+        if severities:
+            conditions.append(Alert.severity.in_(severities))
+        if alert_types:
+            conditions.append(Alert.alert_type.in_(alert_types))
+
+        loan_alerts = select(
+            Alert.id, Alert.created_at
+        ).where(
+            *conditions
+        ).order_by(
+            Alert.created_at.desc(), Alert.id.desc()
+        ).limit(limit).lateral('loan_alerts')
+        keys = select(
+            loan_alerts.c.id
+        ).select_from(LoanAgreement).join(
+            loan_alerts, true()
+        ).where(
+            LoanAgreement.user_id == user_id
+        ).order_by(
+            loan_alerts.c.created_at.desc(), loan_alerts.c.id.desc()
+        ).limit(limit).subquery('page_keys')
+
+        return db.query(Alert).join(
+            keys, Alert.id == keys.c.id
+        ).order_by(
+            Alert.created_at.desc(), Alert.id.desc()
+        ).all()
+
+    def bulk_update(
+        self,
+        db: Session,
+        user_id: UUID,
+        action: str,
+        ids: Optional[List[UUID]] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, int]:
+        """
+        Mark read, resolve or delete many of the user's alerts with one
+        statement, in the caller's transaction, keeping the portfolio
+        rollup current. The caller bumps the data version when alerts
+        changed, commits and invalidates ALERTS.
+
+        The selected alerts are locked and joined to loan ownership in a
+        CTE; the change is applied only to those it alters (an already read
+        alert is not rewritten by ``read``) and reports the counters they
+        contributed before.
+
+        Args:
+            ids: Alert ids; ids that are not the user's are ignored
+            filters: Dict with any of loan_agreement_id, covenant_id,
+                alert_types, severities, is_read, is_resolved and
+                created_before; ignored when ids are given
+
+        Returns:
+            {"matched": alerts selected, "affected": alerts changed}
+
+        Raises:
+            ValueError: If the action is unknown
+        """
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Unknown action '{action}', expected one of {', '.join(BULK_ACTIONS)}")
+
+        conditions = [LoanAgreement.user_id == user_id]
+        if ids is not None:
+            conditions.append(Alert.id == any_(cast(bindparam('alert_ids', list(ids)), ARRAY(PG_UUID(as_uuid=True)))))
+        else:
+            filters = filters or {}
+            if filters.get('loan_agreement_id'):
+                conditions.append(Alert.loan_agreement_id == filters['loan_agreement_id'])
+            if filters.get('covenant_id'):
+                conditions.append(Alert.covenant_id == filters['covenant_id'])
+            if filters.get('alert_types'):
+                conditions.append(Alert.alert_type.in_(filters['alert_types']))
+            if filters.get('severities'):
+                conditions.append(Alert.severity.in_(filters['severities']))
+            if filters.get('is_read') is not None:
+                conditions.append(Alert.is_read == filters['is_read'])
+            if filters.get('is_resolved') is not None:
+                conditions.append(Alert.is_resolved == filters['is_resolved'])
+            if filters.get('created_before'):
+                conditions.append(Alert.created_at < filters['created_before'])
+
+        matched = select(
+            Alert.id, Alert.is_read, Alert.is_resolved, Alert.severity
+        ).join(
+            LoanAgreement, LoanAgreement.id == Alert.loan_agreement_id
+        ).where(
+            *conditions
+        ).with_for_update(of=Alert).cte('matched')
+
+        if action == 'read':
+            statement = update(Alert).where(
+                Alert.id == matched.c.id, matched.c.is_read == False
+            ).values(is_read=True)
+        elif action == 'resolve':
+            statement = update(Alert).where(
+                Alert.id == matched.c.id, or_(matched.c.is_resolved == False, matched.c.is_read == False)
+            ).values(is_resolved=True, is_read=True)
+        else:
+            statement = delete(Alert).where(Alert.id == matched.c.id)
+        changed = statement.returning(
+            matched.c.is_read, matched.c.is_resolved, matched.c.severity
+        ).cte('changed')
+
+        # Counters the changed alerts contributed (open alerts only)
+        was_open = changed.c.is_resolved == False
+        counts = db.execute(
+            select(
+                select(func.count()).select_from(matched).scalar_subquery(),
+                func.count(),
+                func.count().filter(was_open, changed.c.is_read == False),
+                func.count().filter(was_open, changed.c.severity == 'critical')
+            ).select_from(changed)
+        ).one()
+        matched_count, affected, unread, critical = counts
+
+        before = {"unread_alerts": unread, "critical_alerts": critical}
+        # Read alerts stay open and keep counting as critical
+        after = {"critical_alerts": critical} if action == 'read' else {}
+        portfolio_rollup_service.apply_change(db, user_id, before, after)
+        if affected:
+            self.notify_change(db, user_id, action, affected)
+
+        return {"matched": matched_count, "affected": affected}
+
+    def upsert_prediction_alerts(self, db: Session, alerts: List[Dict]) -> Dict[str, int]:
+        """
+        Write prediction alerts for many covenants with one statement, in
+        the caller's transaction. A covenant's open prediction alert (at
+        most one, by uq_alerts_open_prediction) is updated in place when its
+        predicted breach date, days until breach or severity changed, and
+        marked unread again when its severity rose; a covenant without one
+        gets a new unread alert.
+
+        Args:
+            alerts: Dicts with covenant_id, loan_agreement_id and the
+                prediction_alert_fields keys; the last one per covenant wins
+
+        Returns:
+            {"inserted": n, "updated": n, "unchanged": n}
+        """
+        if not alerts:
+            return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        # ON CONFLICT cannot touch the same row twice in one statement
+        rows = {
+            alert['covenant_id']: {**alert, "alert_type": 'prediction', "is_read": False, "is_resolved": False}
+            for alert in alerts
+        }
+        statement = insert(Alert)
+        rank = {severity: rank for rank, severity in enumerate(SEVERITY_ORDER)}
+        escalated = case(rank, value=statement.excluded.severity) > case(rank, value=Alert.severity)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Alert.covenant_id],
+            index_where=and_(Alert.alert_type == 'prediction', ~Alert.is_resolved),
+            set_={
+                **{key: getattr(statement.excluded, key) for key in PREDICTION_FIELDS},
+                "is_read": and_(Alert.is_read, ~escalated)
+            },
+            where=or_(
+                Alert.predicted_breach_date.is_distinct_from(statement.excluded.predicted_breach_date),
+                Alert.days_until_breach.is_distinct_from(statement.excluded.days_until_breach),
+                Alert.severity != statement.excluded.severity
+            )
+        ).returning(Alert.id, literal_column('xmax = 0'))
+        written = db.execute(statement, list(rows.values())).all()
+        self.notify_alerts(db, [alert_id for alert_id, is_insert in written if is_insert], created=True)
+        self.notify_alerts(db, [alert_id for alert_id, is_insert in written if not is_insert])
+
+        inserted = sum(1 for _, is_insert in written if is_insert)
+        return {"inserted": inserted, "updated": len(written) - inserted, "unchanged": len(rows) - len(written)}
+
+    def resolve_prediction_alerts(self, db: Session, covenant_ids: Iterable[UUID]) -> int:
+        """
+        Resolve the open prediction alerts of covenants whose forecast no
+        longer predicts a breach, in the caller's transaction.
+
+        Returns:
+            How many alerts were resolved
+        """
+        covenant_ids = list(set(covenant_ids))
+        if not covenant_ids:
+            return 0
+
+        alert_ids = db.execute(
+            update(Alert).where(
+                Alert.covenant_id.in_(covenant_ids),
+                Alert.alert_type == 'prediction',
+                Alert.is_resolved == False
+            ).values(is_resolved=True).returning(Alert.id).execution_options(synchronize_session=False)
+        ).scalars().all()
+        self.notify_alerts(db, alert_ids)
+        return len(alert_ids)
+
+alert_service = AlertService()
@@ -0,0 +1,262 @@
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.schemas.loan import AlertResponse
+from app.services.alert_service import alert_service, ALERT_CHANNEL
+from app.utils.pagination import encode_cursor
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from uuid import UUID
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (event, SSE id or None, JSON data)
+Event = Tuple[str, Optional[str], str]
+
+class AlertSubscription:
+    """
+    One connected alert stream: a bounded queue of events for a user.
+    Tracks the (created_at, id) of the newest alert sent, which is the
+    event id a reconnecting client replays from.
+    """
+
+    def __init__(self, user_id: UUID, after: Optional[Tuple[datetime, UUID]] = None):
+        self.user_id = user_id
+        self.after = after
+        self._queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=settings.ALERT_STREAM_BUFFER)
+        self.closed = False
+
+    def send_alert(self, created_at: datetime, alert_id: UUID, data: str, created: bool) -> None:
+        """Queue an alert; only newly created alerts past the cursor advance it"""
+        event_id = None
+        if created and (self.after is None or (created_at, alert_id) > self.after):
+            self.after = (created_at, alert_id)
+            event_id = encode_cursor(created_at, alert_id)
+        self.send("alert", event_id, data)
+
+    def send(self, event: str, event_id: Optional[str], data: str) -> None:
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait((event, event_id, data))
+        except asyncio.QueueFull:
+            # A client this far behind reconnects and replays from its last id
+            logger.warning(f"Dropping slow alert stream of user {self.user_id}")
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def events(self) -> AsyncIterator[Optional[Event]]:
+        """Queued events until closed; None every heartbeat interval spent idle"""
+        while True:
+            try:
+                event = await asyncio.wait_for(self._queue.get(), settings.ALERT_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                return
+            yield event
+
+
+class AlertStreamService:
+    """
+    Pushes alert writes to connected clients (GET /api/alerts/stream).
+
+    Each worker process holds one LISTEN connection on ALERT_CHANNEL, read
+    from the event loop when its socket is readable, and fans
+    notifications out to in-memory subscriptions, so idle streams cost a
+    queue each rather than a thread or a database connection. Alert ids
+    are loaded once per batch of notifications, only for users with a
+    subscription in this worker.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[UUID, Set[AlertSubscription]] = {}
+        self._connection = None
+        self._fileno: Optional[int] = None  # Kept: a closed connection has none
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listening: Optional[asyncio.Event] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, bool] = {}  # Notified alert id -> created
+
+    async def subscribe(self, user_id: UUID, after: Optional[Tuple[datetime, UUID]] = None) -> AlertSubscription:
+        """
+        Open a subscription to the user's alerts, first replaying the open
+        alerts created after ``after`` (a client's Last-Event-ID). Call
+        unsubscribe when the client goes away.
+        """
+        self._start()
+        # Nothing written from here on can be missed
+        await self._listening.wait()
+        subscription = AlertSubscription(user_id, after)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+
+        if after:
+            alerts = await run_in_threadpool(self._load_created_since, user_id, after)
+            if len(alerts) > settings.ALERT_STREAM_REPLAY_LIMIT:
+                subscription.send("alerts-changed", None, json.dumps({"action": "resync"}))
+            else:
+                for created_at, alert_id, data in alerts:
+                    subscription.send_alert(created_at, alert_id, data, created=True)
+        return subscription
+
+    def unsubscribe(self, subscription: AlertSubscription) -> None:
+        subscription.close()
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    async def stop(self) -> None:
+        """Close every subscription and the LISTEN connection (worker shutdown)"""
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                self.unsubscribe(subscription)
+        for task in (self._listen_task, self._load_task):
+            if task is not None:
+                task.cancel()
+        self._listen_task = self._load_task = None
+        self._disconnect()
+        self._loop = None
+
+    def _start(self) -> None:
+        """Start listening on first use, so processes that never stream hold no connection"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._listening = asyncio.Event()
+            self._listen_task = self._loop.create_task(self._listen(resync=False))
+
+    async def _listen(self, resync: bool) -> None:
+        """(Re)open the LISTEN connection, retrying with backoff"""
+        delay = 1
+        while True:
+            try:
+                self._connection = await run_in_threadpool(self._connect)
+                break
+            except Exception as e:
+                logger.warning(f"Alert stream could not LISTEN, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        self._fileno = self._connection.fileno()
+        self._loop.add_reader(self._fileno, self._on_readable)
+        self._listening.set()
+        self._listen_task = None
+        if resync:
+            # Notifications sent while disconnected are lost; clients refetch
+            self._broadcast("alerts-changed", json.dumps({"action": "resync"}))
+
+    def _connect(self):
+        pooled = engine.raw_connection()
+        connection = pooled.driver_connection
+        # Held for the worker's lifetime, outside the pool
+        pooled.detach()
+        connection.rollback()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {ALERT_CHANNEL}")
+        return connection
+
+    def _disconnect(self) -> None:
+        if self._connection is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._fileno)
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def _on_readable(self) -> None:
+        try:
+            self._connection.poll()
+        except Exception as e:
+            logger.warning(f"Alert stream lost its LISTEN connection: {e}")
+            self._listening.clear()
+            self._disconnect()
+            self._listen_task = self._loop.create_task(self._listen(resync=True))
+            return
+
+        notifies = self._connection.notifies
+        while notifies:
+            payload = json.loads(notifies.pop(0).payload)
+            if "ids" in payload:
+                for alert_id in payload["ids"]:
+                    self._pending[alert_id] = self._pending.get(alert_id, False) or payload["created"]
+            else:
+                self._send_change(payload)
+
+        if self._pending and self._load_task is None:
+            self._load_task = self._loop.create_task(self._load_pending())
+
+    def _send_change(self, payload: Dict) -> None:
+        """A bulk read, resolve or delete: the user's clients refetch what they show"""
+        subscriptions = self._subscriptions.get(UUID(payload["user_id"]))
+        if subscriptions:
+            data = json.dumps({"action": payload["action"], "count": payload["count"]})
+            for subscription in list(subscriptions):
+                subscription.send("alerts-changed", None, data)
+
+    def _broadcast(self, event: str, data: str) -> None:
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.send(event, None, data)
+
+    async def _load_pending(self) -> None:
+        """Load and fan out notified alerts; ids notified meanwhile make the next batch"""
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                user_ids = list(self._subscriptions)
+                if not user_ids:
+                    continue
+                try:
+                    alerts = await run_in_threadpool(self._load_owned, list(pending), user_ids)
+                except Exception as e:
+                    logger.error(f"Alert stream could not load {len(pending)} notified alerts: {e}")
+                    continue
+                for user_id, created_at, alert_id, data in alerts:
+                    for subscription in list(self._subscriptions.get(user_id, ())):
+                        subscription.send_alert(created_at, alert_id, data, pending[str(alert_id)])
+        finally:
+            self._load_task = None
+
+    def _load_owned(self, alert_ids, user_ids):
+        db = SessionLocal()
+        try:
+            rows = sorted(
+                alert_service.owned_by(db, [UUID(alert_id) for alert_id in alert_ids], user_ids),
+                key=lambda row: (row[1].created_at, row[1].id)
+            )
+            return [
+                (user_id, alert.created_at, alert.id, AlertResponse.from_orm(alert).model_dump_json())
+                for user_id, alert in rows
+            ]
+        finally:
+            db.close()
+
+    def _load_created_since(self, user_id: UUID, after: Tuple[datetime, UUID]):
+        db = SessionLocal()
+        try:
+            alerts = alert_service.created_since(db, user_id, after, settings.ALERT_STREAM_REPLAY_LIMIT + 1)
+            return [
+                (alert.created_at, alert.id, AlertResponse.from_orm(alert).model_dump_json())
+                for alert in alerts
+            ]
+        finally:
+            db.close()
+
+alert_stream_service = AlertStreamService()
@@ -0,0 +1,377 @@
+from sqlalchemy import select, update, union_all, exists, func, case, and_, or_, tuple_, null, Date
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.dialects.postgresql import insert
+from app.models.covenant import Covenant, CovenantAmendment, CovenantMeasurement, CovenantTrendStats
+from app.models.loan import LoanAgreement
+from app.services.alert_service import alert_service
+from app.services.analytics_service import analytics_service
+from app.services.model_choice_service import model_choice_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.prediction_service import OPERATORS
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import date
+from bisect import bisect_right
+from decimal import Decimal
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Operators whose value must stay below / above the threshold
+BELOW = ('less_than', 'less_or_equal')
+ABOVE = ('greater_than', 'greater_or_equal')
+
+class AmendmentService:
+    """
+    Effective-dated covenant terms.
+
+    Each measurement is tested against the terms in force on its date.
+    Amending a covenant re-tests its whole history with one set-based
+    UPDATE and refreshes the status snapshots, alerts, forecasts and
+    rollup derived from it, in the same transaction.
+    """
+
+    def _schedules(self, db: Session, covenant_ids: Iterable[UUID]) -> Dict[UUID, List[CovenantAmendment]]:
+        """Amendments of each covenant, oldest first"""
+        schedules = {}
+        for amendment in db.query(CovenantAmendment).filter(
+            CovenantAmendment.covenant_id.in_(set(covenant_ids))
+        ).order_by(CovenantAmendment.covenant_id, CovenantAmendment.effective_date):
+            schedules.setdefault(amendment.covenant_id, []).append(amendment)
+        return schedules
+
+    def terms_at(self, db: Session, keys: List[Tuple[UUID, date]]) -> List[Tuple[Optional[Decimal], Optional[str]]]:
+        """
+        Threshold value and operator in force for each (covenant_id,
+        measurement_date), to test new measurements against.
+
+        Locks the covenants FOR SHARE until the caller's transaction ends,
+        so an amendment waits for the write and then re-tests it, and
+        refreshes the covenants already loaded in the session.
+        """
+        covenant_ids = {covenant_id for covenant_id, _ in keys}
+        covenants = {
+            covenant.id: covenant
+            for covenant in db.query(Covenant).filter(
+                Covenant.id.in_(covenant_ids)
+            ).with_for_update(read=True).populate_existing()
+        }
+        schedules = {
+            covenant_id: ([amendment.effective_date for amendment in schedule], schedule)
+            for covenant_id, schedule in self._schedules(db, covenant_ids).items()
+        }
+
+        terms = []
+        for covenant_id, measurement_date in keys:
+            if covenant_id not in schedules:
+                covenant = covenants[covenant_id]
+                terms.append((covenant.threshold_value, covenant.threshold_operator))
+                continue
+            dates, schedule = schedules[covenant_id]
+            position = bisect_right(dates, measurement_date) - 1
+            if position < 0:
+                terms.append((schedule[0].previous_threshold_value, schedule[0].previous_threshold_operator))
+            else:
+                terms.append((schedule[position].threshold_value, schedule[position].threshold_operator))
+        return terms
+
+    def amend(self, db: Session, user_id: UUID, loan_id: UUID, amendments: List[Dict]) -> Dict[str, Any]:
+        """
+        Record amendments to a loan's covenants and re-test their
+        measurements, in the caller's transaction. The caller verifies the
+        covenants belong to the loan and the user, then bumps the data
+        version, commits and invalidates LOANS, MEASUREMENTS and ALERTS.
+
+        An amendment for a covenant and date that already has one replaces
+        its terms. The covenant row takes the terms in force today, which
+        forecasts test against; apply_due_terms moves it on to a future
+        amendment once that takes effect.
+
+        Args:
+            amendments: Dicts with covenant_id, effective_date,
+                threshold_value and optionally threshold_operator (default:
+                the operator in force on effective_date) and notes
+
+        Returns:
+            {"amendments": the recorded CovenantAmendment rows,
+             "reevaluated": measurements whose status, threshold or
+             distance changed, "status_changes": n, "breach_alerts": n,
+             "prediction_alerts": n, "prediction_alerts_resolved": n}
+
+        Raises:
+            ValueError: For an unknown or missing threshold operator
+        """
+        rollup_before = portfolio_rollup_service.loan_counters(db, user_id, loan_id, lock=True)
+
+        covenant_ids = {amendment['covenant_id'] for amendment in amendments}
+        covenants = {
+            covenant.id: covenant
+            for covenant in db.query(Covenant).filter(
+                Covenant.id.in_(covenant_ids)
+            ).with_for_update().populate_existing()
+        }
+
+        # Original terms and {effective_date: terms} per covenant
+        schedules = {}
+        existing = self._schedules(db, covenant_ids)
+        for covenant_id, covenant in covenants.items():
+            schedule = existing.get(covenant_id, [])
+            original = ((schedule[0].previous_threshold_value, schedule[0].previous_threshold_operator)
+                        if schedule else (covenant.threshold_value, covenant.threshold_operator))
+            schedules[covenant_id] = (original, {
+                amendment.effective_date: (amendment.threshold_value, amendment.threshold_operator, amendment.notes)
+                for amendment in schedule
+            })
+
+        for amendment in sorted(amendments, key=lambda amendment: amendment['effective_date']):
+            original, dated = schedules[amendment['covenant_id']]
+            operator = amendment.get('threshold_operator')
+            if not operator:
+                earlier = [effective_date for effective_date in dated if effective_date <= amendment['effective_date']]
+                operator = dated[max(earlier)][1] if earlier else original[1]
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown threshold operator: {operator}")
+            dated[amendment['effective_date']] = (amendment['threshold_value'], operator, amendment.get('notes'))
+
+        # Each amendment's previous terms are those of the one before it
+        rows = []
+        today = date.today()
+        for covenant_id, (original, dated) in schedules.items():
+            previous = in_force = original
+            for effective_date in sorted(dated):
+                threshold_value, threshold_operator, notes = dated[effective_date]
+                rows.append({
+                    "covenant_id": covenant_id,
+                    "effective_date": effective_date,
+                    "threshold_value": threshold_value,
+                    "threshold_operator": threshold_operator,
+                    "previous_threshold_value": previous[0],
+                    "previous_threshold_operator": previous[1],
+                    "notes": notes
+                })
+                previous = (threshold_value, threshold_operator)
+                if effective_date <= today:
+                    in_force = previous
+            covenants[covenant_id].threshold_value, covenants[covenant_id].threshold_operator = in_force
+
+        columns = ('threshold_value', 'threshold_operator', 'previous_threshold_value',
+                   'previous_threshold_operator', 'notes')
+        statement = insert(CovenantAmendment)
+        statement = statement.on_conflict_do_update(
+            constraint='uq_covenant_amendments_covenant_date',
+            set_={**{key: getattr(statement.excluded, key) for key in columns}, "updated_at": func.now()},
+            where=or_(*(getattr(CovenantAmendment, key).is_distinct_from(getattr(statement.excluded, key))
+                        for key in columns))
+        )
+        db.execute(statement, rows)
+        db.flush()
+
+        changed = self.reevaluate(db, covenant_ids)
+        analytics_service.refresh_status_snapshots(db, {row.covenant_id for row in changed})
+
+        # Alert when the amendment puts a covenant's latest measurement in breach
+        breach_alerts = [
+            {
+                "covenant_id": row.covenant_id,
+                "loan_agreement_id": loan_id,
+                **alert_service.breach_alert_fields(
+                    covenants[row.covenant_id].covenant_name,
+                    float(row.actual_value),
+                    float(row.threshold_value)
+                )
+            }
+            for row in changed
+            if row.is_latest and row.status == 'breach' and row.previous_status != 'breach'
+        ]
+        alert_service.insert_breach_alerts(db, breach_alerts)
+
+        # Forecast against the terms in force with each covenant's chosen model
+        predictions = model_choice_service.forecast(db, {
+            stats.covenant_id: {
+                "stats": stats,
+                "threshold_value": float(covenants[stats.covenant_id].threshold_value),
+                "threshold_operator": covenants[stats.covenant_id].threshold_operator
+            }
+            for stats in db.query(CovenantTrendStats).filter(CovenantTrendStats.covenant_id.in_(covenant_ids))
+            if covenants[stats.covenant_id].threshold_value
+        })
+        prediction_alerts = [
+            {
+                "covenant_id": covenant_id,
+                "loan_agreement_id": loan_id,
+                **alert_service.prediction_alert_fields(covenants[covenant_id].covenant_name, prediction)
+            }
+            for covenant_id, prediction in predictions.items() if prediction
+        ]
+        counts = alert_service.upsert_prediction_alerts(db, prediction_alerts)
+        resolved = alert_service.resolve_prediction_alerts(
+            db, covenant_ids - {alert['covenant_id'] for alert in prediction_alerts}
+        )
+
+        db.flush()
+        portfolio_rollup_service.apply_change(
+            db, user_id, rollup_before, portfolio_rollup_service.loan_counters(db, user_id, loan_id)
+        )
+
+        recorded = db.query(CovenantAmendment).filter(
+            tuple_(CovenantAmendment.covenant_id, CovenantAmendment.effective_date).in_(
+                {(amendment['covenant_id'], amendment['effective_date']) for amendment in amendments}
+            )
+        ).order_by(CovenantAmendment.covenant_id, CovenantAmendment.effective_date).populate_existing().all()
+        return {
+            "amendments": recorded,
+            "reevaluated": len(changed),
+            "status_changes": sum(1 for row in changed if row.status != row.previous_status),
+            "breach_alerts": len(breach_alerts),
+            "prediction_alerts": counts['inserted'] + counts['updated'],
+            "prediction_alerts_resolved": resolved
+        }
+
+    def apply_due_terms(self, db: Session, user_id: Optional[UUID] = None, today: Optional[date] = None) -> List:
+        """
+        Move covenant rows on to the terms of amendments that have taken
+        effect since they were recorded, with one UPDATE in the caller's
+        transaction. Measurement statuses already follow each date's terms,
+        so only the row (and the forecasts testing against it) changes.
+
+        Returns:
+            The updated covenants: covenant_id and user_id
+        """
+        today = today or date.today()
+        in_force = select(
+            CovenantAmendment.covenant_id,
+            CovenantAmendment.threshold_value,
+            CovenantAmendment.threshold_operator,
+            LoanAgreement.user_id
+        ).join(
+            Covenant, Covenant.id == CovenantAmendment.covenant_id
+        ).join(
+            LoanAgreement, LoanAgreement.id == Covenant.loan_agreement_id
+        ).where(
+            CovenantAmendment.effective_date <= today
+        ).distinct(
+            CovenantAmendment.covenant_id
+        ).order_by(
+            CovenantAmendment.covenant_id, CovenantAmendment.effective_date.desc()
+        ).subquery('in_force')
+
+        statement = update(Covenant).where(
+            Covenant.id == in_force.c.covenant_id,
+            or_(
+                Covenant.threshold_value.is_distinct_from(in_force.c.threshold_value),
+                Covenant.threshold_operator.is_distinct_from(in_force.c.threshold_operator)
+            )
+        ).values(
+            threshold_value=in_force.c.threshold_value,
+            threshold_operator=in_force.c.threshold_operator
+        ).returning(
+            in_force.c.covenant_id,
+            in_force.c.user_id
+        ).execution_options(synchronize_session=False)
+        if user_id:
+            statement = statement.where(in_force.c.user_id == user_id)
+        return db.execute(statement).all()
+
+    def reevaluate(self, db: Session, covenant_ids: Iterable[UUID]) -> List:
+        """
+        Re-test every measurement of the covenants against the terms in
+        force on its date with one UPDATE, in the caller's transaction.
+        Status and distance follow determine_measurement_status and
+        calculate_distance_to_breach; only rows that change are written.
+
+        Returns:
+            The changed rows: covenant_id, actual_value, threshold_value,
+            status, previous_status and is_latest (the covenant's latest
+            measurement)
+        """
+        covenant_ids = list(set(covenant_ids))
+        if not covenant_ids:
+            return []
+
+        # Terms per [starts, ends) period; the original terms run until the first amendment
+        earlier = aliased(CovenantAmendment)
+        schedule = union_all(
+            select(
+                CovenantAmendment.covenant_id,
+                CovenantAmendment.effective_date.label('starts'),
+                func.lead(CovenantAmendment.effective_date).over(
+                    partition_by=CovenantAmendment.covenant_id,
+                    order_by=CovenantAmendment.effective_date
+                ).label('ends'),
+                CovenantAmendment.threshold_value,
+                CovenantAmendment.threshold_operator
+            ).where(
+                CovenantAmendment.covenant_id.in_(covenant_ids)
+            ),
+            select(
+                CovenantAmendment.covenant_id,
+                null().cast(Date).label('starts'),
+                CovenantAmendment.effective_date.label('ends'),
+                CovenantAmendment.previous_threshold_value,
+                CovenantAmendment.previous_threshold_operator
+            ).where(
+                CovenantAmendment.covenant_id.in_(covenant_ids),
+                ~exists().where(
+                    earlier.covenant_id == CovenantAmendment.covenant_id,
+                    earlier.effective_date < CovenantAmendment.effective_date
+                )
+            )
+        ).subquery('schedule')
+
+        actual = CovenantMeasurement.actual_value
+        threshold = schedule.c.threshold_value
+        operator = schedule.c.threshold_operator
+        distance = case(
+            (operator.in_(BELOW), threshold - actual),
+            (operator.in_(ABOVE), actual - threshold),
+            else_=0
+        )
+        unset = or_(threshold.is_(None), threshold == 0, operator.is_(None))
+        evaluated = select(
+            CovenantMeasurement.id,
+            case((unset, null()), else_=threshold).label('threshold_value'),
+            case(
+                (unset, 'compliant'),
+                (distance < 0, 'breach'),
+                (distance < threshold * 0.1, 'warning'),
+                else_='compliant'
+            ).label('status'),
+            case((unset, null()), else_=func.round(distance, 4)).label('distance_to_breach'),
+            CovenantMeasurement.status.label('previous_status'),
+            (CovenantMeasurement.measurement_date == func.max(CovenantMeasurement.measurement_date).over(
+                partition_by=CovenantMeasurement.covenant_id
+            )).label('is_latest')
+        ).join(
+            schedule,
+            and_(
+                schedule.c.covenant_id == CovenantMeasurement.covenant_id,
+                or_(schedule.c.starts.is_(None), CovenantMeasurement.measurement_date >= schedule.c.starts),
+                or_(schedule.c.ends.is_(None), CovenantMeasurement.measurement_date < schedule.c.ends)
+            )
+        ).where(
+            CovenantMeasurement.covenant_id.in_(covenant_ids)
+        ).subquery('evaluated')
+
+        return db.execute(
+            update(CovenantMeasurement).where(
+                CovenantMeasurement.id == evaluated.c.id,
+                or_(
+                    CovenantMeasurement.status != evaluated.c.status,
+                    CovenantMeasurement.threshold_value.is_distinct_from(evaluated.c.threshold_value),
+                    CovenantMeasurement.distance_to_breach.is_distinct_from(evaluated.c.distance_to_breach)
+                )
+            ).values(
+                threshold_value=evaluated.c.threshold_value,
+                status=evaluated.c.status,
+                distance_to_breach=evaluated.c.distance_to_breach
+            ).returning(
+                CovenantMeasurement.covenant_id,
+                CovenantMeasurement.actual_value,
+                CovenantMeasurement.threshold_value,
+                CovenantMeasurement.status,
+                evaluated.c.previous_status,
+                evaluated.c.is_latest
+            ).execution_options(synchronize_session=False)
+        ).all()
+
+amendment_service = AmendmentService()
@@ -0,0 +1,406 @@
+from sqlalchemy import select, func, case, and_, true, literal_column
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.loan import LoanAgreement
+from app.models.covenant import Covenant, CovenantMeasurement, CovenantStatusSnapshot
+from app.models.alert import Alert
+from app.models.portfolio_snapshot import PortfolioMonthlySnapshot
+from typing import Dict, List, Iterable, Optional
+from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AnalyticsService:
+    """
+    Set-based portfolio analytics.
+    Each covenant's status is taken from its latest measurement only,
+    so a covenant is counted exactly once.
+    """
+
+    def latest_measurement(self):
+        """
+        Latest measurement of each covenant, as a LATERAL subquery.
+
+        Correlated on Covenant.id and backed by the
+        (covenant_id, measurement_date DESC, created_at DESC) index, so each
+        covenant costs one index probe regardless of history length.
+        Outer-join it with ``true()`` as the ON clause.
+
+        Returns:
+            Lateral subquery with status, distance_to_breach, actual_value
+            and measurement_date columns
+        """
+        return select(
+            CovenantMeasurement.status,
+            CovenantMeasurement.distance_to_breach,
+            CovenantMeasurement.actual_value,
+            CovenantMeasurement.measurement_date
+        ).where(
+            CovenantMeasurement.covenant_id == Covenant.id
+        ).order_by(
+            CovenantMeasurement.measurement_date.desc(),
+            CovenantMeasurement.created_at.desc()
+        ).limit(1).lateral('latest_measurement')
+
+    def covenant_status(self, as_of: Optional[date] = None, name: str = 'covenant_status'):
+        """
+        Status of each covenant, live or as of a date, as a LATERAL subquery.
+
+        Without ``as_of`` this is the latest measurement. With ``as_of`` it is
+        the latest covenant_status_snapshots row on or before that date: one
+        probe of the (covenant_id, as_of_date) unique index.
+
+        Returns:
+            Lateral subquery with status and distance_to_breach columns
+        """
+        if as_of is None:
+            return self.latest_measurement()
+
+        return select(
+            CovenantStatusSnapshot.status,
+            CovenantStatusSnapshot.distance_to_breach
+        ).where(
+            CovenantStatusSnapshot.covenant_id == Covenant.id,
+            CovenantStatusSnapshot.as_of_date <= as_of
+        ).order_by(
+            CovenantStatusSnapshot.as_of_date.desc()
+        ).limit(1).lateral(name)
+
+    def record_status_snapshots(self, db: Session, snapshots: List[Dict]) -> None:
+        """
+        Upsert covenant status snapshots in the caller's transaction.
+
+        Args:
+            snapshots: Dicts with covenant_id, as_of_date, status and
+                distance_to_breach; a later write for the same covenant and
+                date replaces the earlier one
+        """
+        if not snapshots:
+            return
+
+        # executemany: one cached statement instead of compiling a VALUES row per snapshot
+        statement = insert(CovenantStatusSnapshot)
+        statement = statement.on_conflict_do_update(
+            constraint='uq_covenant_status_snapshots_covenant_date',
+            set_={
+                "status": statement.excluded.status,
+                "distance_to_breach": statement.excluded.distance_to_breach,
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement, snapshots)
+
+    def refresh_status_snapshots(self, db: Session, covenant_ids: Iterable[UUID]) -> None:
+        """
+        Re-derive the snapshot of every measurement of the covenants with
+        one INSERT ... SELECT, in the caller's transaction; only snapshots
+        that differ are written. For rewrites of whole histories.
+        """
+        covenant_ids = list(set(covenant_ids))
+        if not covenant_ids:
+            return
+
+        statement = insert(CovenantStatusSnapshot).from_select(
+            ['id', 'covenant_id', 'as_of_date', 'status', 'distance_to_breach'],
+            select(
+                func.gen_random_uuid(),
+                CovenantMeasurement.covenant_id,
+                CovenantMeasurement.measurement_date,
+                CovenantMeasurement.status,
+                CovenantMeasurement.distance_to_breach
+            ).where(
+                CovenantMeasurement.covenant_id.in_(covenant_ids)
+            )
+        )
+        statement = statement.on_conflict_do_update(
+            constraint='uq_covenant_status_snapshots_covenant_date',
+            set_={
+                "status": statement.excluded.status,
+                "distance_to_breach": statement.excluded.distance_to_breach,
+                "updated_at": func.now()
+            },
+            where=(CovenantStatusSnapshot.status != statement.excluded.status)
+                | CovenantStatusSnapshot.distance_to_breach.is_distinct_from(statement.excluded.distance_to_breach)
+        )
+        db.execute(statement)
+
+    def refresh_status_snapshot(self, db: Session, covenant_id: UUID, as_of_date: date) -> None:
+        """
+        Re-derive one covenant's snapshot for a date from the measurements
+        left on it, in the caller's transaction; drops the snapshot when
+        none remain (the previous snapshot then applies again).
+        """
+        latest = db.query(CovenantMeasurement).filter(
+            CovenantMeasurement.covenant_id == covenant_id,
+            CovenantMeasurement.measurement_date == as_of_date
+        ).order_by(CovenantMeasurement.created_at.desc()).first()
+
+        if latest:
+            self.record_status_snapshots(db, [{
+                "covenant_id": covenant_id,
+                "as_of_date": as_of_date,
+                "status": latest.status,
+                "distance_to_breach": latest.distance_to_breach
+            }])
+        else:
+            db.query(CovenantStatusSnapshot).filter(
+                CovenantStatusSnapshot.covenant_id == covenant_id,
+                CovenantStatusSnapshot.as_of_date == as_of_date
+            ).delete(synchronize_session=False)
+
+    def get_portfolio_summary(self, db: Session, user_id: UUID, as_of: Optional[date] = None,
+                              loan_id: Optional[UUID] = None) -> Dict:
+        """
+        Compute all dashboard counters in a single round trip.
+
+        Loan, covenant and alert counters are aggregated in three
+        one-row derived tables using FILTER clauses and cross joined,
+        so Postgres executes one statement. ``as_of`` switches covenant
+        statuses to their point-in-time snapshots; ``loan_id`` restricts
+        the counters to one loan.
+
+        Returns:
+            Dict matching the PortfolioSummary schema fields
+        """
+        loan_filter = [LoanAgreement.user_id == user_id]
+        if loan_id is not None:
+            loan_filter.append(LoanAgreement.id == loan_id)
+
+        loan_stats = select(
+            func.count(LoanAgreement.id).label('total_loans'),
+            func.count(LoanAgreement.id).filter(
+                LoanAgreement.status == 'active'
+            ).label('active_loans'),
+            func.coalesce(
+                func.sum(LoanAgreement.loan_amount).filter(LoanAgreement.status == 'active'), 0
+            ).label('total_exposure')
+        ).where(
+            *loan_filter
+        ).subquery('loan_stats')
+
+        latest = self.covenant_status(as_of)
+        covenant_stats = select(
+            func.count(Covenant.id).label('total_covenants'),
+            func.count(Covenant.id).filter(latest.c.status == 'compliant').label('compliant_covenants'),
+            func.count(Covenant.id).filter(latest.c.status == 'warning').label('warning_covenants'),
+            func.count(Covenant.id).filter(latest.c.status == 'breach').label('breach_covenants')
+        ).select_from(
+            Covenant
+        ).join(
+            LoanAgreement, LoanAgreement.id == Covenant.loan_agreement_id
+        ).outerjoin(
+            latest, true()
+        ).where(
+            *loan_filter,
+            Covenant.is_active == True
+        ).subquery('covenant_stats')
+
+        alert_stats = select(
+            func.count(Alert.id).filter(Alert.is_read == False).label('unread_alerts'),
+            func.count(Alert.id).filter(Alert.severity == 'critical').label('critical_alerts')
+        ).join(
+            LoanAgreement, LoanAgreement.id == Alert.loan_agreement_id
+        ).where(
+            *loan_filter,
+            Alert.is_resolved == False
+        ).subquery('alert_stats')
+
+        row = db.execute(
+            select(loan_stats, covenant_stats, alert_stats).select_from(
+                loan_stats.join(covenant_stats, true()).join(alert_stats, true())
+            )
+        ).mappings().one()
+
+        summary = {key: int(value or 0) for key, value in row.items() if key != 'total_exposure'}
+        summary['total_exposure'] = row['total_exposure']
+        return summary
+
+    def get_risk_heatmap(self, db: Session, user_id: UUID, as_of: Optional[date] = None) -> List[Dict]:
+        """
+        Worst covenant status per active loan in a single statement.
+
+        Loans are outer-joined to their active covenants and each covenant's
+        latest measurement, then grouped per loan. Cost depends on the number
+        of covenants, not on how long their measurement history is.
+        ``as_of`` switches covenant statuses to their point-in-time snapshots.
+
+        Returns:
+            List of dicts matching the RiskHeatmapItem schema fields
+        """
+        latest = self.covenant_status(as_of)
+        breach_count = func.count(Covenant.id).filter(latest.c.status == 'breach')
+        warning_count = func.count(Covenant.id).filter(latest.c.status == 'warning')
+
+        rows = db.execute(
+            select(
+                LoanAgreement.id.label('loan_id'),
+                LoanAgreement.title.label('loan_title'),
+                LoanAgreement.borrower_name,
+                case(
+                    (breach_count > 0, 'breach'),
+                    (warning_count > 0, 'warning'),
+                    else_='compliant'
+                ).label('status'),
+                func.count(Covenant.id).label('covenant_count'),
+                case(
+                    (breach_count > 0, breach_count),
+                    else_=warning_count
+                ).label('critical_count')
+            ).outerjoin(
+                Covenant, and_(
+                    Covenant.loan_agreement_id == LoanAgreement.id,
+                    Covenant.is_active == True
+                )
+            ).outerjoin(
+                latest, true()
+            ).where(
+                LoanAgreement.user_id == user_id,
+                LoanAgreement.status == 'active'
+            ).group_by(
+                LoanAgreement.id
+            )
+        ).mappings().all()
+
+        return [dict(row) for row in rows]
+
+    def get_month_end_values(self, db: Session, user_id: UUID, months: Iterable[date]) -> Dict[date, float]:
+        """
+        Active portfolio value at the end of each requested month.
+
+        Loans are bucketed by creation month (everything older than the
+        first month lands in the first bucket) and a running SUM() over a
+        generate_series of month starts turns the buckets into month-end
+        totals, all in one statement.
+
+        Args:
+            months: First days of the months to compute
+
+        Returns:
+            {month_start: value} for every requested month
+        """
+        months = sorted(set(months))
+        if not months:
+            return {}
+        first_month, last_month = months[0], months[-1]
+
+        bucket = func.greatest(func.date_trunc('month', LoanAgreement.created_at), first_month)
+        buckets = select(
+            bucket.label('month_start'),
+            func.sum(LoanAgreement.loan_amount).label('amount')
+        ).where(
+            LoanAgreement.user_id == user_id,
+            LoanAgreement.status == 'active',
+            LoanAgreement.created_at < last_month + relativedelta(months=1)
+        ).group_by(
+            bucket
+        ).subquery('buckets')
+
+        series = select(
+            func.generate_series(
+                first_month, last_month, literal_column("interval '1 month'")
+            ).label('month_start')
+        ).subquery('months')
+
+        rows = db.execute(
+            select(
+                series.c.month_start,
+                func.sum(func.coalesce(buckets.c.amount, 0)).over(
+                    order_by=series.c.month_start
+                ).label('total_value')
+            ).outerjoin(
+                buckets, buckets.c.month_start == series.c.month_start
+            )
+        ).all()
+
+        values = {row.month_start.date(): float(row.total_value) for row in rows}
+        return {month: values[month] for month in months}
+
+    def get_portfolio_trends(self, db: Session, user_id: UUID, now: Optional[datetime] = None) -> Dict:
+        """
+        Month-end portfolio value for the last 13 months and the same
+        months a year earlier.
+
+        Closed months are read from portfolio_monthly_snapshots when the
+        snapshot job has filled them; anything missing, and always the
+        current month, is computed live in one get_month_end_values call.
+
+        Returns:
+            Dict matching the PortfolioTrendsResponse schema fields
+            (values in thousands)
+        """
+        now = now or datetime.now()
+        current_month = date(now.year, now.month, 1)
+        months = [current_month - relativedelta(months=i) for i in range(12, -1, -1)]
+        previous_months = [month - relativedelta(years=1) for month in months]
+
+        closed_months = [month for month in previous_months + months if month < current_month]
+        values = {
+            snapshot.month_start: float(snapshot.total_value)
+            for snapshot in db.query(PortfolioMonthlySnapshot).filter(
+                PortfolioMonthlySnapshot.user_id == user_id,
+                PortfolioMonthlySnapshot.month_start.in_(closed_months)
+            )
+        }
+
+        missing = [month for month in previous_months + months if month not in values]
+        values.update(self.get_month_end_values(db, user_id, missing))
+
+        return {
+            "months": [month.strftime('%b') for month in months],
+            "current_period": [values[month] / 1000 for month in months],  # Convert to thousands
+            "previous_period": [values[month] / 1000 for month in previous_months]
+        }
+
+    def get_covenant_trends(self, db: Session, user_id: UUID, as_of: Optional[date] = None,
+                            period_days: int = 30) -> Dict[str, float]:
+        """
+        Change in compliant/warning/breach covenant counts versus
+        ``period_days`` earlier.
+
+        Both periods are resolved in one statement: the current one from
+        latest measurements (or snapshots when ``as_of`` is given) and the
+        previous one from covenant_status_snapshots.
+
+        Returns:
+            Dict matching the CovenantTrendsResponse schema fields
+        """
+        previous_date = (as_of or date.today()) - timedelta(days=period_days)
+        current = self.covenant_status(as_of, name='current_status')
+        previous = self.covenant_status(previous_date, name='previous_status')
+
+        counts = {}
+        for period, lateral in (('current', current), ('previous', previous)):
+            for status in ('compliant', 'warning', 'breach'):
+                counts[f'{period}_{status}'] = func.count(Covenant.id).filter(
+                    lateral.c.status == status
+                ).label(f'{period}_{status}')
+
+        row = db.execute(
+            select(*counts.values()).select_from(
+                Covenant
+            ).join(
+                LoanAgreement, LoanAgreement.id == Covenant.loan_agreement_id
+            ).outerjoin(
+                current, true()
+            ).outerjoin(
+                previous, true()
+            ).where(
+                LoanAgreement.user_id == user_id,
+                Covenant.is_active == True
+            )
+        ).mappings().one()
+
+        def calc_change(current_count, previous_count):
+            if previous_count == 0:
+                return 100.0 if current_count > 0 else 0.0
+            return ((current_count - previous_count) / previous_count) * 100.0
+
+        return {
+            f'{status}_change': calc_change(row[f'current_{status}'], row[f'previous_{status}'])
+            for status in ('compliant', 'warning', 'breach')
+        }
+
+analytics_service = AnalyticsService()
@@ -0,0 +1,203 @@
+from fastapi.encoders import jsonable_encoder
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from app.config import settings
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Data scopes that writes invalidate. Every cached entry depends on "loans"
+# because deleting a loan cascades to its covenants, measurements and alerts.
+LOANS = "loans"
+MEASUREMENTS = "measurements"
+ALERTS = "alerts"
+
+class InMemoryCacheBackend:
+    """
+    Per-process LRU cache with TTL expiry.
+    Invalidation is only visible to the current process; use the Redis
+    backend when running several workers.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_generations(self, keys: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(key, 0) for key in keys)
+
+    def bump_generations(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """
+    Shared cache in Redis or any Redis-protocol server (Valkey, KeyDB,
+    Dragonfly), so invalidation reaches every worker.
+    Entries expire by TTL; configure the server with an LRU
+    maxmemory-policy (e.g. allkeys-lru) to bound memory.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("ANALYTICS_CACHE_BACKEND=redis requires the 'redis' package") from e
+
+        self.ttl_seconds = ttl_seconds
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self._client.set(key, json.dumps(value), ex=self.ttl_seconds)
+
+    def get_generations(self, keys: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(int(value or 0) for value in self._client.mget(list(keys)))
+
+    def bump_generations(self, keys: Iterable[str]) -> None:
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(key)
+        pipeline.execute()
+
+    def size(self) -> int:
+        return self._client.dbsize()
+
+class AnalyticsCache:
+    """
+    Read-through cache for analytics endpoint results, keyed by user,
+    endpoint and parameters.
+
+    Each entry's key embeds a generation counter per data scope it reads
+    (loans, measurements, alerts) for that user. Writes bump only the
+    scopes they touched, which orphans exactly the affected entries; they
+    then age out through LRU/TTL eviction.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _generation_keys(self, user_id, scopes: Iterable[str]) -> list:
+        return [f"analytics:gen:{user_id}:{scope}" for scope in scopes]
+
+    def _count(self, hit: bool) -> None:
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def cached(self, endpoint: str, scopes: Iterable[str]) -> Callable:
+        """
+        Decorate an endpoint handler taking `current_user` and `db` keyword
+        arguments. Other keyword arguments become part of the cache key.
+        The cached value is the JSON-compatible form of the result.
+        """
+        scopes = tuple(sorted(set(scopes) | {LOANS}))
+
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(**kwargs):
+                if self.backend is None:
+                    return func(**kwargs)
+
+                user_id = kwargs["current_user"].id
+                params = sorted(
+                    (name, str(value)) for name, value in kwargs.items()
+                    if name not in ("current_user", "db")
+                )
+                generations = self.backend.get_generations(self._generation_keys(user_id, scopes))
+                # Today's date is part of the key because several endpoints
+                # compare against "30 days ago" or the current month
+                key = f"analytics:{user_id}:{endpoint}:{generations}:{date.today()}:{params}"
+
+                value = self.backend.get(key)
+                if value is not None:
+                    self._count(hit=True)
+                    return value
+
+                self._count(hit=False)
+                value = jsonable_encoder(func(**kwargs))
+                self.backend.set(key, value)
+                return value
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, user_id, *scopes: str) -> None:
+        """
+        Drop cached analytics that read any of the given scopes for a user.
+        Call after the write has committed.
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump_generations(self._generation_keys(user_id, scopes))
+        except Exception as e:
+            logger.error(f"Failed to invalidate analytics cache for user {user_id}: {e}")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process"""
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else "disabled",
+            "entries": self.backend.size() if self.backend else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+def _build_backend():
+    backend = settings.ANALYTICS_CACHE_BACKEND.lower()
+    if backend == "memory":
+        return InMemoryCacheBackend(settings.ANALYTICS_CACHE_MAX_ENTRIES, settings.ANALYTICS_CACHE_TTL_SECONDS)
+    if backend == "redis":
+        return RedisCacheBackend(settings.ANALYTICS_CACHE_URL, settings.ANALYTICS_CACHE_TTL_SECONDS)
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown ANALYTICS_CACHE_BACKEND: {settings.ANALYTICS_CACHE_BACKEND}")
+
+analytics_cache = AnalyticsCache(_build_backend())
@@ -0,0 +1,39 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.user_data_version import UserDataVersion
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DataVersionService:
+    """
+    Per-user data version used for ETag / If-None-Match on read endpoints.
+    """
+
+    def bump(self, db: Session, user_id: UUID) -> None:
+        """
+        Increment the user's data version in the caller's transaction.
+        Call before the commit of any write to loans, covenants,
+        measurements or alerts so the new version becomes visible together
+        with the data.
+        """
+        statement = insert(UserDataVersion).values(user_id=user_id, version=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserDataVersion.user_id],
+            set_={
+                "version": UserDataVersion.version + 1,
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement)
+
+    def get(self, db: Session, user_id: UUID) -> int:
+        """Current data version (0 if the user has never written anything)"""
+        version = db.query(UserDataVersion.version).filter(
+            UserDataVersion.user_id == user_id
+        ).scalar()
+        return version or 0
+
+data_version_service = DataVersionService()
@@ -0,0 +1,209 @@
+"""
+Forecasting models for PredictionService.forecast_many.
+
+Every model works on a batch of covenants at once: series are padded
+into [covenants, points] arrays (x in days since each covenant's first
+measurement, y the values, lengths the real point counts), so fitting
+loops over time steps at most, never over covenants. Exponential
+smoothing models treat consecutive measurements as one step apart
+(covenant tests are mostly quarterly) and map days to steps with the
+covenant's mean test spacing.
+"""
+import numpy as np
+from typing import Dict
+
+# Measurements per seasonal cycle (quarterly tests)
+SEASON_LENGTH = 4
+
+
+def _last(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Each row's last real value"""
+    return values[np.arange(len(values)), lengths - 1]
+
+
+def _steps(state: Dict, days_ahead: np.ndarray) -> np.ndarray:
+    """Fractional smoothing steps for days after the last measurement"""
+    return days_ahead / state['spacing'][:, None]
+
+
+def _damped_sum(phi: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    """phi + phi^2 + ... + phi^h, for fractional h"""
+    phi = phi[:, None]
+    return np.where(phi < 1, phi * (1 - phi ** steps) / np.where(phi < 1, 1 - phi, 1), steps)
+
+
+def _pick(grid_values: np.ndarray, best: np.ndarray) -> np.ndarray:
+    """Per-covenant value of the best grid point from [covenants, grid] arrays"""
+    return grid_values[np.arange(len(best)), best]
+
+
+class LinearModel:
+    """Least-squares trend line in days, as predict_breach_date fits"""
+
+    name = 'linear'
+    min_points = 3
+
+    def fit(self, x: np.ndarray, y: np.ndarray, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+        mask = np.arange(x.shape[1]) < lengths[:, None]
+        x_mean = np.where(mask, x, 0).sum(axis=1) / lengths
+        y_mean = np.where(mask, y, 0).sum(axis=1) / lengths
+        x_centered = np.where(mask, x - x_mean[:, None], 0)
+        y_centered = np.where(mask, y - y_mean[:, None], 0)
+        sxx = (x_centered * x_centered).sum(axis=1)
+        syy = (y_centered * y_centered).sum(axis=1)
+        slope = np.divide((x_centered * y_centered).sum(axis=1), sxx, out=np.zeros_like(sxx), where=sxx > 0)
+        ss_res = np.where(mask, (y_centered - slope[:, None] * x_centered) ** 2, 0).sum(axis=1)
+        return {
+            'level': y_mean + slope * (_last(x, lengths) - x_mean),
+            'slope_per_day': slope,
+            'r_squared': np.where(syy > 0, 1 - np.divide(ss_res, syy, out=np.zeros_like(syy), where=syy > 0), 1.0)
+        }
+
+    def forecast(self, state: Dict[str, np.ndarray], days_ahead: np.ndarray) -> np.ndarray:
+        return state['level'][:, None] + state['slope_per_day'][:, None] * days_ahead
+
+
+class DampedTrendModel:
+    """
+    Holt's additive damped trend. Smoothing parameters are picked per
+    covenant from a small grid by in-sample one-step-ahead error.
+    """
+
+    name = 'damped_trend'
+    min_points = 4
+    grid = np.array([
+        (alpha, beta, phi)
+        for alpha in (0.2, 0.5, 0.8)
+        for beta in (0.1, 0.3)
+        for phi in (0.8, 0.9, 0.98)
+    ])
+
+    def fit(self, x: np.ndarray, y: np.ndarray, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+        alpha, beta, phi = (self.grid[:, i][None, :] for i in range(3))
+        covenants = len(y)
+        level = np.repeat(y[:, :1], len(self.grid), axis=1)
+        trend = np.repeat(y[:, 1:2] - y[:, :1], len(self.grid), axis=1)
+        sse = np.zeros_like(level)
+        errors = np.zeros((covenants, len(self.grid), y.shape[1]))
+
+        for t in range(1, y.shape[1]):
+            active = (t < lengths)[:, None]
+            observed = y[:, t:t + 1]
+            error = observed - (level + phi * trend)
+            new_level = alpha * observed + (1 - alpha) * (level + phi * trend)
+            new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+            if t >= 2:
+                sse = np.where(active, sse + error * error, sse)
+                errors[:, :, t] = np.where(active, error, 0)
+            level = np.where(active, new_level, level)
+            trend = np.where(active, new_trend, trend)
+
+        best = np.argmin(sse, axis=1)
+        return _smoothing_state(x, y, lengths, {
+            'level': _pick(level, best),
+            'trend': _pick(trend, best),
+            'phi': self.grid[best, 2],
+            'sse': _pick(sse, best),
+            'errors': errors[np.arange(covenants), best],
+            'errors_from': np.full(covenants, 2)
+        })
+
+    def forecast(self, state: Dict[str, np.ndarray], days_ahead: np.ndarray) -> np.ndarray:
+        steps = _steps(state, days_ahead)
+        return state['level'][:, None] + state['trend'][:, None] * _damped_sum(state['phi'], steps)
+
+
+class HoltWintersModel:
+    """
+    Additive Holt-Winters with a damped trend and one SEASON_LENGTH cycle
+    of seasonal indices, initialised from the first two cycles.
+    Parameters are picked per covenant from a small grid like
+    DampedTrendModel.
+    """
+
+    name = 'holt_winters'
+    min_points = 2 * SEASON_LENGTH + 1
+    grid = np.array([
+        (alpha, beta, gamma, phi)
+        for alpha in (0.2, 0.5)
+        for beta in (0.1, 0.3)
+        for gamma in (0.1, 0.4)
+        for phi in (0.9, 0.98)
+    ])
+
+    def fit(self, x: np.ndarray, y: np.ndarray, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+        m = SEASON_LENGTH
+        alpha, beta, gamma, phi = (self.grid[:, i][None, :] for i in range(4))
+        grid_size = len(self.grid)
+
+        first_cycle = y[:, :m].mean(axis=1, keepdims=True)
+        second_cycle = y[:, m:2 * m].mean(axis=1, keepdims=True)
+        level = np.repeat(first_cycle, grid_size, axis=1)
+        trend = np.repeat((second_cycle - first_cycle) / m, grid_size, axis=1)
+        # seasons[:, :, k] is the index for points t with t % m == k
+        seasons = np.repeat((y[:, :m] - first_cycle)[:, None, :], grid_size, axis=1)
+        sse = np.zeros_like(level)
+        errors = np.zeros((len(y), grid_size, y.shape[1]))
+
+        for t in range(m, y.shape[1]):
+            active = (t < lengths)[:, None]
+            observed = y[:, t:t + 1]
+            season = seasons[:, :, t % m]
+            error = observed - (level + phi * trend + season)
+            new_level = alpha * (observed - season) + (1 - alpha) * (level + phi * trend)
+            new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+            new_season = gamma * (observed - new_level) + (1 - gamma) * season
+            sse = np.where(active, sse + error * error, sse)
+            errors[:, :, t] = np.where(active, error, 0)
+            level = np.where(active, new_level, level)
+            trend = np.where(active, new_trend, trend)
+            seasons[:, :, t % m] = np.where(active, new_season, season)
+
+        best = np.argmin(sse, axis=1)
+        covenants = np.arange(len(y))
+        return _smoothing_state(x, y, lengths, {
+            'level': _pick(level, best),
+            'trend': _pick(trend, best),
+            'phi': self.grid[best, 3],
+            'seasons': seasons[covenants, best],
+            'sse': _pick(sse, best),
+            'errors': errors[covenants, best],
+            'errors_from': np.full(len(y), m)
+        })
+
+    def forecast(self, state: Dict[str, np.ndarray], days_ahead: np.ndarray) -> np.ndarray:
+        steps = _steps(state, days_ahead)
+        # Days take the season of the nearest test (at least the next one);
+        # the k-th test after the last point (index n - 1) is point n - 1 + k
+        tests_ahead = np.maximum(np.rint(steps), 1).astype(np.int64)
+        season_index = (state['lengths'][:, None] - 1 + tests_ahead) % SEASON_LENGTH
+        seasons = np.take_along_axis(state['seasons'], season_index, axis=1)
+        return state['level'][:, None] + state['trend'][:, None] * _damped_sum(state['phi'], steps) + seasons
+
+
+def _smoothing_state(x: np.ndarray, y: np.ndarray, lengths: np.ndarray, state: Dict) -> Dict[str, np.ndarray]:
+    """
+    Add spacing, per-day slope and an R²-style fit quality to a smoothing
+    model's state. The state's one-step errors ('errors', zero before
+    'errors_from' and past each length) are the in-sample residuals.
+    """
+    spacing = np.maximum((_last(x, lengths) - x[:, 0]) / np.maximum(lengths - 1, 1), 1.0)
+
+    # One-step errors against the variance of the points they cover
+    mask = (np.arange(y.shape[1]) >= state['errors_from'][:, None]) & (np.arange(y.shape[1]) < lengths[:, None])
+    counts = np.maximum(mask.sum(axis=1), 1)
+    y_mean = np.where(mask, y, 0).sum(axis=1) / counts
+    syy = np.where(mask, (y - y_mean[:, None]) ** 2, 0).sum(axis=1)
+    r_squared = np.where(syy > 0, 1 - np.divide(state['sse'], syy, out=np.zeros_like(syy), where=syy > 0), 1.0)
+
+    return {
+        **state,
+        'lengths': lengths,
+        'spacing': spacing,
+        'slope_per_day': state['trend'] * state['phi'] / spacing,
+        'r_squared': np.clip(r_squared, 0.0, 1.0)
+    }
+
+
+# Candidate models in order of preference when cross-validation ties
+MODELS = {model.name: model for model in (LinearModel(), DampedTrendModel(), HoltWintersModel())}
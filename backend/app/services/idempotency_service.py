@@ -0,0 +1,85 @@
+from sqlalchemy import delete, update, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.idempotency_key import IdempotencyKey
+from app.config import settings
+from typing import Any, Optional
+from datetime import timedelta
+from uuid import UUID
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyKeyReused(ValueError):
+    """The key was already used for a different request"""
+
+class IdempotencyService:
+    """
+    Idempotency-Key support for write endpoints.
+
+    A request claims its key at the start of its transaction and stores
+    its response before committing, so the key becomes visible together
+    with the write. A concurrent retry blocks on the claim until the first
+    request finishes, then replays its response; if the first request
+    failed and rolled back, the retry claims the key and runs. Keys
+    expire after IDEMPOTENCY_KEY_TTL_HOURS and may then be reused.
+    """
+
+    def request_hash(self, request_line: str, payload: bytes) -> str:
+        """Fingerprint of a request, to tell a retry from a different request reusing its key"""
+        return hashlib.sha256(request_line.encode() + b"\n" + payload).hexdigest()
+
+    def claim(self, db: Session, user_id: UUID, key: str, request_hash: str) -> Optional[IdempotencyKey]:
+        """
+        Claim the key in the caller's transaction.
+
+        Returns:
+            None when the request should run (the key is new or expired),
+            else the stored key with the response to replay
+
+        Raises:
+            IdempotencyKeyReused: If the key was used for another request
+        """
+        ttl = timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        statement = insert(IdempotencyKey).values(user_id=user_id, key=key, request_hash=request_hash)
+        statement = statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+            set_={
+                "request_hash": statement.excluded.request_hash,
+                "status_code": None,
+                "response_body": None,
+                "created_at": func.now()
+            },
+            where=IdempotencyKey.created_at < func.now() - ttl
+        ).returning(IdempotencyKey.key)
+        if db.execute(statement).first() is not None:
+            return None
+
+        stored = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key
+        ).populate_existing().one()
+        if stored.request_hash != request_hash:
+            raise IdempotencyKeyReused(key)
+        return stored
+
+    def complete(self, db: Session, user_id: UUID, key: str, status_code: int, response_body: Any) -> None:
+        """Store the response of a claimed key in the caller's transaction; response_body must be JSON-ready"""
+        db.execute(
+            update(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key
+            ).values(status_code=status_code, response_body=response_body)
+        )
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete expired keys in the caller's transaction; returns how many"""
+        result = db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.created_at < func.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+            )
+        )
+        return result.rowcount
+
+idempotency_service = IdempotencyService()
@@ -0,0 +1,208 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.covenant import Covenant, CovenantMeasurement, CovenantTrendStats
+from app.models.portfolio_rollup import PortfolioRollup
+from app.services.alert_service import alert_service
+from app.services.amendment_service import amendment_service
+from app.services.analytics_service import analytics_service
+from app.services.model_choice_service import model_choice_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+from app.services.trend_stats_service import trend_stats_service
+from app.utils.helpers import measurement_statuses
+from typing import Any, Dict, List
+from decimal import Decimal
+from uuid import UUID
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MeasurementService:
+    """
+    Records covenant measurements in bulk with everything add_measurement
+    does per row: status, trend stats, status snapshots, breach and
+    prediction alerts and the portfolio rollup.
+    """
+
+    def record_many(
+        self,
+        db: Session,
+        user_id: UUID,
+        covenants: Dict[UUID, Covenant],
+        measurements: List[Dict]
+    ) -> Dict[str, Any]:
+        """
+        Upsert measurements with a constant number of statements, in the
+        caller's transaction. The caller verifies ownership, then bumps the
+        data version, commits and invalidates MEASUREMENTS and ALERTS.
+
+        A row for a covenant and date that is already measured replaces
+        that measurement, or is left alone when the value and notes are
+        unchanged (a resent row).
+
+        Args:
+            covenants: The user's covenants by id, covering every row
+            measurements: Dicts with covenant_id, measurement_date,
+                actual_value and optionally notes; at most one per
+                covenant and date
+
+        Returns:
+            {"measurements": created, "updated": n, "unchanged": n,
+             "breach_alerts": n, "prediction_alerts": n,
+             "rows": every row in input order, with id, status,
+             distance_to_breach and result (created, updated, unchanged)}
+        """
+        if not measurements:
+            return {"measurements": 0, "updated": 0, "unchanged": 0,
+                    "breach_alerts": 0, "prediction_alerts": 0, "rows": []}
+
+        rows_covenants = [covenants[row['covenant_id']] for row in measurements]
+
+        # Lock the loans before writing any row, as add_measurement locks its
+        # loan; the rollup is locked last, as every other writer does
+        portfolio_rollup_service.lock_loans(db, {covenant.loan_agreement_id for covenant in rows_covenants})
+
+        # Test each row against the terms in force on its date
+        terms = amendment_service.terms_at(db, [(row['covenant_id'], row['measurement_date']) for row in measurements])
+        actual_values = np.array([float(row['actual_value']) for row in measurements])
+        thresholds = np.array([
+            float(threshold_value) if threshold_value else np.nan
+            for threshold_value, _ in terms
+        ])
+        statuses, distances = measurement_statuses(
+            actual_values, thresholds, [threshold_operator for _, threshold_operator in terms]
+        )
+
+        existing = {
+            (row.covenant_id, row.measurement_date): row
+            for row in db.query(
+                CovenantMeasurement.id,
+                CovenantMeasurement.covenant_id,
+                CovenantMeasurement.measurement_date,
+                CovenantMeasurement.actual_value,
+                CovenantMeasurement.status,
+                CovenantMeasurement.notes
+            ).filter(
+                CovenantMeasurement.covenant_id.in_({row['covenant_id'] for row in measurements}),
+                CovenantMeasurement.measurement_date.in_({row['measurement_date'] for row in measurements})
+            )
+        }
+
+        # Covenants without a threshold get no distance
+        threshold_set = ~np.isnan(distances)
+        rows = []
+        for i, (row, covenant) in enumerate(zip(measurements, rows_covenants)):
+            previous = existing.get((covenant.id, row['measurement_date']))
+            if previous is None:
+                result = 'created'
+            elif (previous.actual_value == round(Decimal(str(row['actual_value'])), 4)
+                  and previous.notes == row.get('notes')):
+                result = 'unchanged'
+            else:
+                result = 'updated'
+            rows.append({
+                "id": previous.id if previous is not None else None,
+                "covenant_id": covenant.id,
+                "measurement_date": row['measurement_date'],
+                "actual_value": row['actual_value'],
+                "threshold_value": float(thresholds[i]) if threshold_set[i] else None,
+                "status": previous.status if result == 'unchanged' else statuses[i],
+                "distance_to_breach": float(distances[i]) if threshold_set[i] else None,
+                "notes": row.get('notes'),
+                "result": result,
+                "previous_status": previous.status if previous is not None else None
+            })
+
+        written = [row for row in rows if row['result'] != 'unchanged']
+        counts = {"inserted": 0, "updated": 0}
+        breach_alerts = []
+        if written:
+            counts, breach_alerts = self._write(db, covenants, written)
+            # Lock the rollup row so concurrent deltas apply on top of the rebuild
+            db.query(PortfolioRollup).filter(PortfolioRollup.user_id == user_id).with_for_update().first()
+            portfolio_rollup_service.rebuild(db, user_id)
+
+        return {
+            "measurements": sum(1 for row in rows if row['result'] == 'created'),
+            "updated": sum(1 for row in rows if row['result'] == 'updated'),
+            "unchanged": len(rows) - len(written),
+            "breach_alerts": len(breach_alerts),
+            "prediction_alerts": counts['inserted'] + counts['updated'],
+            "rows": rows
+        }
+
+    def _write(self, db: Session, covenants: Dict[UUID, Covenant], rows: List[Dict]):
+        """Upsert new and changed rows and refresh everything derived from them"""
+        columns = ('covenant_id', 'measurement_date', 'actual_value', 'threshold_value',
+                   'status', 'distance_to_breach', 'notes')
+        statement = insert(CovenantMeasurement)
+        statement = statement.on_conflict_do_update(
+            constraint='uq_covenant_measurements_covenant_date',
+            set_={key: getattr(statement.excluded, key) for key in columns[2:]}
+        ).returning(CovenantMeasurement.id, CovenantMeasurement.covenant_id, CovenantMeasurement.measurement_date)
+        ids = {
+            (covenant_id, measurement_date): measurement_id
+            for measurement_id, covenant_id, measurement_date in db.execute(
+                statement, [{key: row[key] for key in columns} for row in rows]
+            )
+        }
+        for row in rows:
+            row['id'] = ids[(row['covenant_id'], row['measurement_date'])]
+
+        analytics_service.record_status_snapshots(db, [
+            {
+                "covenant_id": row['covenant_id'],
+                "as_of_date": row['measurement_date'],
+                "status": row['status'],
+                "distance_to_breach": row['distance_to_breach']
+            }
+            for row in rows
+        ])
+
+        covenant_ids = {row['covenant_id'] for row in rows}
+        trend_stats_service.recompute_many(db, covenant_ids)
+
+        breach_alerts = [
+            {
+                "covenant_id": row['covenant_id'],
+                "loan_agreement_id": covenants[row['covenant_id']].loan_agreement_id,
+                **alert_service.breach_alert_fields(
+                    covenants[row['covenant_id']].covenant_name,
+                    float(row['actual_value']),
+                    row['threshold_value']
+                )
+            }
+            # Alert on entering breach, not again for a corrected breaching value
+            for row in rows if row['status'] == 'breach' and row['previous_status'] != 'breach'
+        ]
+        alert_service.insert_breach_alerts(db, breach_alerts)
+
+        # Forecast with each covenant's chosen model, all covenants in one pass
+        trend_stats = db.query(CovenantTrendStats).filter(
+            CovenantTrendStats.covenant_id.in_(covenant_ids)
+        ).populate_existing()
+        predictions = model_choice_service.forecast(db, {
+            stats.covenant_id: {
+                "stats": stats,
+                "threshold_value": float(covenants[stats.covenant_id].threshold_value),
+                "threshold_operator": covenants[stats.covenant_id].threshold_operator
+            }
+            for stats in trend_stats if covenants[stats.covenant_id].threshold_value
+        })
+        prediction_alerts = [
+            {
+                "covenant_id": covenant_id,
+                "loan_agreement_id": covenants[covenant_id].loan_agreement_id,
+                **alert_service.prediction_alert_fields(covenants[covenant_id].covenant_name, prediction)
+            }
+            for covenant_id, prediction in predictions.items() if prediction
+        ]
+        counts = alert_service.upsert_prediction_alerts(db, prediction_alerts)
+        alert_service.resolve_prediction_alerts(
+            db, covenant_ids - {alert['covenant_id'] for alert in prediction_alerts}
+        )
+
+        db.flush()
+        return counts, breach_alerts
+
+measurement_service = MeasurementService()
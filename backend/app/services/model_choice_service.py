@@ -0,0 +1,111 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.covenant import CovenantMeasurement, CovenantModelChoice
+from app.services.prediction_service import prediction_service
+from typing import Dict, Optional
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ModelChoiceService:
+    """
+    Caches the forecast model chosen per covenant, so cross-validation
+    only reruns for covenants whose measurement count changed.
+    """
+
+    def forecast(self, db: Session, stats_by_covenant: Dict[UUID, Dict]) -> Dict[UUID, Optional[Dict]]:
+        """
+        Predict breaches on a write path with the model the re-forecast job
+        chose, so daytime writes and the nightly run agree on a covenant's
+        prediction alert.
+
+        Covenants without a choice, or whose linear choice still matches
+        their measurement count, are predicted from their running sums.
+        The others have their series loaded and go through
+        PredictionService.forecast_many, which reselects stale choices;
+        those are saved in the caller's transaction.
+
+        Args:
+            stats_by_covenant: As for PredictionService.predict_many_from_stats
+
+        Returns:
+            {covenant_id: prediction or None}
+        """
+        if not stats_by_covenant:
+            return {}
+
+        choices = {
+            choice.covenant_id: choice
+            for choice in db.query(CovenantModelChoice).filter(
+                CovenantModelChoice.covenant_id.in_(list(stats_by_covenant))
+            )
+        }
+        chosen = {
+            covenant_id for covenant_id, choice in choices.items()
+            if stats_by_covenant[covenant_id]['stats'] is not None
+            and (choice.model_name != 'linear' or choice.n_measurements != stats_by_covenant[covenant_id]['stats'].n)
+        }
+
+        results = prediction_service.predict_many_from_stats({
+            covenant_id: item for covenant_id, item in stats_by_covenant.items() if covenant_id not in chosen
+        })
+        if not chosen:
+            return results
+
+        series = {
+            covenant_id: {
+                "historical_values": [],
+                "threshold_value": stats_by_covenant[covenant_id]['threshold_value'],
+                "threshold_operator": stats_by_covenant[covenant_id]['threshold_operator'],
+                "model": choices[covenant_id].model_name,
+                "model_n_measurements": choices[covenant_id].n_measurements
+            }
+            for covenant_id in chosen
+        }
+        measurements = db.query(
+            CovenantMeasurement.covenant_id,
+            CovenantMeasurement.measurement_date,
+            CovenantMeasurement.actual_value
+        ).filter(CovenantMeasurement.covenant_id.in_(chosen))
+        for covenant_id, measurement_date, actual_value in measurements:
+            series[covenant_id]["historical_values"].append({"date": measurement_date, "value": float(actual_value)})
+
+        predictions, reselected = prediction_service.forecast_many(series)
+        self.save_many(db, reselected)
+        results.update(predictions)
+        return results
+
+    def save_many(self, db: Session, choices: Dict) -> None:
+        """
+        Store PredictionService.forecast_many choices in the caller's
+        transaction.
+
+        Args:
+            choices: {covenant_id: {"model", "n_measurements", "cv_error"}}
+        """
+        if not choices:
+            return
+
+        statement = insert(CovenantModelChoice).values([
+            {
+                "covenant_id": covenant_id,
+                "model_name": choice["model"],
+                "n_measurements": choice["n_measurements"],
+                "cv_error": choice["cv_error"]
+            }
+            for covenant_id, choice in choices.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[CovenantModelChoice.covenant_id],
+            set_={
+                "model_name": statement.excluded.model_name,
+                "n_measurements": statement.excluded.n_measurements,
+                "cv_error": statement.excluded.cv_error,
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement)
+
+model_choice_service = ModelChoiceService()
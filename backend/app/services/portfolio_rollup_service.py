@@ -0,0 +1,122 @@
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.loan import LoanAgreement
+from app.models.alert import Alert
+from app.models.portfolio_rollup import PortfolioRollup
+from app.services.analytics_service import analytics_service
+from typing import Dict, Iterable, Optional
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+# PortfolioRollup columns, in PortfolioSummary order
+COUNTERS = (
+    "total_loans", "active_loans", "total_covenants", "compliant_covenants",
+    "warning_covenants", "breach_covenants", "unread_alerts", "critical_alerts",
+    "total_exposure"
+)
+
+class PortfolioRollupService:
+    """
+    Maintains portfolio_rollups, the primary-key source of the dashboard
+    summary.
+
+    Writers capture the counters of what they are about to change (one
+    loan, or one alert) before and after the change and add the difference
+    to the user's rollup in the same transaction.
+    """
+
+    def loan_counters(self, db: Session, user_id: UUID, loan_id: UUID, lock: bool = False) -> Dict:
+        """
+        Counters contributed by a single loan (zero once it is deleted).
+
+        Call with ``lock=True`` before changing the loan, its covenants,
+        measurements or alerts: the loan row is locked FOR UPDATE so
+        concurrent writers to the same loan cannot compute overlapping
+        deltas. Call again after the change, once it has been flushed.
+        """
+        if lock:
+            db.query(LoanAgreement.id).filter(LoanAgreement.id == loan_id).with_for_update().first()
+        return analytics_service.get_portfolio_summary(db, user_id, loan_id=loan_id)
+
+    def lock_loans(self, db: Session, loan_ids: Iterable[UUID]) -> None:
+        """
+        Lock several loan rows FOR UPDATE in id order, so writers touching
+        overlapping sets of loans queue instead of deadlocking.
+        """
+        db.query(LoanAgreement.id).filter(
+            LoanAgreement.id.in_(set(loan_ids))
+        ).order_by(LoanAgreement.id).with_for_update().all()
+
+    def alert_counters(self, alert: Optional[Alert]) -> Dict:
+        """Counters contributed by a single alert (pass None for a deleted alert)"""
+        if alert is None or alert.is_resolved:
+            return {}
+        return {
+            "unread_alerts": int(not alert.is_read),
+            "critical_alerts": int(alert.severity == 'critical')
+        }
+
+    def apply_change(self, db: Session, user_id: UUID, before: Dict, after: Dict) -> None:
+        """
+        Add ``after - before`` to the user's rollup in the caller's
+        transaction. A user without a rollup row gets one rebuilt from
+        scratch instead, which already reflects the change.
+        """
+        delta = {key: after.get(key, 0) - before.get(key, 0) for key in COUNTERS}
+        delta = {key: value for key, value in delta.items() if value}
+        if not delta:
+            return
+
+        result = db.execute(
+            update(PortfolioRollup).where(
+                PortfolioRollup.user_id == user_id
+            ).values(
+                updated_at=func.now(),
+                **{key: getattr(PortfolioRollup, key) + value for key, value in delta.items()}
+            )
+        )
+        if result.rowcount == 0:
+            db.flush()
+            self.rebuild(db, user_id)
+
+    def rebuild(self, db: Session, user_id: UUID) -> Dict:
+        """
+        Recompute the user's rollup from the source tables and store it,
+        in the caller's transaction.
+
+        Returns:
+            The recomputed counters
+        """
+        counters = analytics_service.get_portfolio_summary(db, user_id)
+
+        statement = insert(PortfolioRollup).values(user_id=user_id, **counters)
+        statement = statement.on_conflict_do_update(
+            index_elements=[PortfolioRollup.user_id],
+            set_={
+                **{key: getattr(statement.excluded, key) for key in COUNTERS},
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement)
+        return counters
+
+    def get_summary(self, db: Session, user_id: UUID) -> Dict:
+        """
+        Current dashboard counters: one primary-key read, or a rebuild
+        (committed) the first time a user is seen.
+
+        Returns:
+            Dict matching the PortfolioSummary schema fields
+        """
+        rollup = db.get(PortfolioRollup, user_id)
+        if rollup is None:
+            counters = self.rebuild(db, user_id)
+            db.commit()
+            return counters
+
+        return {key: getattr(rollup, key) for key in COUNTERS}
+
+portfolio_rollup_service = PortfolioRollupService()
@@ -1,15 +1,25 @@
-from sklearn.linear_model import LinearRegression
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+import math
 import logging
 
+from app.services.forecast_models import MODELS, SEASON_LENGTH
+
 logger = logging.getLogger(__name__)
 
+# Threshold operators in the order used for vectorized checks
+OPERATORS = ['less_than', 'greater_than', 'less_or_equal', 'greater_or_equal', 'equal']
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
+
+# A later model in MODELS must cut the held-out error by this much to be picked
+CV_MARGIN = 0.1
+
 class PredictionService:
     """
     ML prediction engine for covenant breach forecasting.
-    Uses linear regression with R² confidence scoring.
+    Uses linear regression with R² confidence scoring, fitted with NumPy
+    only so importing the service stays cheap.
     """
     
     def predict_breach_date(
@@ -56,49 +66,32 @@ class PredictionService:
             for item in sorted_data:
                 date = datetime.fromisoformat(item['date'])
                 days_diff = (date - first_date).days
-                X.append([days_diff])
+                X.append(days_diff)
                 y.append(item['value'])
             
-            # Train linear regression
-            model = LinearRegression()
-            model.fit(X, y)
-            
-            # Calculate R² score (confidence metric)
-            r_squared = model.score(X, y)
-            
-            # Get slope for trajectory analysis
-            slope = model.coef_[0]
+            # Fit the trend line; R² is the confidence metric
+            slope, intercept, r_squared = self._fit_line(np.array(X, dtype=float), np.array(y, dtype=float))
             
             # Determine trajectory
-            if abs(slope) < 0.01:  # Very small slope
-                trajectory = "stable"
-            elif threshold_operator in ['less_than', 'less_or_equal']:
-                trajectory = "deteriorating" if slope > 0 else "improving"
-            else:  # greater_than or greater_or_equal
-                trajectory = "deteriorating" if slope < 0 else "improving"
+            trajectory = self._trajectory(slope, threshold_operator)
             
             # Predict breach date (check next 365 days)
             current_date = datetime.fromisoformat(sorted_data[-1]['date'])
-            last_days = X[-1][0]
+            last_days = X[-1]
             
-            for future_days in range(1, 366):
-                predicted_value = model.predict([[last_days + future_days]])[0]
-                
-                breach_occurred = self._check_breach(
-                    predicted_value, 
-                    threshold_value, 
-                    threshold_operator
-                )
-                
-                if breach_occurred:
-                    breach_date = current_date + timedelta(days=future_days)
-                    return {
-                        "predicted_breach_date": breach_date.date().isoformat(),
-                        "days_until_breach": future_days,
-                        "confidence": round(min(r_squared, 0.99), 2),  # Cap at 99%
-                        "current_trajectory": trajectory,
-                        "predicted_value_at_breach": round(predicted_value, 4)
-                    }
+            breach = self._solve_breach_day(
+                slope, intercept, last_days, threshold_value, threshold_operator
+            )
+            if breach:
+                future_days, predicted_value = breach
+                breach_date = current_date + timedelta(days=future_days)
+                return {
+                    "predicted_breach_date": breach_date.date().isoformat(),
+                    "days_until_breach": future_days,
+                    "confidence": round(min(r_squared, 0.99), 2),  # Cap at 99%
+                    "current_trajectory": trajectory,
+                    "predicted_value_at_breach": round(predicted_value, 4)
+                }
             
             # No breach predicted in next year
             logger.info("No breach predicted in next 365 days")
@@ -108,6 +101,812 @@ class PredictionService:
             logger.error(f"Error in prediction calculation: {e}")
             return None
     
+    def predict_from_stats(
+        self,
+        stats,
+        threshold_value: Optional[float],
+        threshold_operator: Optional[str]
+    ) -> Optional[Dict]:
+        """
+        Predict a breach from running regression sums instead of the raw
+        series, in constant time however long the history is.
+        
+        Args:
+            stats: CovenantTrendStats (or anything with n, sum_x, sum_y,
+                sum_xy, sum_xx, sum_yy, anchor_date and last_date, x being
+                days since anchor_date)
+            threshold_value: Covenant threshold
+            threshold_operator: Threshold operator
+        
+        Returns:
+            Same as predict_breach_date; equal to it up to floating point
+            rounding of the fit
+        """
+        if stats is None or stats.n < 3:
+            logger.info("Insufficient data for prediction (need at least 3 measurements)")
+            return None
+        
+        if threshold_value is None or threshold_operator is None:
+            logger.info("Missing threshold information, cannot predict breach")
+            return None
+        
+        n = stats.n
+        sxx = stats.sum_xx - stats.sum_x * stats.sum_x / n
+        sxy = stats.sum_xy - stats.sum_x * stats.sum_y / n
+        syy = stats.sum_yy - stats.sum_y * stats.sum_y / n
+        
+        slope = sxy / sxx if sxx > 0 else 0.0
+        intercept = (stats.sum_y - slope * stats.sum_x) / n
+        
+        # Constant values fit perfectly, as LinearRegression.score reports;
+        # the relative cut-off absorbs cancellation in the running sums
+        if syy <= 1e-12 * abs(stats.sum_yy):
+            r_squared = 1.0
+        else:
+            r_squared = min(max(sxy * slope / syy, 0.0), 1.0)
+        
+        last_days = (stats.last_date - stats.anchor_date).days
+        breach = self._solve_breach_day(slope, intercept, last_days, threshold_value, threshold_operator)
+        if not breach:
+            logger.info("No breach predicted in next 365 days")
+            return None
+        
+        future_days, predicted_value = breach
+        return {
+            "predicted_breach_date": (stats.last_date + timedelta(days=future_days)).isoformat(),
+            "days_until_breach": future_days,
+            "confidence": round(min(r_squared, 0.99), 2),  # Cap at 99%
+            "current_trajectory": self._trajectory(slope, threshold_operator),
+            "predicted_value_at_breach": round(predicted_value, 4)
+        }
+    
+    def predict_many_from_stats(self, stats_by_covenant: Dict[Any, Dict], horizon: int = 365) -> Dict[Any, Optional[Dict]]:
+        """
+        predict_from_stats for many covenants: the fits come from the
+        running sums as arrays and every breach day from one
+        _solve_breach_days pass.
+        
+        Args:
+            stats_by_covenant: {key: {
+                "stats": CovenantTrendStats,
+                "threshold_value": 4.0,
+                "threshold_operator": "less_than"
+            }}
+            horizon: Days after each covenant's last measurement to scan
+        
+        Returns:
+            {key: dict shaped like predict_from_stats's result, or None}
+        """
+        results = {key: None for key in stats_by_covenant}
+        keys, last_dates, rows = [], [], []
+        for key, item in stats_by_covenant.items():
+            stats = item['stats']
+            threshold_value = item.get('threshold_value')
+            threshold_operator = item.get('threshold_operator')
+            if stats is None or stats.n < 3 or threshold_value is None or threshold_operator not in OPERATOR_CODES:
+                continue
+        
+            keys.append(key)
+            last_dates.append(stats.last_date)
+            rows.append((
+                stats.n, stats.sum_x, stats.sum_y, stats.sum_xy, stats.sum_xx, stats.sum_yy,
+                (stats.last_date - stats.anchor_date).days, float(threshold_value), OPERATOR_CODES[threshold_operator]
+            ))
+        
+        if not keys:
+            return results
+        
+        n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_days, thresholds, operators = np.array(rows, dtype=float).T
+        operators = operators.astype(int)
+        sxx = sum_xx - sum_x * sum_x / n
+        sxy = sum_xy - sum_x * sum_y / n
+        syy = sum_yy - sum_y * sum_y / n
+        
+        slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+        intercept = (sum_y - slope * sum_x) / n
+        
+        # As predict_from_stats: constant values fit perfectly
+        r_squared = np.where(
+            syy <= 1e-12 * np.abs(sum_yy),
+            1.0,
+            np.clip(np.divide(sxy * slope, syy, out=np.zeros_like(syy), where=syy > 0), 0.0, 1.0)
+        )
+        
+        days, predicted_values = self._solve_breach_days(slope, intercept, last_days, thresholds, operators, horizon)
+        
+        for i in np.flatnonzero(days):
+            threshold_operator = OPERATORS[operators[i]]
+            results[keys[i]] = {
+                "predicted_breach_date": (last_dates[i] + timedelta(days=int(days[i]))).isoformat(),
+                "days_until_breach": int(days[i]),
+                "confidence": round(min(float(r_squared[i]), 0.99), 2),  # Cap at 99%
+                "current_trajectory": self._trajectory(slope[i], threshold_operator),
+                "predicted_value_at_breach": round(float(predicted_values[i]), 4)
+            }
+        
+        return results
+    
+    def predict_many(self, series_by_covenant: Dict[Any, Dict], horizon: int = 365) -> Dict[Any, Optional[Dict]]:
+        """
+        Predict breach dates for many covenants in one vectorized pass.
+        
+        All series are concatenated into flat arrays with a group index, the
+        per-covenant least-squares fits, R² and breach days are computed with
+        np.bincount / array operations, and no model object is built per
+        covenant. Results agree with predict_breach_date up to floating
+        point rounding of the fit.
+        
+        Args:
+            series_by_covenant: {key: {
+                "historical_values": [{"date": "2024-01-01", "value": 3.5}, ...],
+                "threshold_value": 4.0,
+                "threshold_operator": "less_than"
+            }}
+            horizon: Days after each covenant's last measurement to scan
+        
+        Returns:
+            {key: dict shaped like predict_breach_date's result, or None}
+        """
+        results = {key: None for key in series_by_covenant}
+        fit = self._fit_many(series_by_covenant)
+        if fit is None:
+            return results
+        
+        days, predicted_values = self._solve_breach_days(
+            fit['slope'], fit['intercept'], fit['last_days'], fit['thresholds'], fit['operators'], horizon
+        )
+        breach_dates = (fit['last_dates'] + days).astype('datetime64[D]')
+        
+        for i in np.flatnonzero(days):
+            threshold_operator = OPERATORS[fit['operators'][i]]
+            results[fit['keys'][i]] = {
+                "predicted_breach_date": str(breach_dates[i]),
+                "days_until_breach": int(days[i]),
+                "confidence": round(min(float(fit['r_squared'][i]), 0.99), 2),  # Cap at 99%
+                "current_trajectory": self._trajectory(fit['slope'][i], threshold_operator),
+                "predicted_value_at_breach": round(float(predicted_values[i]), 4)
+            }
+        
+        return results
+    
+    def simulate_many(
+        self,
+        series_by_covenant: Dict[Any, Dict],
+        horizons: Tuple[int, ...] = (30, 90, 365),
+        simulations: int = 1000,
+        interval: float = 0.9,
+        seed: int = 0
+    ) -> Dict[Any, Optional[Dict]]:
+        """
+        Probabilistic breach forecasts for many covenants by residual
+        bootstrap, vectorized across covenants and simulations.
+        
+        Each simulation refits the trend to the fitted values plus resampled
+        residuals, then adds resampled residual noise: once as a level shift
+        when solving for the breach day, and afresh for each test date's
+        value. Covenants forecast with a smoothing model are refit with that
+        model, around its one-step-ahead fitted values (see
+        _simulate_models). Covenants are processed in chunks to bound memory.
+        
+        Args:
+            series_by_covenant: As for predict_many, plus optional
+                "test_dates": [date, ...] to give prediction intervals for
+                and "model", the forecast_models.MODELS name the covenant is
+                forecast with (default: linear)
+            horizons: Days after the last measurement to report breach
+                probabilities for
+            simulations: Bootstrap paths per covenant
+            interval: Central prediction interval width (0.9 = 5th-95th percentile)
+            seed: Random seed, so unchanged data gives unchanged forecasts
+        
+        Returns:
+            {key: {
+                "breach_probability": {"30_days": 0.12, ...},
+                "prediction_intervals": [{"date", "lower", "median", "upper", "breach_probability"}, ...],
+                "interval": 0.9,
+                "simulations": 1000
+            }, or None without enough data}
+        """
+        results = {key: None for key in series_by_covenant}
+        smoothed = {
+            key: series for key, series in series_by_covenant.items()
+            if series.get('model', 'linear') != 'linear' and series.get('model') in MODELS
+            and len(series['historical_values']) >= MODELS[series['model']].min_points
+        }
+        results.update(self._simulate_models(smoothed, horizons, simulations, interval, seed))
+        
+        fit = self._fit_many({key: series for key, series in series_by_covenant.items() if key not in smoothed})
+        if fit is None:
+            return results
+        
+        rng = np.random.default_rng(seed)
+        horizon = max(horizons)
+        counts, starts = fit['counts'], fit['starts']
+        quantiles = [(1 - interval) / 2, 0.5, (1 + interval) / 2]
+        
+        # Test dates as days since each covenant's first measurement
+        test_group, test_days, test_dates = [], [], []
+        for i, key in enumerate(fit['keys']):
+            for test_date in series_by_covenant[key].get('test_dates') or []:
+                test_group.append(i)
+                test_dates.append(test_date)
+        test_group = np.array(test_group, dtype=int)
+        if len(test_dates):
+            test_days = np.array(test_dates, dtype='datetime64[D]').astype(np.int64) - fit['first_dates'][test_group]
+        
+        # Chunks of whole covenants with at most ~2M bootstrap draws each
+        max_points = max(1, 2_000_000 // simulations)
+        chunk_start = 0
+        while chunk_start < len(counts):
+            chunk_end = chunk_start + 1
+            while chunk_end < len(counts) and starts[chunk_end] + counts[chunk_end] - starts[chunk_start] <= max_points:
+                chunk_end += 1
+            groups = np.arange(chunk_start, chunk_end)
+            first_point, last_point = starts[chunk_start], starts[chunk_end - 1] + counts[chunk_end - 1]
+            point_group = fit['group'][first_point:last_point]
+            x_centered = fit['x_centered'][first_point:last_point]
+            
+            def draw(group_index: np.ndarray) -> np.ndarray:
+                """Resampled residuals of the given covenants, one row per simulation"""
+                picks = starts[group_index] + (rng.random((simulations, len(group_index))) * counts[group_index]).astype(int)
+                return fit['residuals'][picks]
+            
+            # Refit on bootstrapped data: y* = fitted + e*
+            boot = draw(point_group)
+            local_starts = starts[groups] - first_point
+            sum_e = np.add.reduceat(boot, local_starts, axis=1)
+            sum_xe = np.add.reduceat(boot * x_centered, local_starts, axis=1)
+            sxx = fit['sxx'][groups]
+            slope = fit['slope'][groups] + np.divide(sum_xe, sxx, out=np.zeros_like(sum_xe), where=sxx > 0)
+            mean = fit['y_mean'][groups] + sum_e / counts[groups]
+            intercept = mean - slope * fit['x_mean'][groups]
+            
+            # Breach day of each simulated path within the horizon
+            shifted = intercept + draw(groups)
+            days, _ = self._solve_breach_days(
+                slope.ravel(),
+                shifted.ravel(),
+                np.tile(fit['last_days'][groups], simulations),
+                np.tile(fit['thresholds'][groups], simulations),
+                np.tile(fit['operators'][groups], simulations),
+                horizon
+            )
+            days = days.reshape(simulations, len(groups))
+            breached = days > 0
+            
+            for column, i in enumerate(groups):
+                results[fit['keys'][i]] = {
+                    "breach_probability": {
+                        f"{h}_days": round(float(np.mean(breached[:, column] & (days[:, column] <= h))), 4)
+                        for h in horizons
+                    },
+                    "prediction_intervals": [],
+                    "interval": interval,
+                    "simulations": simulations
+                }
+            
+            # Value distribution on each test date
+            in_chunk = np.flatnonzero((test_group >= chunk_start) & (test_group < chunk_end))
+            if len(in_chunk):
+                owners = test_group[in_chunk]
+                columns = owners - chunk_start
+                values = intercept[:, columns] + slope[:, columns] * test_days[in_chunk] + draw(owners)
+                lower, median, upper = np.quantile(values, quantiles, axis=0)
+                probability = self._check_breach_many(
+                    values, fit['thresholds'][owners], fit['operators'][owners]
+                ).mean(axis=0)
+                for j, owner in enumerate(owners):
+                    results[fit['keys'][owner]]["prediction_intervals"].append({
+                        "date": str(np.datetime64(test_dates[in_chunk[j]], 'D')),
+                        "lower": round(float(lower[j]), 4),
+                        "median": round(float(median[j]), 4),
+                        "upper": round(float(upper[j]), 4),
+                        "breach_probability": round(float(probability[j]), 4)
+                    })
+            
+            chunk_start = chunk_end
+        
+        return results
+    
+    def _simulate_models(
+        self,
+        series_by_covenant: Dict[Any, Dict],
+        horizons: Tuple[int, ...],
+        simulations: int,
+        interval: float,
+        seed: int
+    ) -> Dict[Any, Optional[Dict]]:
+        """
+        simulate_many for covenants on a smoothing model: each simulation
+        refits the model to its one-step-ahead fitted values plus resampled
+        one-step errors, then adds resampled error noise as simulate_many
+        does for the line. Points before the model's first forecast keep
+        their observed values.
+        """
+        results = {}
+        batch = self._pad_many(series_by_covenant)
+        if batch is None:
+            return results
+        
+        rng = np.random.default_rng(seed)
+        horizon = max(horizons)
+        quantiles = [(1 - interval) / 2, 0.5, (1 + interval) / 2]
+        keys, lengths = batch['keys'], batch['lengths']
+        names = np.array([series_by_covenant[key]['model'] for key in keys], dtype=object)
+        days_ahead = np.arange(1, horizon + 1)[None, :]
+        points = np.arange(batch['y'].shape[1])[None, :]
+        
+        # Chunks of covenants with at most ~2M simulated days each
+        chunk_size = max(1, 2_000_000 // (simulations * horizon))
+        for name, model in MODELS.items():
+            covenants = np.flatnonzero(names == name)
+            for chunk_start in range(0, len(covenants), chunk_size):
+                index = covenants[chunk_start:chunk_start + chunk_size]
+                state = model.fit(batch['x'][index], batch['y'][index], lengths[index])
+                errors_from = state['errors_from']
+                n_errors = lengths[index] - errors_from
+                
+                def draw(shape: Tuple[int, ...]) -> np.ndarray:
+                    """Resampled one-step errors, one row per simulation and covenant"""
+                    trailing = (1,) * len(shape)
+                    picks = errors_from.reshape((-1,) + trailing) + (
+                        rng.random((simulations, len(index)) + shape) * n_errors.reshape((-1,) + trailing)
+                    ).astype(int)
+                    return np.take_along_axis(
+                        np.broadcast_to(state['errors'], (simulations,) + state['errors'].shape),
+                        picks.reshape(simulations, len(index), -1), axis=2
+                    ).reshape(picks.shape)
+                
+                # Refit on bootstrapped data: y* = fitted + e*
+                has_error = (points >= errors_from[:, None]) & (points < lengths[index, None])
+                fitted = batch['y'][index] - state['errors']
+                boot_y = np.where(has_error, fitted + draw((batch['y'].shape[1],)), batch['y'][index])
+                boot = model.fit(
+                    np.tile(batch['x'][index], (simulations, 1)),
+                    boot_y.reshape(-1, batch['y'].shape[1]),
+                    np.tile(lengths[index], simulations)
+                )
+                
+                # First breach day of each simulated path within the horizon
+                values = model.forecast(boot, np.broadcast_to(days_ahead, (simulations * len(index), horizon)))
+                values = values + draw(()).reshape(-1, 1)
+                breached = self._check_breach_many(
+                    values,
+                    np.tile(batch['thresholds'][index], simulations)[:, None],
+                    np.tile(batch['operators'][index], simulations)[:, None]
+                )
+                days = np.where(breached.any(axis=1), np.argmax(breached, axis=1) + 1, 0)
+                days = days.reshape(simulations, len(index))
+                
+                for column, i in enumerate(index):
+                    series = series_by_covenant[keys[i]]
+                    test_dates = list(series.get('test_dates') or [])
+                    result = {
+                        "breach_probability": {
+                            f"{h}_days": round(float(np.mean((days[:, column] > 0) & (days[:, column] <= h))), 4)
+                            for h in horizons
+                        },
+                        "prediction_intervals": [],
+                        "interval": interval,
+                        "simulations": simulations
+                    }
+                    
+                    # Value distribution on each test date
+                    if test_dates:
+                        test_days = (np.array(test_dates, dtype='datetime64[D]') - batch['last_dates'][i]).astype(float)
+                        paths = np.arange(simulations) * len(index) + column
+                        path_state = {key: value[paths] for key, value in boot.items()}
+                        noise = draw((len(test_dates),))[:, column]
+                        test_values = model.forecast(
+                            path_state, np.broadcast_to(test_days, (simulations, len(test_dates)))
+                        ) + noise
+                        lower, median, upper = np.quantile(test_values, quantiles, axis=0)
+                        probability = self._check_breach_many(
+                            test_values, batch['thresholds'][i], batch['operators'][i]
+                        ).mean(axis=0)
+                        for j, test_date in enumerate(test_dates):
+                            result["prediction_intervals"].append({
+                                "date": str(np.datetime64(test_date, 'D')),
+                                "lower": round(float(lower[j]), 4),
+                                "median": round(float(median[j]), 4),
+                                "upper": round(float(upper[j]), 4),
+                                "breach_probability": round(float(probability[j]), 4)
+                            })
+                    results[keys[i]] = result
+        
+        return results
+    
+    def forecast_many(
+        self,
+        series_by_covenant: Dict[Any, Dict],
+        horizon: int = 365
+    ) -> Tuple[Dict[Any, Optional[Dict]], Dict[Any, Dict]]:
+        """
+        Predict breach dates like predict_many, with each covenant's model
+        (see forecast_models.MODELS) picked by holding out its latest
+        measurements and keeping the model that forecast them best.
+        Covenants that keep the linear trend get exactly predict_many's
+        result.
+        
+        Args:
+            series_by_covenant: As for predict_many; a series may also carry
+                a cached choice as "model" and "model_n_measurements", which
+                is reused while the measurement count is unchanged
+            horizon: Days after each covenant's last measurement to scan
+        
+        Returns:
+            (results, choices): results as predict_many's with a "model"
+            key added; choices {key: {"model", "n_measurements",
+            "cv_error"}} for the covenants whose model was (re)selected
+        """
+        results = {key: None for key in series_by_covenant}
+        batch = self._pad_many(series_by_covenant)
+        if batch is None:
+            return results, {}
+        keys, lengths = batch['keys'], batch['lengths']
+        
+        names = np.array([series_by_covenant[key].get('model') for key in keys], dtype=object)
+        cached = np.array([
+            name in MODELS and series_by_covenant[key].get('model_n_measurements') == n
+            for key, name, n in zip(keys, names, lengths)
+        ], dtype=bool)
+        choices = {}
+        selecting = np.flatnonzero(~cached)
+        if len(selecting):
+            selected, cv_errors = self._select_models(
+                batch['x'][selecting], batch['y'][selecting], lengths[selecting]
+            )
+            names[selecting] = selected
+            for i, name, cv_error in zip(selecting, selected, cv_errors):
+                choices[keys[i]] = {
+                    "model": name,
+                    "n_measurements": int(lengths[i]),
+                    "cv_error": None if np.isnan(cv_error) else float(cv_error)
+                }
+        
+        linear = [keys[i] for i in np.flatnonzero(names == 'linear')]
+        for key, result in self.predict_many({key: series_by_covenant[key] for key in linear}, horizon).items():
+            results[key] = result and {**result, "model": 'linear'}
+        
+        days_ahead = np.arange(1, horizon + 1)[None, :]
+        for name, model in MODELS.items():
+            index = np.flatnonzero(names == name)
+            if name == 'linear' or not len(index):
+                continue
+            
+            state = model.fit(batch['x'][index], batch['y'][index], lengths[index])
+            values = model.forecast(state, np.broadcast_to(days_ahead, (len(index), horizon)))
+            breached = self._check_breach_many(
+                values, batch['thresholds'][index, None], batch['operators'][index, None]
+            )
+            first = np.argmax(breached, axis=1)
+            breach_dates = (batch['last_dates'][index] + first + 1).astype('datetime64[D]')
+            
+            for row in np.flatnonzero(breached.any(axis=1)):
+                threshold_operator = OPERATORS[batch['operators'][index[row]]]
+                results[keys[index[row]]] = {
+                    "predicted_breach_date": str(breach_dates[row]),
+                    "days_until_breach": int(first[row] + 1),
+                    "confidence": round(min(float(state['r_squared'][row]), 0.99), 2),  # Cap at 99%
+                    "current_trajectory": self._trajectory(state['slope_per_day'][row], threshold_operator),
+                    "predicted_value_at_breach": round(float(values[row, first[row]]), 4),
+                    "model": name
+                }
+        
+        return results, choices
+    
+    def _select_models(self, x: np.ndarray, y: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cheap cross-validation: hold out each covenant's latest
+        min(n // 4, SEASON_LENGTH) measurements (at least one), fit every
+        model with enough remaining points, and keep the one with the
+        lowest mean absolute error on the held-out points. A later model in
+        MODELS has to beat the best earlier one by CV_MARGIN, so one noisy
+        fold does not trade the linear trend for a more flexible model.
+        
+        Returns:
+            (model name per covenant, its CV error or NaN when too short
+            to cross-validate)
+        """
+        covenants = np.arange(len(y))
+        holdout = np.clip(lengths // 4, 1, SEASON_LENGTH)
+        prefix = lengths - holdout
+        
+        steps = np.arange(SEASON_LENGTH)[None, :]
+        held_out = steps < holdout[:, None]
+        targets = np.minimum(prefix[:, None] + steps, y.shape[1] - 1)
+        days_ahead = x[covenants[:, None], targets] - x[covenants, prefix - 1][:, None]
+        actual = y[covenants[:, None], targets]
+        
+        names = np.full(len(y), 'linear', dtype=object)
+        best = np.full(len(y), np.nan)
+        for name, model in MODELS.items():
+            index = np.flatnonzero(prefix >= model.min_points)
+            if not len(index):
+                continue
+            state = model.fit(x[index], y[index], prefix[index])
+            errors = np.abs(model.forecast(state, days_ahead[index]) - actual[index])
+            mae = np.where(held_out[index], errors, 0).sum(axis=1) / holdout[index]
+            better = np.isnan(best[index]) | (mae < best[index] * (1 - CV_MARGIN))
+            names[index[better]] = name
+            best[index[better]] = mae[better]
+        
+        return names, best
+    
+    def _pad_many(self, series_by_covenant: Dict[Any, Dict]) -> Optional[Dict[str, Any]]:
+        """
+        Date-sorted series of every covenant with enough data as padded
+        [covenants, points] arrays (x in days since the first measurement),
+        with lengths, thresholds, operators and last measurement dates.
+        """
+        keys, lengths, thresholds, operators, rows = [], [], [], [], []
+        for key, series in series_by_covenant.items():
+            points = series['historical_values']
+            threshold_value = series.get('threshold_value')
+            threshold_operator = series.get('threshold_operator')
+            if len(points) < 3 or threshold_value is None or threshold_operator not in OPERATOR_CODES:
+                continue
+            
+            keys.append(key)
+            lengths.append(len(points))
+            thresholds.append(float(threshold_value))
+            operators.append(OPERATOR_CODES[threshold_operator])
+            rows.append(sorted((point['date'], point['value']) for point in points))
+        
+        if not keys:
+            return None
+        
+        lengths = np.array(lengths)
+        x = np.zeros((len(keys), lengths.max()))
+        y = np.zeros_like(x)
+        last_dates = np.empty(len(keys), dtype='datetime64[D]')
+        for i, points in enumerate(rows):
+            dates = np.array([point[0] for point in points], dtype='datetime64[D]')
+            x[i, :len(points)] = (dates - dates[0]).astype(float)
+            y[i, :len(points)] = [point[1] for point in points]
+            last_dates[i] = dates[-1]
+        
+        return {
+            "keys": keys,
+            "lengths": lengths,
+            "thresholds": np.array(thresholds),
+            "operators": np.array(operators),
+            "last_dates": last_dates,
+            "x": x,
+            "y": y
+        }
+    
+    def _fit_line(self, x: np.ndarray, y: np.ndarray) -> Tuple[float, float, float]:
+        """
+        Ordinary least squares of y on x.
+        
+        Returns:
+            (slope, intercept, r_squared), with R² as LinearRegression.score
+            reports it (1.0 for a perfect fit of constant data)
+        """
+        x_mean, y_mean = x.mean(), y.mean()
+        x_centered, y_centered = x - x_mean, y - y_mean
+        sxx = float(x_centered @ x_centered)
+        syy = float(y_centered @ y_centered)
+        slope = float(x_centered @ y_centered) / sxx if sxx > 0 else 0.0
+        intercept = float(y_mean - slope * x_mean)
+        
+        residuals = y - (x * slope + intercept)
+        ss_res = float(residuals @ residuals)
+        if syy > 0:
+            r_squared = 1 - ss_res / syy
+        else:
+            r_squared = 1.0 if ss_res == 0 else 0.0
+        return slope, intercept, r_squared
+    
+    def _fit_many(self, series_by_covenant: Dict[Any, Dict]) -> Optional[Dict[str, Any]]:
+        """
+        Grouped least-squares fit shared by predict_many and simulate_many.
+        
+        Returns:
+            Dict of aligned arrays (per covenant: keys, counts, starts,
+            thresholds, operators, slope, intercept, r_squared, ...; per
+            point: group, x_centered, residuals), or None when no covenant
+            has enough data
+        """
+        keys, counts, thresholds, operators, dates, values = [], [], [], [], [], []
+        for key, series in series_by_covenant.items():
+            points = series['historical_values']
+            threshold_value = series.get('threshold_value')
+            threshold_operator = series.get('threshold_operator')
+            if len(points) < 3 or threshold_value is None or threshold_operator not in OPERATOR_CODES:
+                continue
+            
+            keys.append(key)
+            counts.append(len(points))
+            thresholds.append(float(threshold_value))
+            operators.append(OPERATOR_CODES[threshold_operator])
+            dates.extend(point['date'] for point in points)
+            values.extend(point['value'] for point in points)
+        
+        if not keys:
+            return None
+        
+        counts = np.array(counts)
+        group = np.repeat(np.arange(len(keys)), counts)
+        day_numbers = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+        y = np.array(values, dtype=float)
+        
+        # Sort each covenant's points by date, keeping covenants contiguous
+        order = np.lexsort((day_numbers, group))
+        day_numbers, y = day_numbers[order], y[order]
+        ends = np.cumsum(counts) - 1
+        starts = ends - counts + 1
+        
+        # Days since each covenant's first measurement
+        x = day_numbers - day_numbers[starts][group]
+        
+        # Grouped least squares on centered data
+        x_mean = np.bincount(group, x) / counts
+        y_mean = np.bincount(group, y) / counts
+        x_centered = x - x_mean[group]
+        y_centered = y - y_mean[group]
+        sxx = np.bincount(group, x_centered * x_centered)
+        sxy = np.bincount(group, x_centered * y_centered)
+        syy = np.bincount(group, y_centered * y_centered)
+        slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+        intercept = y_mean - slope * x_mean
+        
+        # R² as LinearRegression.score computes it (1.0 for a perfect fit of constant data)
+        residuals = y - (x * slope[group] + intercept[group])
+        ss_res = np.bincount(group, residuals * residuals)
+        r_squared = np.where(
+            syy > 0,
+            1 - np.divide(ss_res, syy, out=np.zeros_like(ss_res), where=syy > 0),
+            np.where(ss_res == 0, 1.0, 0.0)
+        )
+        
+        return {
+            "keys": keys,
+            "counts": counts,
+            "starts": starts,
+            "thresholds": np.array(thresholds),
+            "operators": np.array(operators),
+            "first_dates": day_numbers[starts],
+            "last_dates": day_numbers[ends],
+            "last_days": x[ends],
+            "x_mean": x_mean,
+            "y_mean": y_mean,
+            "sxx": sxx,
+            "slope": slope,
+            "intercept": intercept,
+            "r_squared": r_squared,
+            "group": group,
+            "x_centered": x_centered,
+            "residuals": residuals
+        }
+    
+    def _solve_breach_days(
+        self,
+        slope: np.ndarray,
+        intercept: np.ndarray,
+        last_days: np.ndarray,
+        thresholds: np.ndarray,
+        operators: np.ndarray,
+        horizon: int = 365
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized _solve_breach_day over aligned per-covenant arrays.
+        
+        Returns:
+            (breach day per covenant, 0 when none within the horizon;
+             predicted value on that day)
+        """
+        def predicted(index: np.ndarray, day) -> np.ndarray:
+            return (last_days[index] + day) * slope[index] + intercept[index]
+        
+        def breached(index: np.ndarray, day) -> np.ndarray:
+            return self._check_breach_many(predicted(index, day), thresholds[index], operators[index])
+        
+        everyone = np.arange(len(slope))
+        at_start = breached(everyone, 1)
+        searching = np.flatnonzero(~at_start & breached(everyone, horizon))
+        
+        # Analytic crossing estimate, as in _solve_breach_day
+        tolerance = thresholds * 0.05
+        boundary = np.where(
+            operators == OPERATOR_CODES['equal'],
+            thresholds + np.where(slope > 0, tolerance, -tolerance),
+            thresholds
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimate = (boundary - intercept) / slope - last_days
+        estimate = np.where(np.isfinite(estimate), np.ceil(estimate), horizon)
+        
+        days = np.where(at_start, 1, 0)
+        days[searching] = np.clip(estimate[searching], 2, horizon)
+        
+        # Absorb floating point error around the estimates
+        stepping = searching
+        while len(stepping):
+            stepping = stepping[(days[stepping] > 2) & breached(stepping, days[stepping] - 1)]
+            days[stepping] -= 1
+        stepping = searching
+        while len(stepping):
+            stepping = stepping[~breached(stepping, days[stepping])]
+            days[stepping] += 1
+        
+        return days, predicted(everyone, days)
+    
+    def _check_breach_many(self, values: np.ndarray, thresholds: np.ndarray, operators: np.ndarray) -> np.ndarray:
+        """Vectorized _check_breach; operators are OPERATOR_CODES values"""
+        return np.select(
+            [operators == OPERATOR_CODES[operator] for operator in OPERATORS],
+            [
+                values >= thresholds,
+                values <= thresholds,
+                values > thresholds,
+                values < thresholds,
+                np.abs(values - thresholds) > thresholds * 0.05  # 5% tolerance
+            ],
+            default=False
+        )
+    
+    def _trajectory(self, slope: float, threshold_operator: str) -> str:
+        """Whether the trend moves towards or away from breach"""
+        if abs(slope) < 0.01:  # Very small slope
+            return "stable"
+        elif threshold_operator in ['less_than', 'less_or_equal']:
+            return "deteriorating" if slope > 0 else "improving"
+        else:  # greater_than or greater_or_equal
+            return "deteriorating" if slope < 0 else "improving"
+    
+    def _solve_breach_day(
+        self,
+        slope: float,
+        intercept: float,
+        last_days: int,
+        threshold_value: float,
+        operator: str,
+        horizon: int = 365
+    ) -> Optional[Tuple[int, float]]:
+        """
+        First day in 1..horizon after the last measurement on which the
+        fitted line breaches, solved from slope/intercept instead of
+        predicting every day.
+        
+        The trend is monotonic, so once day 1 is not in breach the breach
+        condition can only switch on once (for 'equal', when the line leaves
+        the tolerance band). The crossing day is solved analytically and then
+        confirmed with _check_breach on the same float arithmetic as
+        LinearRegression.predict, so results match a day-by-day scan exactly.
+        
+        Returns:
+            (days after last measurement, predicted value) or None
+        """
+        def predicted(day: int) -> float:
+            return float((last_days + day) * slope + intercept)
+        
+        def breached(day: int) -> bool:
+            return self._check_breach(predicted(day), threshold_value, operator)
+        
+        if breached(1):
+            return 1, predicted(1)
+        if not breached(horizon):
+            return None
+        
+        # Day 1 is safe and the horizon is breached: find the crossing
+        boundary = threshold_value
+        if operator == 'equal':
+            tolerance = threshold_value * 0.05
+            boundary = threshold_value + tolerance if slope > 0 else threshold_value - tolerance
+        
+        estimate = (boundary - intercept) / slope - last_days
+        day = min(max(math.ceil(estimate), 2), horizon) if math.isfinite(estimate) else horizon
+        
+        # Absorb floating point error around the analytic estimate
+        while day > 2 and breached(day - 1):
+            day -= 1
+        while not breached(day):
+            day += 1
+        
+        return day, predicted(day)
+    
     def _check_breach(self, actual_value: float, threshold_value: float, operator: str) -> bool:
         """Check if value breaches threshold based on operator"""
         if operator == 'less_than':
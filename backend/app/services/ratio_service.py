@@ -0,0 +1,285 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.borrower_financials import BorrowerFinancial
+from app.models.covenant import Covenant
+from app.models.loan import LoanAgreement
+from app.services.forecast_models import MODELS
+from app.services.prediction_service import prediction_service, OPERATOR_CODES
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date
+from uuid import UUID
+import numpy as np
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Standard covenant ratios: numerator / denominator BorrowerFinancial
+# fields, and the covenant names they are tested under (first match wins)
+RATIOS = {
+    'debt_to_ebitda': {
+        "numerator": 'total_debt',
+        "denominator": 'ebitda',
+        "pattern": re.compile(r'debt\s*(/|to)\s*ebitda', re.IGNORECASE)
+    },
+    'interest_cover': {
+        "numerator": 'ebitda',
+        "denominator": 'interest_expense',
+        "pattern": re.compile(r'interest\s*cover', re.IGNORECASE)
+    },
+    'leverage': {
+        "numerator": 'total_debt',
+        "denominator": 'total_assets',
+        "pattern": re.compile(r'leverage|gearing|debt\s*(/|to)\s*(total\s*)?assets', re.IGNORECASE)
+    }
+}
+
+METRICS = ['revenue', 'ebitda', 'total_debt', 'total_assets', 'interest_expense', 'free_cash_flow']
+
+# Days after the latest reporting period listed in a ratio forecast
+FORECAST_POINTS = [90, 180, 270, 365]
+
+class RatioService:
+    """
+    Covenant ratios from BorrowerFinancial time series.
+
+    Financials of many loans are loaded as aligned [loans, periods] arrays
+    (NaN where a loan has no value), so ratios and forecasts are computed
+    for the whole portfolio with array operations.
+    """
+
+    def covenant_ratio(self, covenant_name: str) -> Optional[str]:
+        """The RATIOS key a covenant is tested on, or None"""
+        for name, ratio in RATIOS.items():
+            if ratio["pattern"].search(covenant_name or ''):
+                return name
+        return None
+
+    def load_financials(self, db: Session, loan_ids: List[UUID]) -> Optional[Dict[str, Any]]:
+        """
+        Financials of the given loans as padded arrays ordered by period.
+
+        Returns:
+            {"loan_ids", "lengths", "periods" (datetime64[D], NaT padded),
+             "x" (days since each loan's first period), and one float
+             array per METRICS field}, or None without financials
+        """
+        rows = db.execute(
+            select(
+                BorrowerFinancial.loan_agreement_id,
+                BorrowerFinancial.reporting_period,
+                *(getattr(BorrowerFinancial, metric) for metric in METRICS)
+            ).where(
+                BorrowerFinancial.loan_agreement_id.in_(loan_ids)
+            ).order_by(
+                BorrowerFinancial.loan_agreement_id, BorrowerFinancial.reporting_period
+            )
+        ).all()
+        if not rows:
+            return None
+
+        index = {}
+        row_loan = np.array([index.setdefault(row[0], len(index)) for row in rows])
+        lengths = np.bincount(row_loan)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        column = np.arange(len(rows)) - starts[row_loan]
+
+        periods = np.full((len(index), lengths.max()), np.datetime64('NaT'), dtype='datetime64[D]')
+        periods[row_loan, column] = np.array([row[1] for row in rows], dtype='datetime64[D]')
+        x = np.full(periods.shape, np.nan)
+        x[row_loan, column] = (periods - periods[:, :1])[row_loan, column].astype(float)
+        financials = {
+            "loan_ids": list(index),
+            "lengths": lengths,
+            "periods": periods,
+            "x": x
+        }
+        for i, metric in enumerate(METRICS):
+            values = np.full(periods.shape, np.nan)
+            values[row_loan, column] = np.array([np.nan if row[i + 2] is None else float(row[i + 2]) for row in rows])
+            financials[metric] = values
+        return financials
+
+    def compute_ratios(self, financials: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Every RATIOS ratio per loan and period; NaN where a component is missing or the denominator is not positive"""
+        return {
+            name: self._divide(financials[ratio["numerator"]], financials[ratio["denominator"]])
+            for name, ratio in RATIOS.items()
+        }
+
+    def not_meaningful(self, financials: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        Per ratio, loan and period: both components are reported but the
+        denominator (EBITDA, interest expense, total assets) is zero or
+        negative, so compute_ratios leaves the ratio NaN.
+        """
+        flags = {}
+        for name, ratio in RATIOS.items():
+            numerator, denominator = financials[ratio["numerator"]], financials[ratio["denominator"]]
+            flags[name] = np.isfinite(numerator) & np.isfinite(denominator) & (denominator <= 0)
+        return flags
+
+    def forecast_components(self, financials: Dict[str, Any], days_ahead: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Linear-trend forecast of every metric a ratio uses, per loan, on
+        the given days after the loan's latest period. Loans with fewer
+        than three values of a metric get NaN.
+
+        Returns:
+            {metric: [loans, len(days_ahead)] array}
+        """
+        model = MODELS['linear']
+        last_x = financials["x"][np.arange(len(financials["lengths"])), financials["lengths"] - 1]
+        forecasts = {}
+        for metric in {field for ratio in RATIOS.values() for field in (ratio["numerator"], ratio["denominator"])}:
+            values = financials[metric]
+            present = np.isfinite(values)
+            counts = present.sum(axis=1)
+
+            # Move each loan's present values to the front, keeping period order
+            order = np.argsort(~present, axis=1, kind='stable')
+            x = np.take_along_axis(financials["x"], order, axis=1)
+            y = np.nan_to_num(np.take_along_axis(values, order, axis=1))
+
+            forecast = np.full((len(values), len(days_ahead)), np.nan)
+            fitted = np.flatnonzero(counts >= model.min_points)
+            if len(fitted):
+                state = model.fit(np.nan_to_num(x[fitted]), y[fitted], counts[fitted])
+                # The model forecasts from each loan's last value of this metric
+                last_value_x = x[fitted, counts[fitted] - 1]
+                offsets = (last_x[fitted] - last_value_x)[:, None] + days_ahead[None, :]
+                forecast[fitted] = model.forecast(state, offsets)
+            forecasts[metric] = forecast
+        return forecasts
+
+    def forecast_covenants(
+        self,
+        db: Session,
+        user_id: UUID,
+        loan_id: Optional[UUID] = None,
+        horizon: int = 365
+    ) -> List[Dict[str, Any]]:
+        """
+        Forecast the ratio behind each of the user's active financial
+        covenants from the loans' forecast components, with the first
+        breach within horizon days of the latest reporting period.
+        """
+        query = db.query(Covenant).join(LoanAgreement).filter(
+            LoanAgreement.user_id == user_id,
+            Covenant.is_active == True,
+            Covenant.threshold_value.isnot(None),
+            Covenant.threshold_operator.in_(list(OPERATOR_CODES))
+        )
+        if loan_id:
+            query = query.filter(Covenant.loan_agreement_id == loan_id)
+        covenants = [(covenant, self.covenant_ratio(covenant.covenant_name)) for covenant in query]
+        covenants = [(covenant, ratio) for covenant, ratio in covenants if ratio]
+        if not covenants:
+            return []
+
+        financials = self.load_financials(db, list({covenant.loan_agreement_id for covenant, _ in covenants}))
+        if financials is None:
+            return []
+        loan_index = {loan: i for i, loan in enumerate(financials["loan_ids"])}
+        covenants = [(covenant, ratio) for covenant, ratio in covenants if covenant.loan_agreement_id in loan_index]
+        if not covenants:
+            return []
+
+        days_ahead = np.arange(1, horizon + 1)
+        components = self.forecast_components(financials, days_ahead)
+        history = self.compute_ratios(financials)
+        flags = self.not_meaningful(financials)
+        forecast_ratios = {
+            name: self._divide(components[ratio["numerator"]], components[ratio["denominator"]])
+            for name, ratio in RATIOS.items()
+        }
+
+        rows = np.array([loan_index[covenant.loan_agreement_id] for covenant, _ in covenants])
+        values = np.stack([forecast_ratios[ratio][row] for (_, ratio), row in zip(covenants, rows)])
+        thresholds = np.array([float(covenant.threshold_value) for covenant, _ in covenants])
+        operators = np.array([OPERATOR_CODES[covenant.threshold_operator] for covenant, _ in covenants])
+        breached = prediction_service._check_breach_many(values, thresholds[:, None], operators[:, None])
+        breached &= np.isfinite(values)
+        first = np.argmax(breached, axis=1)
+        any_breach = breached.any(axis=1)
+
+        lengths = financials["lengths"]
+        last_periods = financials["periods"][np.arange(len(lengths)), lengths - 1]
+        results = []
+        for i, (covenant, ratio) in enumerate(covenants):
+            row = rows[i]
+            ratio_history = history[ratio][row, :lengths[row]]
+            latest = np.flatnonzero(np.isfinite(ratio_history) | flags[ratio][row, :lengths[row]])
+            last_period = last_periods[row]
+            latest_not_meaningful = bool(len(latest)) and bool(flags[ratio][row, latest[-1]])
+            results.append({
+                "covenant_id": covenant.id,
+                "covenant_name": covenant.covenant_name,
+                "loan_agreement_id": covenant.loan_agreement_id,
+                "ratio": ratio,
+                "threshold_value": float(covenant.threshold_value),
+                "threshold_operator": covenant.threshold_operator,
+                "latest_period": financials["periods"][row, latest[-1]].item() if len(latest) else None,
+                "latest_value": round(float(ratio_history[latest[-1]]), 4) if len(latest) and not latest_not_meaningful else None,
+                "latest_not_meaningful": latest_not_meaningful,
+                "predicted_breach_date": (last_period + first[i] + 1).item() if any_breach[i] else None,
+                "days_until_breach": int(first[i] + 1) if any_breach[i] else None,
+                "predicted_value_at_breach": round(float(values[i, first[i]]), 4) if any_breach[i] else None,
+                "forecast": [
+                    {
+                        "date": (last_period + day).item(),
+                        "value": round(float(values[i, day - 1]), 4) if np.isfinite(values[i, day - 1]) else None
+                    }
+                    for day in FORECAST_POINTS if day <= horizon
+                ]
+            })
+        return results
+
+    def period_measurements(
+        self,
+        financials: Dict[str, Any],
+        covenants: List[Covenant],
+        periods: List[date]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Measurements the given reporting periods imply for the covenants:
+        one per covenant with a mapped ratio and period where the ratio
+        can be computed, dated at the reporting period.
+
+        Returns:
+            (measurements, number of covenant periods left unmeasured
+            because the ratio is not meaningful)
+        """
+        ratios = self.compute_ratios(financials)
+        flags = self.not_meaningful(financials)
+        loan_index = {loan: i for i, loan in enumerate(financials["loan_ids"])}
+        wanted = np.array(periods, dtype='datetime64[D]')
+
+        measurements, not_meaningful = [], 0
+        for covenant in covenants:
+            ratio = self.covenant_ratio(covenant.covenant_name)
+            if not ratio or covenant.loan_agreement_id not in loan_index:
+                continue
+            row = loan_index[covenant.loan_agreement_id]
+            in_periods = np.isin(financials["periods"][row], wanted)
+            not_meaningful += int(np.count_nonzero(in_periods & flags[ratio][row]))
+            columns = np.flatnonzero(in_periods & np.isfinite(ratios[ratio][row]))
+            for column in columns:
+                measurements.append({
+                    "covenant_id": covenant.id,
+                    "measurement_date": financials["periods"][row, column].item(),
+                    "actual_value": round(float(ratios[ratio][row, column]), 4),
+                    "notes": f'Computed from borrower financials ({ratio})'
+                })
+        return measurements, not_meaningful
+
+    def _divide(self, numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+        """
+        numerator / denominator, NaN where a component is missing or the
+        denominator is not positive: negative EBITDA would otherwise give a
+        negative Debt/EBITDA that passes a less_than test.
+        """
+        valid = np.isfinite(numerator) & np.isfinite(denominator) & (denominator > 0)
+        return np.divide(numerator, denominator, out=np.full(np.shape(numerator), np.nan), where=valid)
+
+ratio_service = RatioService()
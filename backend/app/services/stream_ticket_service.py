@@ -0,0 +1,60 @@
+from sqlalchemy import delete, func, literal_column
+from sqlalchemy.orm import Session
+from app.models.alert_stream_ticket import AlertStreamTicket
+from app.config import settings
+from typing import Optional
+from datetime import timedelta
+from uuid import UUID
+import hashlib
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+class StreamTicketService:
+    """
+    Tickets for opening alert streams (GET /api/alerts/stream and its
+    WebSocket), which browsers open without an Authorization header.
+
+    A ticket is issued to an authenticated request, lives for
+    ALERT_STREAM_TICKET_TTL_SECONDS and is deleted by the first stream
+    that presents it, so one leaked through a URL in a log is already
+    spent. Tickets are kept in the database, so any worker can redeem
+    one another worker issued.
+    """
+
+    def issue(self, db: Session, user_id: UUID) -> str:
+        """Create a ticket for the user in the caller's transaction, purging expired ones"""
+        db.execute(delete(AlertStreamTicket).where(AlertStreamTicket.expires_at < func.now()))
+        ticket = secrets.token_urlsafe(32)
+        db.add(AlertStreamTicket(
+            ticket_hash=self._hash(ticket),
+            user_id=user_id,
+            expires_at=func.now() + timedelta(seconds=settings.ALERT_STREAM_TICKET_TTL_SECONDS)
+        ))
+        return ticket
+
+    def redeem(self, db: Session, ticket: str) -> Optional[UUID]:
+        """
+        Spend a ticket in the caller's transaction.
+
+        Returns:
+            The user it was issued to, or None if it is unknown, already
+            used or expired
+        """
+        row = db.execute(
+            delete(AlertStreamTicket).where(
+                AlertStreamTicket.ticket_hash == self._hash(ticket)
+            ).returning(
+                AlertStreamTicket.user_id,
+                literal_column('expires_at > now()')
+            )
+        ).first()
+        if row is None or not row[1]:
+            return None
+        return row[0]
+
+    def _hash(self, ticket: str) -> str:
+        return hashlib.sha256(ticket.encode()).hexdigest()
+
+stream_ticket_service = StreamTicketService()
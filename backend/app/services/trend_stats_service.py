@@ -0,0 +1,154 @@
+from sqlalchemy import select, func, cast, Float
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.models.covenant import CovenantMeasurement, CovenantTrendStats
+from typing import Iterable, Optional
+from datetime import date
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TrendStatsService:
+    """
+    Maintains covenant_trend_stats, the running regression sums that
+    breach predictions are computed from.
+
+    The sums do not depend on insertion order, so measurements recorded
+    out of date order are added incrementally like any other. Deletions
+    rebuild the row from the remaining measurements.
+    """
+
+    def record_measurement(self, db: Session, covenant_id: UUID, measurement_date: date,
+                           actual_value: float) -> CovenantTrendStats:
+        """
+        Add one new measurement to the covenant's sums in the caller's
+        transaction. A covenant without stats yet is rebuilt from all of
+        its measurements instead, including this one once flushed.
+        """
+        stats = db.get(CovenantTrendStats, covenant_id, with_for_update=True)
+        if stats is None:
+            db.flush()
+            return self.recompute(db, covenant_id)
+
+        x = float((measurement_date - stats.anchor_date).days)
+        y = float(actual_value)
+        stats.n += 1
+        stats.sum_x += x
+        stats.sum_y += y
+        stats.sum_xy += x * y
+        stats.sum_xx += x * x
+        stats.sum_yy += y * y
+        stats.first_date = min(stats.first_date, measurement_date)
+        stats.last_date = max(stats.last_date, measurement_date)
+        return stats
+
+    def recompute(self, db: Session, covenant_id: UUID) -> Optional[CovenantTrendStats]:
+        """
+        Rebuild the covenant's sums from its measurements with one aggregate
+        query, in the caller's transaction. Removes the row when no
+        measurements are left.
+
+        Returns:
+            The rebuilt stats, or None without measurements
+        """
+        anchor = select(
+            func.min(CovenantMeasurement.measurement_date)
+        ).where(
+            CovenantMeasurement.covenant_id == covenant_id
+        ).scalar_subquery()
+        x = cast(CovenantMeasurement.measurement_date - anchor, Float)
+        y = cast(CovenantMeasurement.actual_value, Float)
+
+        row = db.execute(
+            select(
+                func.count().label('n'),
+                func.min(CovenantMeasurement.measurement_date).label('first_date'),
+                func.max(CovenantMeasurement.measurement_date).label('last_date'),
+                func.sum(x).label('sum_x'),
+                func.sum(y).label('sum_y'),
+                func.sum(x * y).label('sum_xy'),
+                func.sum(x * x).label('sum_xx'),
+                func.sum(y * y).label('sum_yy')
+            ).where(
+                CovenantMeasurement.covenant_id == covenant_id
+            )
+        ).mappings().one()
+
+        stats = db.get(CovenantTrendStats, covenant_id, with_for_update=True)
+        if not row['n']:
+            if stats is not None:
+                db.delete(stats)
+            return None
+
+        if stats is None:
+            stats = CovenantTrendStats(covenant_id=covenant_id)
+            db.add(stats)
+        stats.anchor_date = row['first_date']
+        for key in ('n', 'first_date', 'last_date', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy'):
+            setattr(stats, key, row[key])
+        return stats
+
+    def recompute_many(self, db: Session, covenant_ids: Iterable[UUID]) -> None:
+        """
+        Rebuild the sums of many covenants with one grouped aggregate
+        upserted in a single statement, in the caller's transaction. For
+        bulk writes that add measurements (covenants keep at least one).
+        """
+        covenant_ids = list(set(covenant_ids))
+        if not covenant_ids:
+            return
+        
+        anchor = func.min(CovenantMeasurement.measurement_date).over(partition_by=CovenantMeasurement.covenant_id)
+        points = select(
+            CovenantMeasurement.covenant_id,
+            CovenantMeasurement.measurement_date,
+            cast(CovenantMeasurement.measurement_date - anchor, Float).label('x'),
+            cast(CovenantMeasurement.actual_value, Float).label('y')
+        ).where(
+            CovenantMeasurement.covenant_id.in_(covenant_ids)
+        ).subquery()
+        
+        sums = select(
+            points.c.covenant_id,
+            func.min(points.c.measurement_date),
+            func.min(points.c.measurement_date),
+            func.max(points.c.measurement_date),
+            func.count(),
+            func.sum(points.c.x),
+            func.sum(points.c.y),
+            func.sum(points.c.x * points.c.y),
+            func.sum(points.c.x * points.c.x),
+            func.sum(points.c.y * points.c.y)
+        ).group_by(points.c.covenant_id)
+        
+        columns = ['covenant_id', 'anchor_date', 'first_date', 'last_date', 'n',
+                   'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy']
+        statement = insert(CovenantTrendStats).from_select(columns, sums)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CovenantTrendStats.covenant_id],
+            set_={
+                **{key: getattr(statement.excluded, key) for key in columns[1:]},
+                "updated_at": func.now()
+            }
+        )
+        db.execute(statement)
+    
+    def get(self, db: Session, covenant_id: UUID) -> Optional[CovenantTrendStats]:
+        """
+        Stats for a covenant, rebuilt (and committed) the first time a
+        covenant with older measurements is seen.
+        """
+        stats = db.get(CovenantTrendStats, covenant_id)
+        if stats is None:
+            stats = self.recompute(db, covenant_id)
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent request rebuilt it first
+                db.rollback()
+                stats = db.get(CovenantTrendStats, covenant_id)
+        return stats
+
+trend_stats_service = TrendStatsService()
@@ -1,5 +1,8 @@
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional, Tuple
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+import numpy as np
 
 def calculate_distance_to_breach(
     actual_value: float, 
@@ -51,3 +54,75 @@ def determine_measurement_status(
         return 'warning'
     else:
         return 'compliant'
+
+def measurement_statuses(
+    actual_values: np.ndarray,
+    threshold_values: np.ndarray,
+    operators: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized determine_measurement_status and calculate_distance_to_breach.
+    
+    Args:
+        actual_values: Measured values
+        threshold_values: Covenant thresholds (NaN or 0 when unset)
+        operators: Threshold operators (None when unset)
+        
+    Returns:
+        (statuses, distances); covenants without a threshold are
+        'compliant' with a NaN distance, as add_measurement treats them
+    """
+    actual_values = np.asarray(actual_values, dtype=float)
+    threshold_values = np.asarray(threshold_values, dtype=float)
+    operators = np.asarray(operators, dtype=object)
+    
+    below = np.isin(operators, ['less_than', 'less_or_equal'])
+    above = np.isin(operators, ['greater_than', 'greater_or_equal'])
+    distances = np.select(
+        [below, above],
+        [threshold_values - actual_values, actual_values - threshold_values],
+        default=0.0
+    )
+    statuses = np.where(
+        distances < 0, 'breach',
+        np.where(distances < threshold_values * 0.1, 'warning', 'compliant')
+    ).astype(object)
+    
+    unset = (np.nan_to_num(threshold_values) == 0) | np.equal(operators, None)
+    statuses[unset] = 'compliant'
+    distances = np.where(unset, np.nan, distances)
+    return statuses, distances
+
+# Months between covenant tests by frequency
+TEST_FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'semi-annual': 6,
+    'semi_annual': 6,
+    'annual': 12
+}
+
+def covenant_test_dates(
+    last_measurement_date: date,
+    next_test_date: Optional[date],
+    frequency: Optional[str],
+    horizon_days: int = 365
+) -> List[date]:
+    """
+    Upcoming covenant test dates within horizon_days of the last measurement.
+    Starts from next_test_date when it lies ahead, otherwise one period
+    after the last measurement; unknown frequencies are treated as quarterly.
+    """
+    months = TEST_FREQUENCY_MONTHS.get((frequency or '').lower(), 3)
+    end = last_measurement_date + timedelta(days=horizon_days)
+    
+    first = next_test_date
+    if not first or first <= last_measurement_date:
+        first = last_measurement_date + relativedelta(months=months)
+    
+    dates = []
+    step = 0
+    while first + relativedelta(months=months * step) <= end:
+        dates.append(first + relativedelta(months=months * step))
+        step += 1
+    return dates
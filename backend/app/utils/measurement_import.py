@@ -0,0 +1,86 @@
+from datetime import datetime
+from io import BytesIO, StringIO
+from typing import Any, Dict, List, Optional
+import csv
+import json
+
+# Upload formats by file extension
+FORMATS = {'.csv': 'csv', '.xlsx': 'xlsx', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson'
+}
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """'csv', 'xlsx' or 'ndjson' from the file extension, else the content type"""
+    name = (filename or '').lower()
+    for extension, file_format in FORMATS.items():
+        if name.endswith(extension):
+            return file_format
+    return CONTENT_TYPES.get((content_type or '').split(';')[0].strip())
+
+def read_rows(content: bytes, file_format: str) -> List[Dict[str, Any]]:
+    """
+    Rows of an uploaded measurement file as dicts keyed by lower-case
+    column name. CSV and XLSX take column names from the first row;
+    blank lines are skipped.
+
+    Raises:
+        ValueError: If the file cannot be parsed
+    """
+    if file_format == 'csv':
+        try:
+            text = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError("CSV file must be UTF-8 encoded")
+        reader = csv.DictReader(StringIO(text))
+        return [
+            {_column(key): value for key, value in row.items() if key is not None}
+            for row in reader if any((value or '').strip() for value in row.values() if isinstance(value, str))
+        ]
+
+    if file_format == 'ndjson':
+        rows = []
+        for number, line in enumerate(content.decode('utf-8').splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number} is not valid JSON: {e.msg}")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number} is not a JSON object")
+            rows.append({_column(key): value for key, value in row.items()})
+        return rows
+
+    if file_format == 'xlsx':
+        # openpyxl is only needed here; keep it off the import path
+        from openpyxl import load_workbook
+        try:
+            workbook = load_workbook(BytesIO(content), read_only=True, data_only=True)
+        except Exception:
+            raise ValueError("File is not a valid XLSX workbook")
+        try:
+            sheet_rows = workbook.active.iter_rows(values_only=True)
+            header = next(sheet_rows, None)
+            if header is None:
+                return []
+            columns = [_column(value) if value is not None else None for value in header]
+            rows = []
+            for values in sheet_rows:
+                if all(value is None or value == '' for value in values):
+                    continue
+                rows.append({
+                    column: value.date() if isinstance(value, datetime) else value
+                    for column, value in zip(columns, values) if column
+                })
+            return rows
+        finally:
+            workbook.close()
+
+    raise ValueError(f"Unsupported format: {file_format}")
+
+def _column(name: Any) -> str:
+    return str(name).strip().lower()
@@ -0,0 +1,23 @@
+"""Covering index for keyset pages of open alerts
+
+Revision ID: add_alert_page_index
+Revises: add_open_prediction_alert_index
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index(
+        'ix_alerts_open_loan_created',
+        'alerts',
+        ['loan_agreement_id', sa.text('created_at DESC'), sa.text('id DESC')],
+        postgresql_include=['is_read', 'severity', 'alert_type'],
+        postgresql_where=sa.text('NOT is_resolved')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_alerts_open_loan_created', 'alerts')
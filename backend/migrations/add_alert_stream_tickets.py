@@ -0,0 +1,26 @@
+"""Single-use tickets for opening alert streams
+
+Revision ID: add_alert_stream_tickets
+Revises: add_alert_page_index
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table(
+        'alert_stream_tickets',
+        sa.Column('ticket_hash', sa.String(64), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False)
+    )
+    op.create_index('ix_alert_stream_tickets_expires_at', 'alert_stream_tickets', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_alert_stream_tickets_expires_at', 'alert_stream_tickets')
+    op.drop_table('alert_stream_tickets')
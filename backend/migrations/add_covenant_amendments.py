@@ -0,0 +1,33 @@
+"""Effective-dated covenant thresholds
+
+Revision ID: add_covenant_amendments
+Revises: add_measurement_uniqueness
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table(
+        'covenant_amendments',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('covenant_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('covenants.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('effective_date', sa.Date(), nullable=False),
+        sa.Column('threshold_value', sa.Numeric(20, 4), nullable=False),
+        sa.Column('threshold_operator', sa.String(20), nullable=False),
+        sa.Column('previous_threshold_value', sa.Numeric(20, 4)),
+        sa.Column('previous_threshold_operator', sa.String(20)),
+        sa.Column('notes', sa.Text()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        # Also serves the per-covenant schedule lookups
+        sa.UniqueConstraint('covenant_id', 'effective_date', name='uq_covenant_amendments_covenant_date')
+    )
+
+
+def downgrade():
+    op.drop_table('covenant_amendments')
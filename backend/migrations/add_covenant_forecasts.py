@@ -0,0 +1,68 @@
+"""Store forecasts as model parameters instead of daily prediction rows
+
+Revision ID: add_covenant_forecasts
+Revises: add_latest_measurement_index
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table(
+        'covenant_forecasts',
+        sa.Column('covenant_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('covenants.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('anchor_date', sa.Date(), nullable=False),
+        sa.Column('slope', sa.Float(), nullable=False),
+        sa.Column('intercept', sa.Float(), nullable=False),
+        sa.Column('residual_std', sa.Float(), nullable=False),
+        sa.Column('n_measurements', sa.Integer(), nullable=False),
+        sa.Column('days_to_breach', sa.Integer()),
+        sa.Column('model_version', sa.String(50), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    # Fit every covenant with 3+ measurements in one pass; x is days
+    # before the latest measurement, so the intercept is the value there
+    op.execute("""
+        INSERT INTO covenant_forecasts (covenant_id, anchor_date, slope, intercept, residual_std,
+                                        n_measurements, model_version)
+        SELECT covenant_id, anchor_date,
+               coalesce(regr_slope(y, x), 0),
+               coalesce(regr_intercept(y, x), avg(y)),
+               coalesce(sqrt(greatest(regr_syy(y, x) - coalesce(regr_sxy(y, x) ^ 2 / nullif(regr_sxx(y, x), 0), 0), 0)
+                             / (count(*) - 2)), 0),
+               count(*), 'linear-v1'
+        FROM (
+            SELECT covenant_id,
+                   max(measurement_date) OVER (PARTITION BY covenant_id) AS anchor_date,
+                   (measurement_date - max(measurement_date) OVER (PARTITION BY covenant_id))::float8 AS x,
+                   actual_value::float8 AS y
+            FROM covenant_measurements
+        ) AS points
+        GROUP BY covenant_id, anchor_date
+        HAVING count(*) >= 3
+    """)
+
+    op.drop_table('covenant_predictions')
+
+
+def downgrade():
+    op.create_table(
+        'covenant_predictions',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('covenant_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('covenants.id', ondelete='CASCADE'), nullable=False, index=True),
+        sa.Column('prediction_date', sa.Date(), nullable=False),
+        sa.Column('predicted_value', sa.Numeric(15, 4)),
+        sa.Column('breach_probability', sa.Numeric(5, 2)),
+        sa.Column('days_to_potential_breach', sa.Numeric(10, 0)),
+        sa.Column('confidence_score', sa.Numeric(5, 2)),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    # Daily rows are regenerated on the next measurement
+    op.drop_table('covenant_forecasts')
@@ -0,0 +1,22 @@
+"""Add latest-measurement-per-covenant index
+
+Revision ID: add_latest_measurement_index
+Revises: add_performance_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Serves the per-covenant "latest measurement" LIMIT 1 probe
+    op.create_index(
+        'ix_covenant_measurements_covenant_date',
+        'covenant_measurements',
+        ['covenant_id', sa.text('measurement_date DESC'), sa.text('created_at DESC')]
+    )
+
+
+def downgrade():
+    op.drop_index('ix_covenant_measurements_covenant_date', 'covenant_measurements')
@@ -0,0 +1,73 @@
+"""One measurement per covenant and date, plus idempotency keys
+
+Revision ID: add_measurement_uniqueness
+Revises: add_covenant_forecasts
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    # Retried requests left duplicate measurements; keep the latest write
+    # per covenant and date, the one analytics already treat as current
+    op.execute("""
+        CREATE TEMPORARY TABLE duplicate_measurements ON COMMIT DROP AS
+        SELECT id, covenant_id
+        FROM (
+            SELECT id, covenant_id,
+                   row_number() OVER (
+                       PARTITION BY covenant_id, measurement_date
+                       ORDER BY created_at DESC NULLS LAST, id DESC
+                   ) AS position
+            FROM covenant_measurements
+        ) AS ranked
+        WHERE position > 1
+    """)
+    op.execute("DELETE FROM covenant_measurements WHERE id IN (SELECT id FROM duplicate_measurements)")
+
+    # Rebuild the running regression sums of the covenants that lost rows
+    op.execute("""
+        INSERT INTO covenant_trend_stats (covenant_id, anchor_date, first_date, last_date, n,
+                                          sum_x, sum_y, sum_xy, sum_xx, sum_yy)
+        SELECT covenant_id, min(measurement_date), min(measurement_date), max(measurement_date), count(*),
+               sum(x), sum(y), sum(x * y), sum(x * x), sum(y * y)
+        FROM (
+            SELECT covenant_id, measurement_date,
+                   (measurement_date - min(measurement_date) OVER (PARTITION BY covenant_id))::float8 AS x,
+                   actual_value::float8 AS y
+            FROM covenant_measurements
+            WHERE covenant_id IN (SELECT covenant_id FROM duplicate_measurements)
+        ) AS points
+        GROUP BY covenant_id
+        ON CONFLICT (covenant_id) DO UPDATE SET
+            anchor_date = excluded.anchor_date, first_date = excluded.first_date,
+            last_date = excluded.last_date, n = excluded.n, sum_x = excluded.sum_x,
+            sum_y = excluded.sum_y, sum_xy = excluded.sum_xy, sum_xx = excluded.sum_xx,
+            sum_yy = excluded.sum_yy, updated_at = now()
+    """)
+
+    op.create_unique_constraint(
+        'uq_covenant_measurements_covenant_date',
+        'covenant_measurements',
+        ['covenant_id', 'measurement_date']
+    )
+
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('request_hash', sa.String(64), nullable=False),
+        sa.Column('status_code', sa.Integer()),
+        sa.Column('response_body', postgresql.JSONB()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+    )
+
+
+def downgrade():
+    # Deleted duplicates are not restored
+    op.drop_table('idempotency_keys')
+    op.drop_constraint('uq_covenant_measurements_covenant_date', 'covenant_measurements', type_='unique')
@@ -0,0 +1,45 @@
+"""One open prediction alert per covenant
+
+Revision ID: add_open_prediction_alert_index
+Revises: add_covenant_amendments
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Keep the latest open prediction alert of each covenant. Run
+    # app.jobs.compact_prediction_alerts first: it deletes in batches and
+    # rebuilds the rollups; app.jobs.reconcile_rollups covers what this
+    # step removes
+    op.execute("""
+        DELETE FROM alerts
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT id,
+                       row_number() OVER (
+                           PARTITION BY covenant_id
+                           ORDER BY created_at DESC NULLS LAST, id DESC
+                       ) AS position
+                FROM alerts
+                WHERE alert_type = 'prediction' AND NOT is_resolved
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+
+    op.create_index(
+        'uq_alerts_open_prediction',
+        'alerts',
+        ['covenant_id'],
+        unique=True,
+        postgresql_where=sa.text("alert_type = 'prediction' AND NOT is_resolved")
+    )
+
+
+def downgrade():
+    # Deleted duplicates are not restored
+    op.drop_index('uq_alerts_open_prediction', 'alerts')
@@ -1,7 +1,7 @@
 # Import all models here for easy access
 from models.user import User
 from models.loan import LoanAgreement
-from models.covenant import Covenant, CovenantMeasurement, CovenantPrediction
+from models.covenant import Covenant, CovenantMeasurement, CovenantForecast
 from models.alert import Alert
 
 __all__ = [
@@ -9,6 +9,6 @@ __all__ = [
     "LoanAgreement",
     "Covenant",
     "CovenantMeasurement",
-    "CovenantPrediction",
+    "CovenantForecast",
     "Alert"
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Numeric, Date, Text, ForeignKey, Boolean, func
+from sqlalchemy import Column, String, DateTime, Numeric, Date, Text, ForeignKey, Boolean, Integer, Float, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from database import Base
@@ -23,7 +23,7 @@ class Covenant(Base):
     # Relationships
     loan_agreement = relationship("LoanAgreement", back_populates="covenants")
     measurements = relationship("CovenantMeasurement", back_populates="covenant", cascade="all, delete-orphan")
-    predictions = relationship("CovenantPrediction", back_populates="covenant", cascade="all, delete-orphan")
+    forecast = relationship("CovenantForecast", back_populates="covenant", uselist=False, cascade="all, delete-orphan")
 
 
 class CovenantMeasurement(Base):
@@ -41,17 +41,23 @@ class CovenantMeasurement(Base):
     covenant = relationship("Covenant", back_populates="measurements")
 
 
-class CovenantPrediction(Base):
-    __tablename__ = "covenant_predictions"
+class CovenantForecast(Base):
+    """
+    Latest forecast of a covenant, stored as model parameters; the daily
+    series is generated from them on read.
+    """
+    __tablename__ = "covenant_forecasts"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), nullable=False, index=True)
-    prediction_date = Column(Date, nullable=False)
-    predicted_value = Column(Numeric(15, 4))
-    breach_probability = Column(Numeric(5, 2))  # 0-100
-    days_to_potential_breach = Column(Numeric(10, 0))
-    confidence_score = Column(Numeric(5, 2))  # 0-100
+    covenant_id = Column(UUID(as_uuid=True), ForeignKey("covenants.id", ondelete="CASCADE"), primary_key=True)
+    anchor_date = Column(Date, nullable=False)  # Latest measurement; day 0 of the forecast
+    slope = Column(Float, nullable=False)  # Per day
+    intercept = Column(Float, nullable=False)  # Value at anchor_date
+    residual_std = Column(Float, nullable=False)
+    n_measurements = Column(Integer, nullable=False)
+    days_to_breach = Column(Integer)  # Within 90 days of anchor_date
+    model_version = Column(String(50), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    covenant = relationship("Covenant", back_populates="predictions")
+    covenant = relationship("Covenant", back_populates="forecast")
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 from database import get_db
 from models.user import User
-from models.covenant import Covenant, CovenantMeasurement, CovenantPrediction
+from models.covenant import Covenant, CovenantMeasurement, CovenantForecast
 from models.loan import LoanAgreement
 from schemas import CovenantResponse, MeasurementCreate, MeasurementResponse, PredictionResponse
 from routes.auth import get_current_user
@@ -130,10 +132,11 @@ def get_measurements(
 @router.get("/{covenant_id}/predictions", response_model=List[PredictionResponse])
 def get_predictions(
     covenant_id: str,
+    days: int = Query(90, ge=1, le=1825),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get predictions for a covenant"""
+    """Get daily predictions for a covenant from today (or the day after its latest measurement)"""
     # Verify covenant belongs to user
     covenant = db.query(Covenant).join(LoanAgreement).filter(
         Covenant.id == UUID(covenant_id),
@@ -146,13 +149,36 @@ def get_predictions(
             detail="Covenant not found"
         )
     
-    predictions = db.query(CovenantPrediction).filter(
-        CovenantPrediction.covenant_id == UUID(covenant_id)
-    ).filter(
-        CovenantPrediction.prediction_date >= date.today()
-    ).order_by(CovenantPrediction.prediction_date).limit(90).all()
+    forecast = db.get(CovenantForecast, covenant.id)
+    if not forecast:
+        return []
     
-    return [PredictionResponse.from_orm(p) for p in predictions]
+    start_day = max(1, (date.today() - forecast.anchor_date).days)
+    series = prediction_service.forecast_series(
+        {
+            'slope': forecast.slope,
+            'intercept': forecast.intercept,
+            'anchor_date': forecast.anchor_date,
+            'n_measurements': forecast.n_measurements
+        },
+        float(covenant.threshold_value) if covenant.threshold_value else None,
+        covenant.threshold_operator,
+        start_day,
+        days
+    )
+    
+    return [
+        PredictionResponse(
+            prediction_date=prediction_date,
+            predicted_value=round(predicted_value, 4),
+            breach_probability=round(breach_probability, 2),
+            confidence_score=confidence_score
+        )
+        for prediction_date, predicted_value, breach_probability, confidence_score in zip(
+            series['dates'].tolist(), series['values'].tolist(),
+            series['breach_probability'].tolist(), series['confidence_score'].tolist()
+        )
+    ]
 
 def check_compliance(actual_value: float, threshold_value: float, operator: str) -> bool:
     """Check if measurement is compliant with threshold"""
@@ -183,7 +209,7 @@ def update_covenant_status(db: Session, covenant: Covenant, is_compliant: bool):
     db.commit()
 
 def update_predictions(db: Session, covenant: Covenant, measurements: List, user_id: UUID):
-    """Update predictions based on new measurements"""
+    """Refit the covenant's forecast and store its parameters"""
     # Prepare measurement data
     measurement_data = [
         {
@@ -193,29 +219,28 @@ def update_predictions(db: Session, covenant: Covenant, measurements: List, user
         for m in measurements
     ]
     
-    # Run prediction
-    prediction_result = prediction_service.predict_covenant_breach(
-        measurements=measurement_data,
+    # Fit the forecast
+    forecast = prediction_service.fit_forecast(measurement_data)
+    prediction_result = prediction_service.assess_forecast(
+        forecast,
         threshold_value=float(covenant.threshold_value) if covenant.threshold_value else None,
         threshold_operator=covenant.threshold_operator
     )
     
-    # Delete old predictions
-    db.query(CovenantPrediction).filter(
-        CovenantPrediction.covenant_id == covenant.id
-    ).delete()
-    
-    # Create new predictions
-    for pred in prediction_result.get('predictions', [])[:90]:  # Limit to 90 days
-        prediction = CovenantPrediction(
-            covenant_id=covenant.id,
-            prediction_date=pred['prediction_date'],
-            predicted_value=pred['predicted_value'],
-            breach_probability=pred['breach_probability'],
-            days_to_potential_breach=prediction_result.get('days_to_breach'),
-            confidence_score=pred['confidence_score']
-        )
-        db.add(prediction)
+    # Replace the stored forecast in one statement
+    statement = insert(CovenantForecast).values(
+        covenant_id=covenant.id,
+        days_to_breach=prediction_result['days_to_breach'],
+        **forecast
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[CovenantForecast.covenant_id],
+        set_={
+            **{key: getattr(statement.excluded, key) for key in (*forecast, 'days_to_breach')},
+            'updated_at': func.now()
+        }
+    )
+    db.execute(statement)
     
     # Update covenant status based on risk
     overall_risk = prediction_result.get('overall_risk', 'healthy')
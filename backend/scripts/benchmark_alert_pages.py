@@ -0,0 +1,88 @@
+"""
+Benchmark paging through GET /api/alerts.
+Compares LIMIT/OFFSET paging with the keyset pages of AlertService.page at
+increasing depths into a 1M-alert history: OFFSET reads and discards every
+skipped row, the keyset page starts at the cursor and stays flat.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/benchmark_alert_pages.py --alerts 1000000
+"""
+
+import argparse
+
+from bench_common import seed_portfolio, drop_user, measure, print_comparison
+
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app.models.loan import LoanAgreement
+from app.models.alert import Alert
+from app.services.alert_service import alert_service
+
+
+def offset_page(db, user_id, limit: int, offset: int):
+    """Pre-cursor paging: the old endpoint query with an OFFSET"""
+    alerts = db.query(Alert).join(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        Alert.is_resolved == False
+    ).order_by(Alert.created_at.desc(), Alert.id.desc()).offset(offset).limit(limit).all()
+    db.expunge_all()
+    return alerts
+
+
+def keyset_page(db, user_id, limit: int, after):
+    alerts = alert_service.page(db, user_id, limit + 1, after)
+    db.expunge_all()
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loans", type=int, default=200)
+    parser.add_argument("--covenants-per-loan", type=int, default=5)
+    parser.add_argument("--alerts", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000, 300000],
+                        help="Open alerts skipped before the page")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data afterwards")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    print(f"Seeding {args.loans} loans / {args.alerts} alerts...")
+    covenants = args.loans * args.covenants_per_loan
+    user_id = seed_portfolio(db, args.loans, args.covenants_per_loan, covenants, args.alerts)
+    # Set the visibility map as autovacuum would, so index-only scans skip the heap
+    db.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE alerts"))
+
+    try:
+        open_alerts = db.query(Alert).join(LoanAgreement).filter(
+            LoanAgreement.user_id == user_id,
+            Alert.is_resolved == False
+        ).count()
+        print(f"{open_alerts} open alerts")
+
+        for depth in args.depths:
+            if depth >= open_alerts:
+                continue
+            after = None
+            if depth:
+                # The cursor a client holds after paging past `depth` alerts
+                last = offset_page(db, user_id, 1, depth - 1)[0]
+                after = (last.created_at, last.id)
+
+            assert [a.id for a in keyset_page(db, user_id, args.limit, after)[:args.limit]] == \
+                [a.id for a in offset_page(db, user_id, args.limit, depth)]
+            print_comparison(f"Page of {args.limit} after {depth} alerts", {
+                "offset": measure(lambda: offset_page(db, user_id, args.limit, depth), args.repeat),
+                "keyset": measure(lambda: keyset_page(db, user_id, args.limit, after), args.repeat)
+            })
+    finally:
+        if not args.keep:
+            drop_user(db, user_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark model selection in PredictionService.forecast_many.
+Generates quarterly covenant series that are trending, seasonal or
+levelling off, then reports which model cross-validation picks for each
+kind, the forecast error on the next year of (unseen) tests against the
+plain linear trend, and batch scoring time with and without cached model
+choices, as the nightly re-forecast job runs it.
+
+Usage:
+    python scripts/benchmark_forecast_models.py --covenants 20000
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.services.forecast_models import MODELS
+from app.services.prediction_service import prediction_service
+
+KINDS = ['trend', 'seasonal', 'levelling']
+FUTURE_TESTS = 4
+
+
+def synthetic_series(rng: np.random.Generator, covenants: int):
+    """
+    {i: series} plus the kind of each series and its next FUTURE_TESTS
+    quarterly values
+    """
+    series, kinds, future = {}, [], []
+    for i in range(covenants):
+        kind = KINDS[i % len(KINDS)]
+        n = int(rng.integers(4, 28))
+        t = np.arange(n + FUTURE_TESTS)
+        if kind == 'trend':
+            values = 3 + rng.uniform(-0.08, 0.08) * t
+        elif kind == 'seasonal':
+            values = 3 + rng.uniform(-0.03, 0.03) * t + rng.uniform(0.2, 0.6) * np.tile(
+                rng.permutation([1.0, 0.3, -0.5, -0.8]), len(t) // 4 + 1)[:len(t)]
+        else:
+            values = 3 + rng.uniform(-1, 1) * (1 - rng.uniform(0.6, 0.9) ** t)
+        values = values + rng.normal(0, 0.05, len(t))
+
+        start = date(2018, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+        dates = [start + timedelta(days=int(91 * k + rng.integers(-5, 6))) for k in t]
+        series[i] = {
+            "historical_values": [{"date": d.isoformat(), "value": float(v)} for d, v in zip(dates[:n], values[:n])],
+            "threshold_value": 3.5,
+            "threshold_operator": 'less_than'
+        }
+        kinds.append(kind)
+        future.append((dates[n - 1], dates[n:], values[n:]))
+    return series, kinds, future
+
+
+def future_errors(series, future, names):
+    """Mean absolute error on the unseen tests per covenant, refitting with the given model"""
+    batch = prediction_service._pad_many(series)
+    index = {key: i for i, key in enumerate(batch['keys'])}
+    errors = np.zeros(len(series))
+    for name, model in MODELS.items():
+        keys = [key for key in series if names[key] == name]
+        if not keys:
+            continue
+        rows = [index[key] for key in keys]
+        state = model.fit(batch['x'][rows], batch['y'][rows], batch['lengths'][rows])
+        days_ahead = np.array([[(d - future[key][0]).days for d in future[key][1]] for key in keys], dtype=float)
+        actual = np.array([future[key][2] for key in keys])
+        errors[keys] = np.abs(model.forecast(state, days_ahead) - actual).mean(axis=1)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--covenants", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    series, kinds, future = synthetic_series(rng, args.covenants)
+
+    start = time.perf_counter()
+    results, choices = prediction_service.forecast_many(series)
+    selecting_seconds = time.perf_counter() - start
+
+    for key, choice in choices.items():
+        series[key]["model"] = choice["model"]
+        series[key]["model_n_measurements"] = choice["n_measurements"]
+    start = time.perf_counter()
+    cached_results, _ = prediction_service.forecast_many(series)
+    cached_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prediction_service.predict_many(series)
+    linear_seconds = time.perf_counter() - start
+
+    chosen = {key: choices[key]["model"] for key in series}
+    selected_errors = future_errors(series, future, chosen)
+    linear_errors = future_errors(series, future, {key: 'linear' for key in series})
+
+    print(f"{'series':<12}{'models chosen':<52}{'linear MAE':>12}{'chosen MAE':>12}")
+    for kind in KINDS:
+        keys = [key for key in series if kinds[key] == kind]
+        mix = Counter(chosen[key] for key in keys)
+        print(f"{kind:<12}{', '.join(f'{name} {count}' for name, count in mix.most_common()):<52}"
+              f"{linear_errors[keys].mean():>12.4f}{selected_errors[keys].mean():>12.4f}")
+    print(f"{'all':<12}{'':<52}{linear_errors.mean():>12.4f}{selected_errors.mean():>12.4f}")
+
+    print(f"\n{args.covenants} covenants:")
+    print(f"  predict_many (linear only)      {linear_seconds * 1000:>9.0f} ms")
+    print(f"  forecast_many, selecting models {selecting_seconds * 1000:>9.0f} ms")
+    print(f"  forecast_many, cached choices   {cached_seconds * 1000:>9.0f} ms")
+    print(f"  cached results identical: {cached_results == results}")
+
+    sys.exit(0 if cached_results == results else 1)
+
+
+if __name__ == "__main__":
+    main()
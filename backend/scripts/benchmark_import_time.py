@@ -0,0 +1,87 @@
+"""
+Benchmark application import time, the bulk of a worker's cold start.
+Runs `python -X importtime -c "import app.main"` in fresh interpreters,
+reports the median total and the heaviest top-level packages, and fails
+if scikit-learn, SciPy or pandas are imported on the way. For reference it
+also times importing the libraries the prediction services used to load.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/benchmark_import_time.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("sklearn", "scipy", "pandas")
+
+
+def import_times(module: str):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        {module name: cumulative microseconds} for every module imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Heaviest packages to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    total_ms = statistics.median(run[args.module] for run in runs) / 1000
+
+    # Top-level packages, timed at their outermost import
+    packages = defaultdict(list)
+    for run in runs:
+        for name, cumulative in run.items():
+            if "." not in name:
+                packages[name].append(cumulative)
+    heaviest = sorted(
+        ((statistics.median(values) / 1000, name) for name, values in packages.items() if name != args.module),
+        reverse=True
+    )[:args.top]
+
+    print(f"import {args.module}: {total_ms:.0f} ms (median of {args.repeat})")
+    print("-" * 40)
+    for ms, name in heaviest:
+        print(f"{name:<28}{ms:>9.0f} ms")
+
+    loaded = sorted({name.split(".")[0] for name in runs[0]} & set(FORBIDDEN))
+    print(f"\nHeavy libraries imported: {', '.join(loaded) if loaded else 'none'}")
+
+    print("\nFor reference, in a fresh interpreter:")
+    for module in ("sklearn.linear_model", "pandas"):
+        try:
+            reference = statistics.median(import_times(module)[module] for _ in range(args.repeat)) / 1000
+            print(f"import {module:<22}{reference:>9.0f} ms")
+        except SystemExit:
+            print(f"import {module:<22}{'not installed':>12}")
+
+    sys.exit(1 if loaded else 0)
+
+
+if __name__ == "__main__":
+    main()
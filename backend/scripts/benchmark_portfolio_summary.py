@@ -0,0 +1,94 @@
+"""
+Benchmark the dashboard portfolio summary.
+Compares the original six-query implementation with the single-statement
+AnalyticsService.get_portfolio_summary and the portfolio_rollups primary-key
+read on a synthetic portfolio.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/benchmark_portfolio_summary.py --loans 10000 --measurements 1000000
+"""
+
+import argparse
+
+from bench_common import seed_portfolio, drop_user, measure, print_comparison
+
+from sqlalchemy import func
+from app.database import SessionLocal
+from app.models.loan import LoanAgreement
+from app.models.covenant import Covenant, CovenantMeasurement
+from app.models.alert import Alert
+from app.services.analytics_service import analytics_service
+from app.services.portfolio_rollup_service import portfolio_rollup_service
+
+
+def legacy_portfolio_summary(db, user_id):
+    """The pre-AnalyticsService implementation, kept for comparison"""
+    total_loans = db.query(func.count(LoanAgreement.id)).filter(
+        LoanAgreement.user_id == user_id
+    ).scalar() or 0
+    active_loans = db.query(func.count(LoanAgreement.id)).filter(
+        LoanAgreement.user_id == user_id,
+        LoanAgreement.status == 'active'
+    ).scalar() or 0
+    total_covenants = db.query(func.count(Covenant.id)).join(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        Covenant.is_active == True
+    ).scalar() or 0
+    covenant_statuses = db.query(
+        CovenantMeasurement.status,
+        func.count(func.distinct(CovenantMeasurement.covenant_id))
+    ).join(Covenant).join(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        Covenant.is_active == True
+    ).group_by(CovenantMeasurement.status).all()
+    unread_alerts = db.query(func.count(Alert.id)).join(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        Alert.is_read == False,
+        Alert.is_resolved == False
+    ).scalar() or 0
+    critical_alerts = db.query(func.count(Alert.id)).join(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        Alert.severity == 'critical',
+        Alert.is_resolved == False
+    ).scalar() or 0
+    return total_loans, active_loans, total_covenants, dict(covenant_statuses), unread_alerts, critical_alerts
+
+
+def rollup_summary(db, user_id):
+    """Rollup read without the session identity map short-circuiting it"""
+    db.expunge_all()
+    return portfolio_rollup_service.get_summary(db, user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loans", type=int, default=10000)
+    parser.add_argument("--covenants-per-loan", type=int, default=3)
+    parser.add_argument("--measurements", type=int, default=1000000)
+    parser.add_argument("--alerts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data afterwards")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    print(f"Seeding {args.loans} loans / {args.measurements} measurements...")
+    user_id = seed_portfolio(db, args.loans, args.covenants_per_loan, args.measurements, args.alerts)
+
+    try:
+        results = {
+            "legacy": measure(lambda: legacy_portfolio_summary(db, user_id), args.repeat),
+            "single-statement": measure(lambda: analytics_service.get_portfolio_summary(db, user_id), args.repeat),
+        }
+        portfolio_rollup_service.rebuild(db, user_id)
+        db.commit()
+        results["rollup"] = measure(lambda: rollup_summary(db, user_id), args.repeat)
+        print_comparison("Portfolio summary", results)
+        print("\nSummary:", analytics_service.get_portfolio_summary(db, user_id))
+    finally:
+        if not args.keep:
+            drop_user(db, user_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
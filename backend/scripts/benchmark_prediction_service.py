@@ -0,0 +1,206 @@
+"""
+Benchmark PredictionService.predict_breach_date and predict_many.
+Compares the original day-by-day scan (scikit-learn LinearRegression, one
+predict per day, up to 365) with the NumPy fit and closed-form breach-day
+solver on random series for every threshold operator, checks that both
+return the same results, and reports per-call latency and throughput. Then times forecasting the
+whole set with one vectorized predict_many call, and the Monte Carlo
+simulate_many against its per-covenant latency budget.
+
+Usage:
+    python scripts/benchmark_prediction_service.py --series 2000
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from app.services.prediction_service import prediction_service
+
+OPERATORS = ['less_than', 'greater_than', 'less_or_equal', 'greater_or_equal', 'equal']
+
+
+def legacy_predict_breach_date(historical_values, threshold_value, threshold_operator):
+    """The pre-solver implementation, kept for comparison (needs scikit-learn)"""
+    from sklearn.linear_model import LinearRegression
+
+    if len(historical_values) < 3 or threshold_value is None or threshold_operator is None:
+        return None
+
+    sorted_data = sorted(historical_values, key=lambda x: x['date'])
+    first_date = datetime.fromisoformat(sorted_data[0]['date'])
+    X = [[(datetime.fromisoformat(item['date']) - first_date).days] for item in sorted_data]
+    y = [item['value'] for item in sorted_data]
+
+    model = LinearRegression()
+    model.fit(X, y)
+    r_squared = model.score(X, y)
+    slope = model.coef_[0]
+
+    if abs(slope) < 0.01:
+        trajectory = "stable"
+    elif threshold_operator in ['less_than', 'less_or_equal']:
+        trajectory = "deteriorating" if slope > 0 else "improving"
+    else:
+        trajectory = "deteriorating" if slope < 0 else "improving"
+
+    current_date = datetime.fromisoformat(sorted_data[-1]['date'])
+    last_days = X[-1][0]
+    for future_days in range(1, 366):
+        predicted_value = model.predict([[last_days + future_days]])[0]
+        if prediction_service._check_breach(predicted_value, threshold_value, threshold_operator):
+            breach_date = current_date + timedelta(days=future_days)
+            return {
+                "predicted_breach_date": breach_date.date().isoformat(),
+                "days_until_breach": future_days,
+                "confidence": round(min(r_squared, 0.99), 2),
+                "current_trajectory": trajectory,
+                "predicted_value_at_breach": round(predicted_value, 4)
+            }
+    return None
+
+
+def random_case(rnd: random.Random):
+    """
+    A quarterly-ish series drifting towards, away from or around a
+    threshold. Half of the noiseless series are built to reach the
+    threshold exactly on a whole day within the year, to exercise ties.
+    """
+    operator = rnd.choice(OPERATORS)
+    threshold = round(rnd.uniform(0.5, 6.0), 2)
+    points = rnd.randint(3, 24)
+    start = date(2020, 1, 1) + timedelta(days=rnd.randint(0, 1500))
+    offsets = [0]
+    for _ in range(points - 1):
+        offsets.append(offsets[-1] + rnd.randint(20, 100))
+
+    if rnd.random() < 0.5:
+        # Exact line crossing the threshold `crossing` days after the last point
+        crossing = rnd.randint(1, 400)
+        per_day = rnd.choice([-1, 1]) * rnd.uniform(0.0005, 0.01) * threshold
+        values = [threshold - per_day * (offsets[-1] + crossing - day) for day in offsets]
+    else:
+        level = threshold * rnd.uniform(0.7, 1.3)
+        drift = rnd.uniform(-0.02, 0.02) * threshold
+        noise = rnd.choice([0.0, 0.01, 0.05]) * threshold
+        values = [round(level + drift * day / 30 + rnd.gauss(0, noise), 4) for day in offsets]
+
+    series = [
+        {"date": (start + timedelta(days=day)).isoformat(), "value": value}
+        for day, value in zip(offsets, values)
+    ]
+    return series, threshold, operator
+
+
+def rounding_difference(expected, actual, threshold):
+    """
+    True when two results differ only through floating point rounding of
+    the fit: the trend line reaches the threshold exactly on a whole day,
+    where the last bit decides whether that day breaches, or the value at
+    the breach lands on a half-way point of its 4-decimal rounding.
+    """
+    if expected is None or actual is None:
+        result = expected or actual
+        return result["predicted_value_at_breach"] == round(threshold, 4)
+    if expected["days_until_breach"] == actual["days_until_breach"]:
+        return (
+            {**expected, "predicted_value_at_breach": None} == {**actual, "predicted_value_at_breach": None}
+            and abs(expected["predicted_value_at_breach"] - actual["predicted_value_at_breach"]) <= 1.5e-4
+        )
+    return (
+        abs(expected["days_until_breach"] - actual["days_until_breach"]) == 1
+        and round(threshold, 4) in (expected["predicted_value_at_breach"], actual["predicted_value_at_breach"])
+    )
+
+
+def timed(fn, cases, repeat):
+    """Median seconds to run fn over all cases"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for series, threshold, operator in cases:
+            fn(series, threshold, operator)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=2000, help="Random series to check and time")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--simulations", type=int, default=1000, help="Bootstrap paths for simulate_many")
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="simulate_many per-covenant latency budget")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    cases = [random_case(rnd) for _ in range(args.series)]
+
+    mismatches, ties, breaches = 0, 0, 0
+    for series, threshold, operator in cases:
+        expected = legacy_predict_breach_date(series, threshold, operator)
+        actual = prediction_service.predict_breach_date(series, threshold, operator)
+        breaches += expected is not None
+        if expected == actual:
+            continue
+        if rounding_difference(expected, actual, threshold):
+            ties += 1
+        else:
+            mismatches += 1
+            print(f"MISMATCH {operator} {threshold}: legacy={expected} solver={actual}")
+    print(f"Checked {len(cases)} series ({breaches} with a predicted breach): {mismatches} mismatches, "
+          f"{ties} differing only by rounding of exact ties")
+
+    results = {
+        "legacy": timed(legacy_predict_breach_date, cases, args.repeat),
+        "closed-form": timed(prediction_service.predict_breach_date, cases, args.repeat),
+    }
+
+    print("\nPredictionService.predict_breach_date")
+    print("-" * 60)
+    print(f"{'implementation':<20}{'per call ms':>15}{'calls/s':>15}")
+    for name, seconds in results.items():
+        print(f"{name:<20}{seconds / len(cases) * 1000:>15.3f}{len(cases) / seconds:>15.0f}")
+
+    batch_input = {
+        i: {"historical_values": series, "threshold_value": threshold, "threshold_operator": operator}
+        for i, (series, threshold, operator) in enumerate(cases)
+    }
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        prediction_service.predict_many(batch_input)
+        timings.append(time.perf_counter() - start)
+    batch_seconds = statistics.median(timings)
+    single_seconds = results["closed-form"]
+    print(f"{'predict_many':<20}{batch_seconds / len(cases) * 1000:>15.3f}{len(cases) / batch_seconds:>15.0f}")
+
+    # The vectorized fit rounds differently from the per-series one, so a
+    # series whose trend lands exactly on the threshold may flip by a day
+    batch = prediction_service.predict_many(batch_input)
+    single = [prediction_service.predict_breach_date(*case) for case in cases]
+    identical = sum(batch[i] == result for i, result in enumerate(single))
+    print(f"\npredict_many is {single_seconds / batch_seconds:.0f}x faster than calling predict_breach_date "
+          f"per series; {identical}/{len(cases)} results identical")
+
+    for case_input, (series, _, _) in zip(batch_input.values(), cases):
+        last_date = date.fromisoformat(max(point["date"] for point in series))
+        case_input["test_dates"] = [last_date + timedelta(days=90 * quarter) for quarter in range(1, 5)]
+    start = time.perf_counter()
+    prediction_service.simulate_many(batch_input, simulations=args.simulations)
+    per_covenant_ms = (time.perf_counter() - start) / len(cases) * 1000
+    within_budget = per_covenant_ms <= args.budget_ms
+    print(f"\nsimulate_many ({args.simulations} paths, 4 test dates): {per_covenant_ms:.3f} ms per covenant "
+          f"({'within' if within_budget else 'OVER'} the {args.budget_ms} ms budget)")
+
+    sys.exit(1 if mismatches or not within_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
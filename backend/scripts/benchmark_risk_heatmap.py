@@ -0,0 +1,91 @@
+"""
+Benchmark the dashboard risk heatmap.
+Compares the original per-loan loop with the single-statement
+AnalyticsService.get_risk_heatmap, at two history lengths to show that the
+set-based version stays flat as measurement history grows.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/benchmark_risk_heatmap.py --loans 2000
+"""
+
+import argparse
+
+from bench_common import seed_portfolio, drop_user, measure, print_comparison
+
+from sqlalchemy import func
+from app.database import SessionLocal
+from app.models.loan import LoanAgreement
+from app.models.covenant import Covenant, CovenantMeasurement
+from app.services.analytics_service import analytics_service
+
+
+def legacy_risk_heatmap(db, user_id):
+    """The pre-AnalyticsService implementation, kept for comparison"""
+    loans = db.query(LoanAgreement).filter(
+        LoanAgreement.user_id == user_id,
+        LoanAgreement.status == 'active'
+    ).all()
+
+    items = []
+    for loan in loans:
+        covenant_count = db.query(func.count(Covenant.id)).filter(
+            Covenant.loan_agreement_id == loan.id,
+            Covenant.is_active == True
+        ).scalar() or 0
+
+        worst_status = 'compliant'
+        critical_count = 0
+        if covenant_count > 0:
+            measurements = db.query(CovenantMeasurement).join(Covenant).filter(
+                Covenant.loan_agreement_id == loan.id,
+                Covenant.is_active == True
+            ).order_by(
+                CovenantMeasurement.covenant_id,
+                CovenantMeasurement.measurement_date.desc()
+            ).all()
+
+            covenant_latest = {}
+            for m in measurements:
+                if m.covenant_id not in covenant_latest:
+                    covenant_latest[m.covenant_id] = m.status
+
+            statuses = list(covenant_latest.values())
+            if 'breach' in statuses:
+                worst_status = 'breach'
+                critical_count = statuses.count('breach')
+            elif 'warning' in statuses:
+                worst_status = 'warning'
+                critical_count = statuses.count('warning')
+
+        items.append((loan.id, worst_status, covenant_count, critical_count))
+    db.expunge_all()
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loans", type=int, default=2000)
+    parser.add_argument("--covenants-per-loan", type=int, default=3)
+    parser.add_argument("--history", type=int, nargs="+", default=[8, 80],
+                        help="Measurements per covenant to benchmark at")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    for per_covenant in args.history:
+        measurements = args.loans * args.covenants_per_loan * per_covenant
+        print(f"\nSeeding {args.loans} loans / {measurements} measurements...")
+        user_id = seed_portfolio(db, args.loans, args.covenants_per_loan, measurements)
+        try:
+            results = {
+                "legacy": measure(lambda: legacy_risk_heatmap(db, user_id), args.repeat),
+                "single-statement": measure(lambda: analytics_service.get_risk_heatmap(db, user_id), args.repeat),
+            }
+            print_comparison(f"Risk heatmap ({per_covenant} measurements per covenant)", results)
+        finally:
+            drop_user(db, user_id)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
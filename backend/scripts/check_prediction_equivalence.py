@@ -0,0 +1,206 @@
+"""
+Numerical equivalence checks for the NumPy forecasting kernel.
+Fits random series with PredictionService._fit_line, the grouped
+_fit_many and the legacy service's _fit_line, and compares them with
+np.linalg.lstsq and, when it is installed, scikit-learn's LinearRegression.
+Then compares predict_breach_date and the legacy predict_covenant_breach
+with their original scikit-learn/pandas implementations. Exits 1 on any
+difference beyond floating point rounding.
+
+Usage:
+    python scripts/check_prediction_equivalence.py --series 2000
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import importlib.util
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmark_prediction_service import random_case, legacy_predict_breach_date, rounding_difference
+from app.services.prediction_service import prediction_service
+
+# Load the legacy service module on its own: the legacy services package
+# imports every API client at package import
+_spec = importlib.util.spec_from_file_location(
+    "legacy_prediction_service",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services", "prediction_service.py")
+)
+_legacy_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_legacy_module)
+legacy_service = _legacy_module.prediction_service
+
+try:
+    from sklearn.linear_model import LinearRegression
+except ImportError:
+    LinearRegression = None
+
+RTOL = 1e-9
+LEGACY_OPERATORS = ['>', '<', '>=', '<=', '=']
+
+
+class Checks:
+    def __init__(self):
+        self.counts = {}
+        self.failures = 0
+
+    def check(self, name: str, ok: bool, detail: str = ""):
+        passed, total = self.counts.get(name, (0, 0))
+        self.counts[name] = (passed + ok, total + 1)
+        if not ok:
+            self.failures += 1
+            if self.counts[name][1] - self.counts[name][0] <= 5:
+                print(f"FAIL {name}: {detail}")
+
+    def report(self):
+        for name, (passed, total) in self.counts.items():
+            print(f"{name:<50}{passed:>8}/{total}")
+
+
+def close(a, b, scale=1.0) -> bool:
+    return abs(a - b) <= RTOL * max(abs(a), abs(b), scale)
+
+
+def series_arrays(series):
+    points = sorted(series, key=lambda point: point["date"])
+    first = date.fromisoformat(points[0]["date"])
+    x = np.array([(date.fromisoformat(point["date"]) - first).days for point in points], dtype=float)
+    y = np.array([point["value"] for point in points], dtype=float)
+    return x, y
+
+
+def check_fits(checks: Checks, cases):
+    for series, threshold, operator in cases:
+        x, y = series_arrays(series)
+        slope, intercept, r_squared = prediction_service._fit_line(x, y)
+        scale = max(np.abs(y).max(), 1.0)
+
+        (ref_slope, ref_intercept), *_ = np.linalg.lstsq(np.column_stack([x, np.ones_like(x)]), y, rcond=None)
+        checks.check("_fit_line slope vs lstsq", close(slope, ref_slope, scale / max(x.max(), 1.0)),
+                     f"{slope} != {ref_slope}")
+        checks.check("_fit_line intercept vs lstsq", close(intercept, ref_intercept, scale),
+                     f"{intercept} != {ref_intercept}")
+
+        legacy_slope, legacy_intercept = legacy_service._fit_line(x, y)
+        checks.check("legacy _fit_line vs _fit_line", legacy_slope == slope and legacy_intercept == intercept,
+                     f"{(legacy_slope, legacy_intercept)} != {(slope, intercept)}")
+
+        if LinearRegression is not None:
+            model = LinearRegression().fit(x.reshape(-1, 1), y)
+            checks.check("_fit_line slope vs sklearn", close(slope, model.coef_[0], scale / max(x.max(), 1.0)),
+                         f"{slope} != {model.coef_[0]}")
+            checks.check("_fit_line intercept vs sklearn", close(intercept, model.intercept_, scale),
+                         f"{intercept} != {model.intercept_}")
+            checks.check("_fit_line R² vs sklearn", abs(r_squared - model.score(x.reshape(-1, 1), y)) <= 1e-6,
+                         f"{r_squared} != {model.score(x.reshape(-1, 1), y)}")
+
+    fit = prediction_service._fit_many({
+        i: {"historical_values": series, "threshold_value": threshold, "threshold_operator": operator}
+        for i, (series, threshold, operator) in enumerate(cases)
+    })
+    for i, key in enumerate(fit["keys"]):
+        x, y = series_arrays(cases[key][0])
+        slope, intercept, r_squared = prediction_service._fit_line(x, y)
+        scale = max(np.abs(y).max(), 1.0)
+        checks.check("_fit_many vs _fit_line",
+                     close(fit["slope"][i], slope, scale / max(x.max(), 1.0))
+                     and close(fit["intercept"][i], intercept, scale)
+                     and abs(fit["r_squared"][i] - r_squared) <= 1e-6,
+                     f"covenant {key}")
+
+
+def check_predictions(checks: Checks, cases):
+    for series, threshold, operator in cases:
+        expected = legacy_predict_breach_date(series, threshold, operator)
+        actual = prediction_service.predict_breach_date(series, threshold, operator)
+        checks.check("predict_breach_date vs sklearn scan",
+                     expected == actual or rounding_difference(expected, actual, threshold),
+                     f"{operator} {threshold}: sklearn={expected} numpy={actual}")
+
+
+def legacy_reference(measurements, threshold_value, threshold_operator, days_forward=90):
+    """The original pandas/scikit-learn fit of predict_covenant_breach: (predictions, slope)"""
+    import pandas as pd
+
+    df = pd.DataFrame(measurements)
+    df['measurement_date'] = pd.to_datetime(df['measurement_date'])
+    df = df.sort_values('measurement_date')
+    df['days_from_start'] = (df['measurement_date'] - df['measurement_date'].min()).dt.days
+    X = df[['days_from_start']].values
+    y = df['actual_value'].values.astype(float)
+    model = LinearRegression().fit(X, y)
+    last_day = int(X[-1][0])
+    future_days = np.array([[last_day + i] for i in range(1, days_forward + 1)])
+    return model.predict(future_days), model.coef_[0]
+
+
+def check_legacy_service(checks: Checks, cases, rnd: random.Random):
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        pandas = None
+    if LinearRegression is None or pandas is None:
+        print("scikit-learn/pandas not installed; skipping legacy service cross-check")
+        return
+
+    for series, threshold, _ in cases:
+        measurements = [
+            {"measurement_date": date.fromisoformat(point["date"]), "actual_value": point["value"]}
+            for point in rnd.sample(series, len(series))
+        ]
+        operator = rnd.choice(LEGACY_OPERATORS)
+        result = legacy_service.predict_covenant_breach(measurements, threshold, operator)
+        reference, slope = legacy_reference(measurements, threshold, operator)
+
+        predicted = np.array([p["predicted_value"] for p in result["predictions"]])
+        scale = max(np.abs(reference).max(), 1.0)
+        checks.check("legacy predictions vs pandas/sklearn",
+                     np.allclose(predicted, reference, rtol=RTOL, atol=RTOL * scale),
+                     f"max diff {np.abs(predicted - reference).max()}")
+
+        expected_breach = legacy_service._check_breach_conditions(reference, threshold, operator)
+        expected_days = expected_breach.index(True) + 1 if True in expected_breach else None
+        tie = expected_days != result["days_to_breach"] and any(
+            abs(reference[day - 1] - threshold) <= RTOL * scale
+            for day in (expected_days, result["days_to_breach"]) if day
+        )
+        checks.check("legacy days_to_breach vs pandas/sklearn", expected_days == result["days_to_breach"] or tie,
+                     f"{operator} {threshold}: {expected_days} != {result['days_to_breach']}")
+        checks.check("legacy trend vs pandas/sklearn",
+                     result["trend"] == ('increasing' if slope > 0 else 'decreasing') or abs(slope) <= RTOL,
+                     f"{result['trend']} slope {slope}")
+
+        last = max(m["measurement_date"] for m in measurements)
+        checks.check("legacy prediction dates",
+                     result["predictions"][0]["prediction_date"] == last + timedelta(days=1), "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=2000, help="Random series to check")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    cases = [random_case(rnd) for _ in range(args.series)]
+    checks = Checks()
+
+    check_fits(checks, cases)
+    if LinearRegression is not None:
+        check_predictions(checks, cases)
+    else:
+        print("scikit-learn not installed; skipping the sklearn cross-checks")
+    check_legacy_service(checks, cases, rnd)
+
+    checks.report()
+    print(f"{checks.failures} failures")
+    sys.exit(1 if checks.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,13 @@
-from sklearn.linear_model import LinearRegression
-import pandas as pd
 import numpy as np
-from datetime import date, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bump when the fitted model or its parameters change meaning
+MODEL_VERSION = 'linear-v1'
+
 class PredictionService:
-    def __init__(self):
-        self.model = LinearRegression()
-    
     def predict_covenant_breach(
         self, 
         measurements: List[Dict],
@@ -34,69 +31,165 @@ class PredictionService:
             return self._conservative_prediction(measurements, threshold_value, threshold_operator)
         
         try:
-            # Prepare time series data
-            df = pd.DataFrame(measurements)
-            df['measurement_date'] = pd.to_datetime(df['measurement_date'])
-            df = df.sort_values('measurement_date')
-            
-            # Calculate days from start
-            df['days_from_start'] = (df['measurement_date'] - df['measurement_date'].min()).dt.days
-            
-            X = df[['days_from_start']].values
-            y = df['actual_value'].values.astype(float)
-            
-            # Fit linear regression
-            self.model.fit(X, y)
-            
-            # Predict next N days
-            last_day = int(X[-1][0])
-            last_date = df['measurement_date'].max()
-            
-            future_days = np.array([[last_day + i] for i in range(1, days_forward + 1)])
-            predictions = self.model.predict(future_days)
-            
-            # Calculate breach conditions
-            breach_predictions = self._check_breach_conditions(
-                predictions, threshold_value, threshold_operator
-            ) if threshold_value is not None else [False] * len(predictions)
-            
-            # Find first breach date
-            days_to_breach = None
-            for i, will_breach in enumerate(breach_predictions):
-                if will_breach:
-                    days_to_breach = i + 1
-                    break
+            forecast = self.fit_forecast(measurements)
+            series = self.forecast_series(forecast, threshold_value, threshold_operator, 1, days_forward)
             
             # Generate prediction results
-            prediction_list = []
-            for i, pred in enumerate(predictions):
-                pred_date = last_date + timedelta(days=i+1)
-                prediction_list.append({
-                    'prediction_date': pred_date.date(),
-                    'predicted_value': float(pred),
-                    'breach_probability': self._calculate_breach_probability(i, days_to_breach),
-                    'confidence_score': self._calculate_confidence(y, predictions, i)
-                })
-            
-            # Determine overall risk
-            overall_risk = 'healthy'
-            if days_to_breach:
-                if days_to_breach < 30:
-                    overall_risk = 'critical'
-                elif days_to_breach < 90:
-                    overall_risk = 'warning'
+            prediction_list = [
+                {
+                    'prediction_date': prediction_date,
+                    'predicted_value': predicted_value,
+                    'breach_probability': breach_probability,
+                    'confidence_score': confidence_score
+                }
+                for prediction_date, predicted_value, breach_probability, confidence_score in zip(
+                    series['dates'].tolist(), series['values'].tolist(),
+                    series['breach_probability'].tolist(), series['confidence_score'].tolist()
+                )
+            ]
             
             return {
                 'predictions': prediction_list,
-                'days_to_breach': days_to_breach,
-                'overall_risk': overall_risk,
-                'trend': 'increasing' if self.model.coef_[0] > 0 else 'decreasing'
+                **self.assess_forecast(forecast, threshold_value, threshold_operator, days_forward)
             }
             
         except Exception as e:
             logger.error(f"Error in prediction: {e}")
             return self._conservative_prediction(measurements, threshold_value, threshold_operator)
     
+    def fit_forecast(self, measurements: List[Dict]) -> Optional[Dict]:
+        """
+        Fit the trend model and return its parameters, the compact form a
+        forecast is stored in. Day d of the forecast (d days after
+        anchor_date, the latest measurement) is intercept + slope * d.
+        
+        Args:
+            measurements: List of dicts with 'measurement_date' and 'actual_value'
+            
+        Returns:
+            Dict with slope, intercept, residual_std, anchor_date,
+            n_measurements and model_version, or None with fewer than 3
+            measurements
+        """
+        if len(measurements) < 3:
+            return None
+        
+        dates = np.array([m['measurement_date'] for m in measurements], dtype='datetime64[D]')
+        y = np.array([m['actual_value'] for m in measurements], dtype=float)
+        
+        # Days before the latest measurement (negative)
+        anchor = dates.max()
+        X = (dates - anchor).astype(float)
+        slope, intercept = self._fit_line(X, y)
+        
+        residuals = y - (intercept + slope * X)
+        residual_std = float(np.sqrt(residuals @ residuals / (len(y) - 2))) if len(y) > 2 else 0.0
+        
+        return {
+            'slope': slope,
+            'intercept': intercept,
+            'residual_std': residual_std,
+            'anchor_date': anchor.item(),
+            'n_measurements': len(y),
+            'model_version': MODEL_VERSION
+        }
+    
+    def assess_forecast(
+        self,
+        forecast: Dict,
+        threshold_value: Optional[float],
+        threshold_operator: Optional[str],
+        days_forward: int = 90
+    ) -> Dict:
+        """
+        First predicted breach within days_forward of the anchor date, the
+        resulting risk level and the trend direction.
+        """
+        days = np.arange(1, days_forward + 1)
+        days_to_breach = self._first_breach_day(forecast, days, threshold_value, threshold_operator)
+        
+        # Determine overall risk
+        overall_risk = 'healthy'
+        if days_to_breach:
+            if days_to_breach < 30:
+                overall_risk = 'critical'
+            elif days_to_breach < 90:
+                overall_risk = 'warning'
+        
+        return {
+            'days_to_breach': days_to_breach,
+            'overall_risk': overall_risk,
+            'trend': 'increasing' if forecast['slope'] > 0 else 'decreasing'
+        }
+    
+    def forecast_series(
+        self,
+        forecast: Dict,
+        threshold_value: Optional[float],
+        threshold_operator: Optional[str],
+        start_day: int,
+        days: int
+    ) -> Dict[str, np.ndarray]:
+        """
+        Generate the daily forecast from stored parameters, vectorized.
+        
+        Args:
+            forecast: Parameters as returned by fit_forecast (or a stored
+                CovenantForecast converted to a dict)
+            start_day: First day to generate, counted from the anchor date
+            days: Number of days to generate
+            
+        Returns:
+            Arrays of dates, values, breach_probability and confidence_score
+        """
+        day_numbers = np.arange(start_day, start_day + days)
+        breach_day = self._first_breach_day(
+            forecast, np.arange(1, start_day + days), threshold_value, threshold_operator
+        )
+        
+        # Day d was the original (d - 1)th prediction
+        index = day_numbers - 1
+        if breach_day is None:
+            breach_probability = np.zeros(len(index))
+        else:
+            breach_probability = np.where(
+                index >= breach_day,
+                np.minimum(95.0, 50.0 + (index - breach_day) * 2),
+                index / breach_day * 50.0
+            )
+        data_confidence = min(90.0, 50.0 + forecast['n_measurements'] * 5)
+        confidence_score = np.round(np.maximum(50.0, data_confidence - index * 0.5), 2)
+        
+        return {
+            'dates': np.datetime64(forecast['anchor_date'], 'D') + day_numbers,
+            'values': forecast['intercept'] + forecast['slope'] * day_numbers,
+            'breach_probability': breach_probability,
+            'confidence_score': confidence_score
+        }
+    
+    def _first_breach_day(
+        self,
+        forecast: Dict,
+        days: np.ndarray,
+        threshold_value: Optional[float],
+        threshold_operator: Optional[str]
+    ) -> Optional[int]:
+        """First of the given days (counted from the anchor date) that breaches"""
+        if threshold_value is None or not len(days):
+            return None
+        values = forecast['intercept'] + forecast['slope'] * days
+        breaches = np.asarray(self._check_breach_conditions(values, threshold_value, threshold_operator), dtype=bool)
+        if not breaches.any():
+            return None
+        return int(days[np.argmax(breaches)])
+    
+    def _fit_line(self, x: np.ndarray, y: np.ndarray) -> Tuple[float, float]:
+        """Ordinary least squares of y on x, returning (slope, intercept)"""
+        x_centered = x - x.mean()
+        sxx = float(x_centered @ x_centered)
+        slope = float(x_centered @ (y - y.mean())) / sxx if sxx > 0 else 0.0
+        return slope, float(y.mean() - slope * x.mean())
+    
     def _check_breach_conditions(
         self, 
         values: np.ndarray, 
@@ -117,29 +210,6 @@ class PredictionService:
             return (np.abs(values - threshold) > tolerance).tolist()
         return [False] * len(values)
     
-    def _calculate_breach_probability(self, day_index: int, days_to_breach: Optional[int]) -> float:
-        """Calculate probability of breach for a given prediction day"""
-        if days_to_breach is None:
-            return 0.0
-        
-        if day_index >= days_to_breach:
-            # After predicted breach, probability increases
-            return min(95.0, 50.0 + (day_index - days_to_breach) * 2)
-        else:
-            # Before predicted breach, probability increases as we approach
-            return (day_index / days_to_breach) * 50.0
-    
-    def _calculate_confidence(self, historical: np.ndarray, predictions: np.ndarray, index: int) -> float:
-        """Calculate confidence score based on data quality and trend consistency"""
-        # Base confidence on amount of historical data
-        data_confidence = min(90.0, 50.0 + len(historical) * 5)
-        
-        # Adjust based on prediction distance
-        distance_penalty = index * 0.5
-        
-        final_confidence = max(50.0, data_confidence - distance_penalty)
-        return round(final_confidence, 2)
-    
     def _conservative_prediction(
         self, 
         measurements: List[Dict],
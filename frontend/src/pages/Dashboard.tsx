@@ -2,7 +2,7 @@ import { useState } from 'react';
 import { useQuery } from '@tanstack/react-query';
 import { Link } from 'react-router-dom';
 import api from '../lib/api';
-import type { PortfolioSummary, Alert, RiskHeatmapItem, PortfolioValueResponse, PortfolioTrendsResponse, CovenantTrendsResponse } from '../types';
+import type { DashboardResponse } from '../types';
 import { getSeverityColor } from '../lib/dashboard-utils';
 import Layout from '../components/layout/Layout';
 import { MetricCard, Card } from '../components/ui/Card';
@@ -17,59 +17,21 @@ export default function Dashboard() {
     const [isUploadModalOpen, setIsUploadModalOpen] = useState(false);
     const [selectedPeriod, setSelectedPeriod] = useState('week');
 
-    // Fetch portfolio summary
-    const { data: summary } = useQuery<PortfolioSummary>({
-        queryKey: ['portfolio-summary'],
+    // Fetch all dashboard widgets in one request
+    const { data: dashboard, isLoading } = useQuery<DashboardResponse>({
+        queryKey: ['dashboard'],
         queryFn: async () => {
-            const res = await api.get('/api/analytics/portfolio-summary');
+            const res = await api.get('/api/analytics/dashboard');
             return res.data;
         },
     });
 
-    // Fetch heatmap data
-    const { data: heatmap, isLoading: loadingHeatmap } = useQuery<RiskHeatmapItem[]>({
-        queryKey: ['risk-heatmap'],
-        queryFn: async () => {
-            const res = await api.get('/api/analytics/risk-heatmap');
-            return res.data;
-        },
-    });
-
-    // Fetch critical alerts
-    const { data: alerts, isLoading: loadingAlerts } = useQuery<Alert[]>({
-        queryKey: ['critical-alerts'],
-        queryFn: async () => {
-            const res = await api.get('/api/analytics/critical-alerts');
-            return res.data;
-        },
-    });
-
-    // Fetch portfolio value
-    const { data: portfolioValue } = useQuery<PortfolioValueResponse>({
-        queryKey: ['portfolio-value'],
-        queryFn: async () => {
-            const res = await api.get('/api/analytics/portfolio-value');
-            return res.data;
-        },
-    });
-
-    // Fetch portfolio trends
-    const { data: portfolioTrends } = useQuery<PortfolioTrendsResponse>({
-        queryKey: ['portfolio-trends'],
-        queryFn: async () => {
-            const res = await api.get('/api/analytics/portfolio-trends');
-            return res.data;
-        },
-    });
-
-    // Fetch covenant trends
-    const { data: covenantTrends } = useQuery<CovenantTrendsResponse>({
-        queryKey: ['covenant-trends'],
-        queryFn: async () => {
-            const res = await api.get('/api/analytics/covenant-trends');
-            return res.data;
-        },
-    });
+    const summary = dashboard?.portfolio_summary;
+    const heatmap = dashboard?.risk_heatmap;
+    const alerts = dashboard?.critical_alerts;
+    const portfolioValue = dashboard?.portfolio_value;
+    const portfolioTrends = dashboard?.portfolio_trends;
+    const covenantTrends = dashboard?.covenant_trends;
 
     const portfolioHealth = summary ? (summary.compliant_covenants / summary.total_covenants) * 100 : 0;
 
@@ -243,7 +205,7 @@ export default function Dashboard() {
 
                     <RiskHeatmap
                         loans={heatmap || []}
-                        isLoading={loadingHeatmap}
+                        isLoading={isLoading}
                     />
                 </Card>
 
@@ -256,7 +218,7 @@ export default function Dashboard() {
                         </Link>
                     </div>
                     <div className="space-y-3">
-                        {loadingAlerts ? (
+                        {isLoading ? (
                             <div className="text-sm text-gray-400">Loading...</div>
                         ) : alerts?.length === 0 ? (
                             <div className="text-center text-gray-400 text-sm py-8">No alerts</div>
@@ -75,6 +75,7 @@ export interface PortfolioSummary {
     breach_covenants: number;
     unread_alerts: number;
     critical_alerts: number;
+    total_exposure: number;
 }
 
 export interface RiskHeatmapItem {
@@ -112,3 +113,12 @@ export interface CovenantTrendsResponse {
     warning_change: number;
     breach_change: number;
 }
+
+export interface DashboardResponse {
+    portfolio_summary?: PortfolioSummary;
+    risk_heatmap?: RiskHeatmapItem[];
+    critical_alerts?: Alert[];
+    portfolio_value?: PortfolioValueResponse;
+    portfolio_trends?: PortfolioTrendsResponse;
+    covenant_trends?: CovenantTrendsResponse;
+}